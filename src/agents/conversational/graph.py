@@ -1,18 +1,19 @@
+import asyncio
 import os
 from dotenv import load_dotenv
-from langchain_openai import AzureChatOpenAI
 from langchain_mcp_adapters.client import MultiServerMCPClient
 from langgraph_supervisor import create_supervisor
 from langgraph_supervisor.handoff import create_forward_message_tool
-from src.agents.transactions.graph import graph as get_transactions_agent
-from src.agents.payments.graph import graph as get_payments_agent
-from src.agents.operations.graph import graph as get_operations_agent
-from src.agents.knowledge.graph import graph as knowledge_agent
+from src.utils.blackboard import SupervisorBlackboardState
+from src.utils.blocking import watch_event_loop
+from src.utils.bootstrap import BOOTSTRAP_TOOLS, add_bootstrap, with_customer_context
+from src.utils.checkpoint import get_checkpointer
+from src.utils.direct_return import add_direct_return
+from src.utils.mcp_tools import load_mcp_tools
+from src.utils.models import aget_node_model
 
 load_dotenv()
 
-model = AzureChatOpenAI(model="gpt-4.1")
-
 PROMPT = """
 You are a helpful, general-purpose banking assistant and a team supervisor managing three specialized agents: TransactionsAgent, PaymentsAgent, and OperationsAgent.
 Maintain a warm and friendly demeanor while assisting users. The user is seeking assistance with their banking needs, and using chat-based interactions, so make sure your responses are maximum 1-2 paragraphs.
@@ -67,26 +68,74 @@ client = MultiServerMCPClient(
     }
 )
 
+# Servers of the session bootstrap tools; kept apart so the supervisor is not offered the account tools
+bootstrap_client = MultiServerMCPClient(
+    {
+        "accounts": {
+            "url": "http://127.0.0.1:10000/mcp",
+            "transport": "streamable_http",
+            "headers": {
+                "cookie": os.getenv("cookie", "")
+            }
+        },
+        "mcd": {
+            "url": "http://127.0.0.1:10002/mcp",
+            "transport": "streamable_http",
+            "headers": {
+                "cookie": os.getenv("cookie", "")
+            }
+        }
+    }
+)
+
 
 forwarding_tool = create_forward_message_tool("ConversationalAgent")
 
+
+def _import_agents():
+    # Sub-agents are imported when the graph is built rather than at module level, so loading
+    # this module does not pull in every agent's dependencies before the graph is built.
+    from src.agents.transactions.graph import graph as get_transactions_agent
+    from src.agents.payments.graph import graph as get_payments_agent
+    from src.agents.operations.graph import graph as get_operations_agent
+    from src.agents.knowledge.graph import graph as knowledge_agent
+
+    return get_transactions_agent, get_payments_agent, get_operations_agent, knowledge_agent
+
+
 async def graph():
     """Create a supervisor agent that manages multiple agents. 
     This agent has capabilities of transaction insights and payments.
     """
-    tools = await client.get_tools()
+    watch_event_loop()
+    # Importing reads module files from disk, so it runs off the event loop
+    get_transactions_agent, get_payments_agent, get_operations_agent, knowledge_agent = await asyncio.to_thread(
+        _import_agents
+    )
+
+    tools = await load_mcp_tools(client)
+    bootstrap_tools = [tool for tool in await load_mcp_tools(bootstrap_client) if tool.name in BOOTSTRAP_TOOLS]
     all_tools = [forwarding_tool] + tools
 
-    return create_supervisor(
-        agents=[
-            await get_transactions_agent(),
-            await get_payments_agent(),
-            await get_operations_agent(),
-            knowledge_agent
-        ],
+    agents = [
+        await get_transactions_agent(),
+        await get_payments_agent(),
+        await get_operations_agent(),
+        knowledge_agent
+    ]
+    builder = create_supervisor(
+        agents=agents,
         tools=all_tools,
-        model=model,
-        prompt=PROMPT,
+        model=await aget_node_model("ConversationalAgent", "gpt-4.1"),
+        prompt=with_customer_context(PROMPT),
         output_mode="full_history",
         supervisor_name="ConversationalAgent",
-    ).compile(name="ConversationalAgent")
\ No newline at end of file
+        # Sub-agents share the thread's blackboard, so results one publishes are not fetched again by another
+        state_schema=SupervisorBlackboardState,
+    )
+    # Sub-agents listed in DIRECT_RETURN_AGENTS answer the user without a supervisor re-summary
+    add_direct_return(builder, [agent.name for agent in agents], "ConversationalAgent")
+    # Accounts, business contacts and profile are loaded once per thread into every agent's prompt
+    add_bootstrap(builder, "ConversationalAgent", bootstrap_tools)
+    checkpointer = await asyncio.to_thread(get_checkpointer)
+    return builder.compile(name="ConversationalAgent", checkpointer=checkpointer)
\ No newline at end of file
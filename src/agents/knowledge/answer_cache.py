@@ -0,0 +1,173 @@
+"""Local cache of KnowledgeAgent answers to FAQ-style questions.
+
+Many users ask the same product questions ("how do I block my card", "how can I block
+my card please"). Questions are normalized into content-word stems and indexed; a new
+question that asks with the same question words ("how", "why", "who", ...) and whose
+TF-IDF cosine similarity to a cached one reaches FAQ_CACHE_SIMILARITY is answered with
+the cached answer, without a Copilot Studio round trip. Entries expire
+after FAQ_CACHE_TTL seconds and the least recently used ones are evicted beyond
+FAQ_CACHE_SIZE. Questions that carry personal details (numbers, IBANs, e-mail addresses)
+are never cached.
+"""
+
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+# Seconds an answer is served from the cache (0 disables the cache)
+FAQ_CACHE_TTL = float(os.getenv("FAQ_CACHE_TTL", "86400"))
+# Cosine similarity from which a cached question counts as the same question
+FAQ_CACHE_SIMILARITY = float(os.getenv("FAQ_CACHE_SIMILARITY", "0.85"))
+FAQ_CACHE_SIZE = int(os.getenv("FAQ_CACHE_SIZE", "500"))
+
+_WORD = re.compile(r"[a-zÀ-ɏ]+")
+# Digits (account and card numbers, IBANs, amounts) and e-mail addresses make a question about someone's own data
+_PERSONAL = re.compile(r"\d|@")
+# Words that do not change what is asked; negations are kept
+_STOPWORDS = frozenset("""
+a an the i me my mine you your we our us it its this that these those is are am was were be been being
+do does did can could would should shall will may might must to of for in on at by with from about into
+as and or if so please pls hi hello hey thanks thank there here
+get go have has had want wanted need like know tell explain possible way just also still any some
+ik mijn je jij u uw de het een is zijn ben kan kun ik wil graag van voor op in met om te er
+""".split())
+# Words that decide what kind of answer is wanted: "how do I block my card" and "why is my card blocked" differ
+_QUESTION_WORDS = frozenset("""
+how what when where which who whom whose why hoe wat wanneer waar welke welk wie waarom
+""".split())
+# No "ed": "blocked" (a state) is not "block" (an action)
+_SUFFIXES = ("ings", "ing", "es", "s")
+
+
+def _stem(word: str) -> str:
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[: -len(suffix)]
+    return word
+
+
+def terms(question: str) -> list[str]:
+    """The normalized content words of a question."""
+    words = _WORD.findall(question.lower().replace("'", ""))
+    return [
+        _stem(word)
+        for word in words
+        if word not in _STOPWORDS and word not in _QUESTION_WORDS and len(word) > 1
+    ]
+
+
+def question_words(question: str) -> frozenset[str]:
+    """The question words of a question; only questions asked with the same ones share answers."""
+    return frozenset(_QUESTION_WORDS.intersection(_WORD.findall(question.lower())))
+
+
+def cacheable(question: str) -> bool:
+    return bool(question.strip()) and _PERSONAL.search(question) is None and bool(terms(question))
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    terms: Counter
+    question_words: frozenset
+    expires_at: float
+
+
+class AnswerCache:
+    """Bounded, expiring question -> answer store with an inverted index over question terms."""
+
+    def __init__(self, ttl: float = FAQ_CACHE_TTL, similarity: float = FAQ_CACHE_SIMILARITY, size: int = FAQ_CACHE_SIZE):
+        self.ttl = ttl
+        self.similarity = similarity
+        self.size = size
+        # Normalized question -> entry, least recently used first
+        self._entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+        # Term -> normalized questions containing it
+        self._index: dict[str, set[str]] = {}
+        # Number of cached questions containing each term, for the IDF weights
+        self._document_frequency: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _key(self, question_terms: list[str], asked_with: frozenset) -> str:
+        return " ".join(sorted(asked_with)) + "|" + " ".join(sorted(question_terms))
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        for term in entry.terms:
+            self._document_frequency[term] -= 1
+            if self._document_frequency[term] <= 0:
+                del self._document_frequency[term]
+            self._index[term].discard(key)
+            if not self._index[term]:
+                del self._index[term]
+
+    def _weights(self, counts: Counter) -> dict[str, float]:
+        documents = len(self._entries)
+        weights = {
+            term: count * (math.log((documents + 1) / (self._document_frequency.get(term, 0) + 1)) + 1)
+            for term, count in counts.items()
+        }
+        norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+        return {term: weight / norm for term, weight in weights.items()}
+
+    def lookup(self, question: str) -> Optional[str]:
+        """The cached answer to question, or to the most similar cached question above the threshold."""
+        if self.ttl <= 0 or not cacheable(question):
+            return None
+        question_terms = terms(question)
+        asked_with = question_words(question)
+        now = time.time()
+        with self._lock:
+            key = self._key(question_terms, asked_with)
+            candidates = {key} & self._entries.keys() or set().union(
+                *(self._index.get(term, set()) for term in question_terms)
+            )
+            weights = self._weights(Counter(question_terms))
+            best, best_score = None, 0.0
+            for candidate in candidates:
+                entry = self._entries[candidate]
+                if entry.expires_at <= now:
+                    self._remove(candidate)
+                    continue
+                if entry.question_words != asked_with:
+                    continue
+                candidate_weights = self._weights(entry.terms)
+                score = sum(weight * candidate_weights.get(term, 0.0) for term, weight in weights.items())
+                if score > best_score:
+                    best, best_score = candidate, score
+            if best is None or best_score < self.similarity:
+                return None
+            self._entries.move_to_end(best)
+            return self._entries[best].answer
+
+    def store(self, question: str, answer: str) -> None:
+        if self.ttl <= 0 or not answer.strip() or not cacheable(question):
+            return
+        question_terms = terms(question)
+        asked_with = question_words(question)
+        with self._lock:
+            key = self._key(question_terms, asked_with)
+            if key in self._entries:
+                self._remove(key)
+            entry = CachedAnswer(question, answer, Counter(question_terms), asked_with, time.time() + self.ttl)
+            self._entries[key] = entry
+            for term in entry.terms:
+                self._document_frequency[term] += 1
+                self._index.setdefault(term, set()).add(key)
+            while len(self._entries) > self.size:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+            self._document_frequency.clear()
+
+
+answer_cache = AnswerCache()
@@ -1,19 +1,19 @@
+import asyncio
 import os
+import functools
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
 import logging
-import asyncio
-import webbrowser
 from langgraph.graph import StateGraph, START, END, MessagesState
 from langchain_core.messages import HumanMessage, AIMessage
-from msal import PublicClientApplication
+from src.agents.knowledge.answer_cache import answer_cache
 
-from microsoft.agents.activity import ActivityTypes
-from microsoft.agents.copilotstudio.client import (
-    ConnectionSettings,
-    CopilotClient,
-)
+# msal and the Copilot Studio client are imported on first use, so loading this
+# graph (or the conversational graph that embeds it) does not pay for them.
+if TYPE_CHECKING:
+    from microsoft.agents.copilotstudio.client import ConnectionSettings
+    from src.utils.local_toke_cache import LocalTokenCache
 
-from src.utils.local_toke_cache import LocalTokenCache
 ms_agents_logger = logging.getLogger("microsoft.agents")
 ms_agents_logger.addHandler(logging.StreamHandler())
 ms_agents_logger.setLevel(logging.INFO)
@@ -22,14 +22,26 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-TOKEN_CACHE = LocalTokenCache("./.local_token_cache.json")
+@functools.cache
+def token_cache() -> "LocalTokenCache":
+    """Return the MSAL token cache, reading it from disk on first use."""
+    from src.utils.local_toke_cache import LocalTokenCache
+
+    return LocalTokenCache("./.local_token_cache.json")
+
+
+def acquire_token(settings: "ConnectionSettings", app_client_id, tenant_id):
+    """Get a Power Platform token with MSAL.
 
+    MSAL is synchronous (HTTP calls, token cache file I/O, possibly an interactive
+    browser login), so call this from a worker thread, never on the event loop.
+    """
+    from msal import PublicClientApplication
 
-def acquire_token(settings: ConnectionSettings, app_client_id, tenant_id):
     pca = PublicClientApplication(
         client_id=app_client_id,
         authority=f"https://login.microsoftonline.com/{tenant_id}",
-        token_cache=TOKEN_CACHE,
+        token_cache=token_cache(),
     )
 
     token_request = {
@@ -57,17 +69,36 @@ def acquire_token(settings: ConnectionSettings, app_client_id, tenant_id):
         response = pca.acquire_token_interactive(**token_request)
         token = response.get("access_token")
 
+    # Persist refreshed tokens, so the next process can sign in silently
+    token_cache().serialize()
     return token
 
 
-async def copilotstudio_agent_node(state: MessagesState):
-    if CopilotClient is None:
+def _import_copilot_client():
+    try:
+        from microsoft.agents.activity import ActivityTypes
+        from microsoft.agents.copilotstudio.client import ConnectionSettings, CopilotClient
+    except ImportError as e:
         raise ImportError(
-            "copilotstudio-client is not installed. Run 'pip install copilotstudio-client'.")
+            "copilotstudio-client is not installed. Run 'pip install copilotstudio-client'.") from e
+    return ActivityTypes, ConnectionSettings, CopilotClient
+
+
+async def copilotstudio_agent_node(state: MessagesState):
     user_messages = [m for m in state["messages"] if isinstance(m, HumanMessage)]
     print("User messages (Human only):", user_messages)
     question = user_messages[-1].content[-1]["text"] if user_messages else ""
     print("question: ", question)
+    # FAQ-style questions asked before (in other words, too) are answered locally
+    cached_answer = answer_cache.lookup(question)
+    if cached_answer is not None:
+        logger.info("Answering from the FAQ answer cache")
+        return {"messages": [AIMessage(
+            content=cached_answer,
+            name="copilotstudio_agent"
+        )]}
+    # The first import reads the client packages from disk; keep it off the event loop
+    ActivityTypes, ConnectionSettings, CopilotClient = await asyncio.to_thread(_import_copilot_client)
     settings = ConnectionSettings(
         environment_id=os.getenv("COPILOTSTUDIOAGENT__ENVIRONMENTID", ""),
         agent_identifier=os.getenv("COPILOTSTUDIOAGENT__SCHEMANAME", ""),
@@ -76,13 +107,13 @@ async def copilotstudio_agent_node(state: MessagesState):
         custom_power_platform_cloud=None,
     )
     # token = os.getenv("COPILOTSTUDIOAGENT__TOKEN","")
-    token = acquire_token(
+    token = await asyncio.to_thread(
+        acquire_token,
         settings,
         app_client_id=os.getenv("COPILOTSTUDIOAGENT__AGENTAPPID"),
         tenant_id=os.getenv("COPILOTSTUDIOAGENT__TENANTID"),
     )
-    print("Token:", token)
-    print("Settings:", settings)
+    logger.debug(f"Settings: {settings}")
     client = CopilotClient(settings, token)
     act = client.start_conversation(True)
     print("\nSuggested Actions: ")
@@ -100,6 +131,7 @@ async def copilotstudio_agent_node(state: MessagesState):
                 for action in reply.suggested_actions.actions:
                     print(f" - {action.title}")
     print("Response:", replies)
+    answer_cache.store(question, final_reply)
     return {"messages": [AIMessage(
         content=final_reply,
         name="copilotstudio_agent"
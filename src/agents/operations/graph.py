@@ -1,10 +1,17 @@
 import os
 from dotenv import load_dotenv
 from langchain_mcp_adapters.client import MultiServerMCPClient
-from langchain_openai import AzureChatOpenAI
 from langgraph.prebuilt import create_react_agent
+from src.utils.blackboard import BlackboardState, share_on_blackboard
+from src.utils.blocking import watch_event_loop
+from src.utils.bootstrap import with_customer_context
+from src.utils.main import human_review_hook, human_review_tools
+from src.utils.mcp_tools import load_mcp_tools
+from src.utils.models import aget_node_model
+from src.utils.result_store import offload_large_results, read_result
+from src.utils.tool_cache import memoize_read_only
+from src.utils.tool_node import tool_node
 
-llm = AzureChatOpenAI(model="gpt-4.1")
 prompt = """You are a helpful general purpose banking assistant.
 Your task is to help users retrieve tasks, messages/notifications, and preferences from the ABN AMRO APIs.
 You will use the tools provided by the MCP client to interact with these tools.
@@ -46,10 +53,15 @@ client = MultiServerMCPClient(
 )
 
 async def graph():
-    tools = await client.get_tools()
+    watch_event_loop()
+    tools = await load_mcp_tools(client)
+    # e.g. HUMAN_REVIEW_TOOLS=delete_message,delete_messages,delete_task,change_phone_number
+    review_tools = human_review_tools() & {tool.name for tool in tools}
     return create_react_agent(
         name="OperationsAgent",
-        model=llm,
-        prompt=prompt,
-        tools=tools
+        model=await aget_node_model("OperationsAgent", "gpt-4.1"),
+        prompt=with_customer_context(prompt),
+        tools=tool_node([*tools, read_result], [offload_large_results, share_on_blackboard, memoize_read_only]),
+        state_schema=BlackboardState,
+        post_model_hook=human_review_hook(review_tools) if review_tools else None
     )
\ No newline at end of file
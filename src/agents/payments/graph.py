@@ -1,31 +1,40 @@
 import os
 from dotenv import load_dotenv
 from langchain_mcp_adapters.client import MultiServerMCPClient
-from langchain_openai import AzureChatOpenAI
 from langgraph.prebuilt import create_react_agent
+from src.utils.blackboard import BlackboardState, share_on_blackboard
+from src.utils.blocking import watch_event_loop
+from src.utils.bootstrap import with_customer_context
+from src.utils.main import human_review_hook, human_review_tools
+from src.utils.mcp_tools import load_mcp_tools
+from src.utils.models import aget_node_model
+from src.utils.result_store import offload_large_results, read_result
+from src.utils.tool_cache import memoize_read_only
+from src.utils.tool_node import tool_node
 
-llm = AzureChatOpenAI(model="gpt-4.1", verbose=True)
 PROMPT = """You are an expert banking payments assistant at a leading Dutch bank that helps users execute their payments.
 
 When a user wants to make a payment, you should follow these instructions. Think step by step.
 
 Instructions:
-1. If the source account and recipient's account aren't provided, follow these steps:
-    1. Check with user if the source account should be the user's primary account
-    2. Lookup address book and recommend recipient's details
-    3. If address book lookup fails, ask the user for these details
-2. The source account should be verified for sufficient funds
+1. If the source account isn't provided, check with user if the source account should be the user's primary account
+2. Once you know the source account, the amount and the recipient's name (and IBAN, if the user gave one), call payment_preflight once.
+   It looks up the recipient in the address book, verifies the source account for sufficient funds and validates the recipient in a single call.
+   Do not call the address book, balance or validation tools separately.
+3. If payment_preflight reports issues, explain them to the user and ask for the missing details (e.g. the recipient's IBAN).
+   A name that does not match the IBAN's holder is an issue too: never execute the payment until a new pre-flight is ready
+4. If payment_preflight is ready, confirm the recipient's details with the user and execute the payment with fetch_single_sepa_payment_instruction,
+   using the contract number and business contact number of the ordering account from the pre-flight result
 
 Example flow:
 <example>
 User: "Transfer 50 euros to John?"
 Assistant: Sure, I can help you with that. Let's start by confirming the source account. Should I use your primary account for this transfer?
 User: "Yes, use my primary account."
-Assistant: Great! Now, let's find John's account details. Please hold on a moment while I check the address book.
-Assistant: I've found John's details in your address book. Just to confirm, you want to transfer 50 euros to John Doe at IBAN NL91ABNA0417164300, correct?
+Assistant: Great! Please hold on a moment while I look up John and check your account.
+Assistant: I've found John's details in your address book and your primary account has sufficient funds. Just to confirm, you want to transfer 50 euros to John Doe at IBAN NL91ABNA0417164300, correct?
 User: "Yes, that's correct."
-Assistant: Thank you for confirming. Now, let's check if your primary account has sufficient funds for this transfer.
-Assistant: Your primary account has sufficient funds for this transfer. The transfer has been initiated. Please approve the transaction in your banking app.
+Assistant: Thank you for confirming. The transfer has been initiated. Please approve the transaction in your banking app.
 </example>
 
 Follow these instructions precisely to ensure all necessary information is gathered before executing a payment.
@@ -62,11 +71,20 @@ client = MultiServerMCPClient(
 
 
 async def graph():
-    tools = await client.get_tools()
+    watch_event_loop()
+    tools = await load_mcp_tools(client)
+    # e.g. HUMAN_REVIEW_TOOLS=fetch_single_sepa_payment_instruction; the reads the payment needs
+    # are prefetched while it waits for approval (SPECULATIVE_PREFETCH)
+    review_tools = human_review_tools() & {tool.name for tool in tools}
 
     return create_react_agent(
         name="PaymentsAgent",
-        model=llm,
-        prompt=PROMPT,
-        tools=tools
+        model=await aget_node_model("PaymentsAgent", "gpt-4.1", verbose=True),
+        prompt=with_customer_context(PROMPT),
+        # Repeated read-only calls in the thread are answered from a short-lived cache;
+        # large results reach the LLM as a preview and a read_result handle,
+        # while the blackboard and cache inside that keep the full result
+        tools=tool_node([*tools, read_result], [offload_large_results, share_on_blackboard, memoize_read_only]),
+        state_schema=BlackboardState,
+        post_model_hook=human_review_hook(review_tools) if review_tools else None
     )
@@ -4,14 +4,15 @@ from langgraph.graph import END, StateGraph, START
 from langgraph.prebuilt import create_react_agent
 from typing_extensions import TypedDict
 from pydantic import BaseModel, Field
-from langchain_openai import AzureChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt.interrupt import HumanInterruptConfig, HumanInterrupt, ActionRequest
 from langgraph.types import interrupt, Command
+from src.utils.checkpoint import get_checkpointer
+from src.utils.models import get_node_model
 
 # Choose the LLM that will drive the agent
-llm = AzureChatOpenAI(model="gpt-4.1")
+llm = get_node_model("plan_act.executor", "gpt-4.1")
 prompt = "You are a helpful assistant."
 agent_executor = create_react_agent(llm, [], prompt=prompt)
 
@@ -41,10 +42,7 @@ The result of the final step should be the final answer. Make sure that each ste
         ("placeholder", "{messages}"),
     ]
 )
-planner = planner_prompt | AzureChatOpenAI(
-    model="gpt-4.1", temperature=0
-
-).with_structured_output(Plan)
+planner = planner_prompt | get_node_model("plan_act.planner", "gpt-4.1", temperature=0).with_structured_output(Plan)
 
 class Response(BaseModel):
     """Response to user."""
@@ -77,9 +75,7 @@ You have currently done the follow steps:
 Update your plan accordingly. If no more steps are needed and you can return to the user, then respond with that. Otherwise, fill out the plan. Only add steps to the plan that still NEED to be done. Do not return previously done steps as part of the plan."""
 )
 
-replanner = replanner_prompt | AzureChatOpenAI(
-    model="gpt-4.1", temperature=0
-).with_structured_output(Act)
+replanner = replanner_prompt | get_node_model("plan_act.replanner", "gpt-4.1", temperature=0).with_structured_output(Act)
 
 async def execute_step(state: PlanExecute):
     plan = state["plan"]
@@ -178,5 +174,6 @@ workflow.add_conditional_edges(
 
 # Finally, we compile it!
 # This compiles it into a LangChain Runnable,
-# meaning you can use it as you would any other runnable
-graph = workflow.compile()
\ No newline at end of file
+# meaning you can use it as you would any other runnable.
+# human_approval pauses on interrupt(), so runs outside the LangGraph server need a checkpointer (CHECKPOINTER).
+graph = workflow.compile(checkpointer=get_checkpointer())
\ No newline at end of file
@@ -1,13 +1,29 @@
+import asyncio
 import os
 import datetime
-import pytz
+import json
+import logging
+from typing import Literal
 from dotenv import load_dotenv
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langchain_core.tools import tool
 from langchain_mcp_adapters.client import MultiServerMCPClient
-from langchain_openai import AzureChatOpenAI
+from langgraph.graph import END, START, MessagesState, StateGraph
 from langgraph.prebuilt import create_react_agent
+from langgraph.types import Command
+from src.agents.transactions import spend_query
+from src.utils import blackboard
+from src.utils.blackboard import BlackboardState
+from src.utils.blocking import watch_event_loop
+from src.utils.bootstrap import with_customer_context
+from src.utils.mcp_tools import load_mcp_tools
+from src.utils.models import aget_node_model
+from src.utils.result_store import offload_large_results, read_result
+from src.utils.tool_cache import memoize_read_only
+from src.utils.tool_node import tool_node
+
+logger = logging.getLogger(__name__)
 
-llm = AzureChatOpenAI(model="gpt-4.1", verbose=True)
 PROMPT = """You are an expert transaction banking assistant at a leading Dutch bank that helps users with their financial transactions.
 
 [Important]
@@ -57,6 +73,17 @@ Reply with total spending last month.
 </example>
 
 Follow these instructions precisely for any spending amount query to ensure all paginated data is fetched and aggregated before answering.
+
+For questions about all accounts together (e.g. "total spend across all my accounts"), call get_portfolio_transactions_summary once with the date range instead of paging get_transactions per account. It returns the totals per account and overall.
+"""
+
+ANSWER_PROMPT = """You are an expert transaction banking assistant at a leading Dutch bank.
+The user's question has already been answered from their transactions; the computed result is below.
+Reply to the user in one or two friendly sentences using only these figures, including the amount, currency and the covered date range.
+Do not recalculate anything. If "incomplete" is true, mention that not all transactions could be retrieved.
+
+Result:
+{result}
 """
 
 load_dotenv()
@@ -67,6 +94,8 @@ def convert_europe_amsterdam_to_unix(datetime_str: str) -> int:
     Converts a datetime string in Europe/Amsterdam timezone (e.g. '2025-07-01 00:00:00') to UNIX timestamp in milliseconds.
     Accepts formats like 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS'.
     """
+    import pytz
+
     tz = pytz.timezone('Europe/Amsterdam')
     try:
         dt = datetime.datetime.strptime(datetime_str, "%Y-%m-%d %H:%M:%S")
@@ -101,15 +130,74 @@ client = MultiServerMCPClient(
 
 
 
+def _question(state: MessagesState) -> str:
+    user_messages = [m for m in state["messages"] if isinstance(m, HumanMessage)]
+    if not user_messages:
+        return ""
+    content = user_messages[-1].content
+    if isinstance(content, str):
+        return content
+    return " ".join(block.get("text", "") for block in content if isinstance(block, dict))
+
+
 async def graph():
-    tools = await client.get_tools()
+    watch_event_loop()
+    tools = await load_mcp_tools(client)
 
     # Add the local conversion tool
     tools.append(convert_europe_amsterdam_to_unix)
+    tools_by_name = {t.name: t for t in tools}
+    answer_model = await aget_node_model("TransactionsAgent.answer", "gpt-4.1", verbose=True)
 
-    return create_react_agent(
+    agent = create_react_agent(
         name="TransactionsAgent",
-        model=llm,
-        prompt=PROMPT,
-        tools=tools
+        model=await aget_node_model("TransactionsAgent", "gpt-4.1", verbose=True),
+        prompt=with_customer_context(PROMPT),
+        # Repeated read-only calls in the thread are answered from a short-lived cache;
+        # large results (e.g. full mutation pages) reach the LLM as a preview and a read_result handle,
+        # while the blackboard and cache inside that keep the full result
+        tools=tool_node([*tools, read_result], [offload_large_results, blackboard.share_on_blackboard, memoize_read_only]),
+        state_schema=BlackboardState
     )
+
+    async def answer_spend_query(state: BlackboardState) -> Command[Literal["agent", "__end__"]]:
+        """Answer templated spend/income totals without the agent; anything else goes to the agent."""
+        question = _question(state)
+        # The first pytz use reads its zone files; keep that off the event loop
+        query = spend_query.compile_query(question, await asyncio.to_thread(spend_query.today))
+        if query is None:
+            return Command(goto="agent")
+        # Balances another agent already fetched in this thread are read from the blackboard
+        published = {}
+        try:
+            balances = blackboard.fresh_entry(state, "balances")
+            if balances is not None and balances["value"] is not None:
+                balances = balances["value"]
+            else:
+                content = await tools_by_name["get_account_balance_list"].ainvoke({})
+                balances = spend_query.tool_json(content)
+                new_entry = blackboard.entry("get_account_balance_list", {}, content)
+                published = {"balances": new_entry} if new_entry is not None else {}
+            account = spend_query.resolve_account(query, balances)
+            if account is None:
+                return Command(goto="agent", update={"blackboard": published})
+            result = await spend_query.run_query(query, account["accountNumber"], tools_by_name["get_transactions"])
+        except Exception as e:
+            logger.warning(f"Spend query failed, falling back to the agent: {e}")
+            return Command(goto="agent", update={"blackboard": published})
+
+        response = await answer_model.ainvoke([
+            SystemMessage(ANSWER_PROMPT.format(result=json.dumps(result, indent=2))),
+            HumanMessage(question),
+        ])
+        return Command(goto=END, update={
+            "messages": [AIMessage(content=response.content, name="TransactionsAgent")],
+            "blackboard": published,
+        })
+
+    builder = StateGraph(BlackboardState)
+    builder.add_node("spend_query", answer_spend_query)
+    builder.add_node("agent", agent)
+    builder.add_edge(START, "spend_query")
+    builder.add_edge("agent", END)
+    return builder.compile(name="TransactionsAgent")
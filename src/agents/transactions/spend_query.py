@@ -0,0 +1,297 @@
+"""Deterministic compiler for templated spend and income questions.
+
+Questions like "how much did I spend last month on my personal account at Albert Heijn"
+are parsed into a SpendQuery and answered by paging get_transactions directly, without
+an LLM working out dates, timestamps and sums. Anything the compiler does not fully
+understand returns None, and the question goes to the TransactionsAgent LLM instead.
+"""
+
+import calendar
+import datetime
+import json
+import re
+from dataclasses import dataclass
+from typing import Literal, Optional
+
+# Upper bound on get_transactions pages fetched for one query
+MAX_PAGES = 50
+
+MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+
+_TOTAL = re.compile(r"\b(how much|total|sum)\b")
+# Questions the compiler cannot answer with a single total
+_UNSUPPORTED = re.compile(
+    r"\b(average|avg|per|each|biggest|largest|smallest|most|least|compare|compared|versus|vs|"
+    r"category|categories|breakdown|list|show|which|budget|afford|left|remaining|allowed)\b"
+    # "how much can I spend" asks for a budget, not for past spending
+    r"|\b(?:can|could|should|may|will)\s+(?:i|we)\b"
+)
+_CREDIT = re.compile(r"\b(earn|earned|earning|income|receive|received|incoming|(?:get|got|was|been) paid|refund(?:ed|s)?)\b")
+_DEBIT = re.compile(r"\b(spend|spent|spending|pay|paid|expenses?|expenditure|outgoing|cost)\b")
+
+_ISO_DATE = r"(\d{4}-\d{2}-\d{2})"
+_MONTH_NAMES = "|".join(sorted(MONTHS, key=len, reverse=True))
+_PERIODS = [
+    ("between", re.compile(rf"\b(?:between|from)\s+{_ISO_DATE}\s+(?:and|to|until|till)\s+{_ISO_DATE}\b")),
+    ("since", re.compile(rf"\bsince\s+{_ISO_DATE}\b")),
+    ("relative", re.compile(r"\b(?:in\s+|over\s+|during\s+)?(?:the\s+)?(?:last|past)\s+(\d+)\s+(day|week|month)s?\b")),
+    ("named", re.compile(r"\b(?:so\s+far\s+)?(today|yesterday|this\s+week|last\s+week|this\s+month|last\s+month|previous\s+month|this\s+year|last\s+year)\b")),
+    ("month", re.compile(rf"\b(?:in\s+|during\s+)?({_MONTH_NAMES})\b(?:\s+(\d{{4}}))?")),
+]
+_IBAN = re.compile(r"\b([A-Z]{2}\d{2}\s?[A-Z]{4}(?:\s?\d){10})\b", re.IGNORECASE)
+_ACCOUNT_ALIAS = re.compile(r"\b(?:on|from|in|with|of|for)\s+(?:my|the|our)\s+([a-z][a-z ]*?)\s*account\b")
+_COUNTERPARTY = re.compile(
+    r"\b(?:at|to|from|with)\s+(?!(?:my|pay|spend|receive|get)\b)([\w&'.\- ]+?)\s*"
+    r"(?=\b(?:in|on|during|over|this|last|past|since|between|for|today|yesterday)\b|[?!,]|\.\s*$|$)",
+    re.IGNORECASE,
+)
+# Words that may remain once the period, account and counterparty are taken out; any other
+# word ("on groceries", "in Amsterdam", "to my landlord") is a filter the compiler does not
+# understand, and the question goes to the agent rather than being answered as a plain total
+_FILLER = frozenset("""
+how much total sum in all altogether overall did do does have has had i we me my our the a an
+on at to from with for during over of so far was were is been money euros eur amount account
+can could you tell please know want like d what
+""".split())
+
+
+@dataclass(frozen=True)
+class SpendQuery:
+    direction: Literal["DEBIT", "CREDIT"]
+    # Book date range; end is exclusive
+    start: datetime.date
+    end: datetime.date
+    # IBAN from the question, or an alias such as "personal" or "savings"; None for the main account
+    account: Optional[str] = None
+    # Case-insensitive substring of the counterparty name or description
+    counterparty: Optional[str] = None
+
+
+def _add_months(day: datetime.date, months: int) -> datetime.date:
+    month_index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(month_index, 12)
+    return datetime.date(year, month + 1, min(day.day, calendar.monthrange(year, month + 1)[1]))
+
+
+def _period(kind: str, match: re.Match, today: datetime.date) -> tuple[datetime.date, datetime.date]:
+    tomorrow = today + datetime.timedelta(days=1)
+    if kind == "between":
+        start, last = (datetime.date.fromisoformat(value) for value in match.groups())
+        return start, last + datetime.timedelta(days=1)
+    if kind == "since":
+        return datetime.date.fromisoformat(match.group(1)), tomorrow
+    if kind == "relative":
+        count, unit = int(match.group(1)), match.group(2)
+        if count < 1:
+            raise ValueError(f"empty period: last {count} {unit}s")
+        if unit == "month":
+            return _add_months(today, -count), tomorrow
+        return today - datetime.timedelta(days=count * (7 if unit == "week" else 1)), tomorrow
+    if kind == "named":
+        name = " ".join(match.group(1).split())
+        monday = today - datetime.timedelta(days=today.weekday())
+        first_of_month = today.replace(day=1)
+        return {
+            "today": (today, tomorrow),
+            "yesterday": (today - datetime.timedelta(days=1), today),
+            "this week": (monday, tomorrow),
+            "last week": (monday - datetime.timedelta(days=7), monday),
+            "this month": (first_of_month, tomorrow),
+            "last month": (_add_months(first_of_month, -1), first_of_month),
+            "previous month": (_add_months(first_of_month, -1), first_of_month),
+            "this year": (today.replace(month=1, day=1), tomorrow),
+            "last year": (datetime.date(today.year - 1, 1, 1), today.replace(month=1, day=1)),
+        }[name]
+    # A month name without a year means its most recent occurrence
+    month = MONTHS[match.group(1)]
+    year = int(match.group(2)) if match.group(2) else today.year - (month > today.month)
+    start = datetime.date(year, month, 1)
+    return start, _add_months(start, 1)
+
+
+def compile_query(question: str, today: datetime.date) -> Optional[SpendQuery]:
+    """Parse a spend or income question into a SpendQuery, or return None when it is not a plain total."""
+    text = " ".join(question.split())
+    lowered = text.lower()
+    if not _TOTAL.search(lowered) or _UNSUPPORTED.search(lowered):
+        return None
+
+    credit, debit = _CREDIT.search(lowered), _DEBIT.search(lowered)
+    if credit and not _DEBIT.search(_CREDIT.sub(" ", lowered)):
+        direction = "CREDIT"
+    elif debit and not credit:
+        direction = "DEBIT"
+    else:
+        return None
+
+    # Spans consumed by the period and account, so they are not mistaken for a counterparty
+    consumed = []
+    periods = [(kind, match) for kind, pattern in _PERIODS for match in pattern.finditer(lowered)]
+    if len(periods) != 1:
+        # No period means the agent should ask; several mean a comparison or an ambiguous range
+        return None
+    kind, match = periods[0]
+    try:
+        period = _period(kind, match, today)
+    except ValueError:
+        return None
+    consumed.append(match.span())
+    start, end = period[0], min(period[1], today + datetime.timedelta(days=1))
+    if start >= end:
+        return None
+
+    account = None
+    iban = _IBAN.search(text)
+    alias = _ACCOUNT_ALIAS.search(lowered)
+    # "paid to NL.." / "received from NL.." names the other party's account, not the user's
+    counterparty_iban = iban and re.search(
+        r"\b(?:to|from|at|with)\s+(?:(?:account|rekening)\s+)?$", lowered[:iban.start()]
+    )
+    if iban and not counterparty_iban:
+        account = "".join(iban.group(1).split()).upper()
+        consumed.append(iban.span())
+    elif alias:
+        account = alias.group(1).strip()
+        consumed.append(alias.span())
+
+    remainder = list(text)
+    for begin, finish in consumed:
+        remainder[begin:finish] = " " * (finish - begin)
+    remainder = "".join(remainder)
+    counterparty_matches = [match for match in _COUNTERPARTY.finditer(remainder) if match.group(1).strip()]
+    counterparties = [match.group(1).strip() for match in counterparty_matches]
+    if len(counterparties) > 1:
+        return None
+    # "at the supermarket" is a spending category, not a counterparty name
+    if counterparties and re.match(r"(?:the|a|an|some)\b", counterparties[0], re.IGNORECASE):
+        return None
+    if counterparty_iban:
+        # "paid to account NL.." captures the word account along with the IBAN
+        counterparty = re.sub(r"^(?:account|rekening)\s+", "", counterparties[0], flags=re.IGNORECASE)
+        counterparties = ["".join(counterparty.split()).upper()]
+
+    leftover = remainder.lower()
+    for match in counterparty_matches:
+        leftover = leftover[:match.start()] + " " * (match.end() - match.start()) + leftover[match.end():]
+    for pattern in (_TOTAL, _CREDIT, _DEBIT):
+        leftover = pattern.sub(" ", leftover)
+    if any(word not in _FILLER for word in re.findall(r"[a-z0-9]+", leftover)):
+        return None
+
+    return SpendQuery(
+        direction=direction,
+        start=start,
+        end=end,
+        account=account,
+        counterparty=counterparties[0] if counterparties else None,
+    )
+
+
+def resolve_account(query: SpendQuery, balances: dict) -> Optional[dict]:
+    """Pick the account a query refers to from the account balance list; None when it is unclear."""
+    accounts = [wrapper.get("contract", {}) for wrapper in balances.get("contractList", [])]
+    accounts = [contract for contract in accounts if contract.get("accountNumber")]
+
+    def product_name(contract: dict) -> str:
+        return (contract.get("product", {}).get("name") or "").lower()
+
+    if query.account is None:
+        # Most people use their Personal Account as their main account
+        candidates = [contract for contract in accounts if "personal" in product_name(contract)]
+        candidates = candidates or accounts[:1]
+    elif re.fullmatch(r"[A-Z]{2}\d{2}[A-Z]{4}\d{10}", query.account):
+        candidates = [contract for contract in accounts if "".join(contract["accountNumber"].split()).upper() == query.account]
+    else:
+        alias_words = [word for word in query.account.split() if word not in ("main", "bank")]
+        candidates = [contract for contract in accounts if all(word in product_name(contract) for word in alias_words)]
+    return candidates[0] if len(candidates) == 1 else None
+
+
+def to_unix_ms(day: datetime.date) -> int:
+    """Midnight of the day in Europe/Amsterdam as a UNIX timestamp in milliseconds."""
+    import pytz
+
+    tz = pytz.timezone("Europe/Amsterdam")
+    return int(tz.localize(datetime.datetime(day.year, day.month, day.day)).timestamp() * 1000)
+
+
+def tool_json(content) -> dict:
+    """Return the JSON object in an MCP tool result, given as a string or as text content blocks.
+
+    Tools returning (summary, model) produce one block per item; the summary is skipped.
+    """
+    texts = [content] if isinstance(content, str) else [
+        block.get("text", "") for block in content if isinstance(block, dict)
+    ]
+    for text in texts:
+        try:
+            value = json.loads(text)
+        except ValueError:
+            continue
+        if isinstance(value, dict):
+            return value
+    raise ValueError("The tool result holds no JSON object")
+
+
+def today() -> datetime.date:
+    """The current date in Europe/Amsterdam."""
+    import pytz
+
+    return datetime.datetime.now(pytz.timezone("Europe/Amsterdam")).date()
+
+
+def _mutations(page: dict) -> list[dict]:
+    mutations = page.get("mutationsList", {}).get("mutations", [])
+    return [item.get("mutation", item) for item in mutations]
+
+
+def _matches_counterparty(mutation: dict, counterparty: str) -> bool:
+    lines = mutation.get("descriptionLines") or []
+    haystack = " ".join(
+        [mutation.get("counterAccountName") or "", mutation.get("description") or ""] + [str(line) for line in lines]
+    )
+    counter_account = "".join((mutation.get("counterAccountNumber") or "").split())
+    return counterparty.lower() in haystack.lower() or counterparty.upper() == counter_account.upper()
+
+
+async def run_query(query: SpendQuery, account_number: str, get_transactions) -> dict:
+    """Page through get_transactions for the query and total the matching amounts."""
+    args = {
+        "account_number": account_number,
+        "include_actions": "EXTENDED",
+        "transaction_type": query.direction,
+        "book_date_from": to_unix_ms(query.start),
+        "book_date_to": to_unix_ms(query.end),
+    }
+    total, count, currencies, pages = 0.0, 0, set(), 0
+    last_mutation_key = None
+    while pages < MAX_PAGES:
+        page_args = dict(args, last_mutation_key=last_mutation_key) if last_mutation_key else args
+        page = tool_json(await get_transactions.ainvoke(page_args))
+        if "error" in page:
+            raise RuntimeError(f"get_transactions failed: {page['error']}")
+        pages += 1
+        for mutation in _mutations(page):
+            if query.counterparty and not _matches_counterparty(mutation, query.counterparty):
+                continue
+            total += abs(float(mutation.get("amount", 0)))
+            count += 1
+            if mutation.get("currencyIsoCode"):
+                currencies.add(mutation["currencyIsoCode"])
+        last_mutation_key = page.get("mutationsList", {}).get("lastMutationKey")
+        if not last_mutation_key:
+            break
+
+    return {
+        "direction": "spent" if query.direction == "DEBIT" else "received",
+        "total": round(total, 2),
+        "currency": ", ".join(sorted(currencies)) or "EUR",
+        "transactionCount": count,
+        "accountNumber": account_number,
+        "from": query.start.isoformat(),
+        "toInclusive": (query.end - datetime.timedelta(days=1)).isoformat(),
+        "counterparty": query.counterparty,
+        # True when MAX_PAGES was reached before the last page
+        "incomplete": bool(last_mutation_key),
+    }
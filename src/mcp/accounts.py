@@ -1,9 +1,13 @@
+import asyncio
 from typing import List, Optional, Literal
 from typing import Tuple
-import requests
 from pydantic import BaseModel
 from mcp.server.fastmcp import FastMCP, Context
 
+import upstream
+from api_headers import account_balances_headers, common_headers
+from single_flight import single_flight
+
 class Balance(BaseModel):
     amount: float
     spendingBalance: float
@@ -41,54 +45,40 @@ class ContractList(BaseModel):
     contractList: List[ContractWrapper]
 
 mcp = FastMCP("Account Balance API", port=10000)
+upstream.register_metrics(mcp)
 
-common_headers = {
-    "accept": "application/json",
-    "accept-language": "en",
-    "priority": "u=1, i",
-    "sec-ch-ua": "\"Not;A=Brand\";v=\"99\", \"Google Chrome\";v=\"139\", \"Chromium\";v=\"139\"",
-    "sec-ch-ua-mobile": "?0",
-    "sec-ch-ua-platform": "\"Windows\"",
-    "sec-fetch-dest": "empty",
-    "sec-fetch-mode": "cors",
-    "sec-fetch-site": "same-origin",
-    "Referer": "https://www.abnamro.nl/my-abnamro/my-overview/overview/index.html",
-    "origin": "https://www.abnamro.nl",
-    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36"
-}
-
-@mcp.tool()
-def get_account_balance_list(ctx: Context) -> Tuple[str, ContractList]:
+def _fetch_contract_list(cookie: str) -> ContractList:
     """
     Calls the Account Balance API as described in the OpenAPI spec.
+    Returns the parsed contract list.
     """
     # Compose the endpoint (using PR server as in sample curl)
     url = "https://www.abnamro.nl/my-abnamro/apis/account-balances/v2/"
 
-    cookie = ctx.request_context.request.headers.get("cookie", "")
-
     # Compose query parameters (match curl sample)
     params = {
         "productGroups": ["PAYMENT_ACCOUNTS","SAVINGS_ACCOUNTS","INVESTMENTS","FISCAL_CAPITAL_SOLUTIONS","FISCAL_CAPITAL_SOLUTIONS_PRODUCTS","MORTGAGE","DEPOSITS"],
         "excludeBlocked": False
     }
 
-    req_headers = {
-        "request-context": "appId=cid-v1:057612d6-4c2a-44a6-ae00-fa8e05bcafeb",
-        "request-id": "|d411be3b67b44b35a9dc91bf4f1e1a1e.05b76be958b74dfe",
-        "source": "aab-sys-020419",
-        "traceparent": "00-d411be3b67b44b35a9dc91bf4f1e1a1e-05b76be958b74dfe-01",
-        "x-xsrf-header": "token",
-    }
+    headers = account_balances_headers(cookie)
 
-    headers = {**common_headers, **req_headers , "cookie": cookie}
-    
     # Make the HTTP GET request with a timeout to prevent hanging indefinitely
-    response = requests.get(url, params=params, headers=headers, timeout=10, verify=False)
+    response = upstream.request("get_account_balance_list", "GET", url, params=params, headers=headers, verify=False)
     data = response.json()
     print("Response data:", data)
     # Parse the response into ContractList
-    contract_list = ContractList.model_validate(data)
+    return ContractList.model_validate(data)
+
+
+@mcp.tool()
+@single_flight
+def get_account_balance_list(ctx: Context) -> Tuple[str, ContractList]:
+    """
+    Calls the Account Balance API as described in the OpenAPI spec.
+    """
+    cookie = ctx.request_context.request.headers.get("cookie", "")
+    contract_list = _fetch_contract_list(cookie)
 
     # Compose a human-readable summary for unstructured output
     summary = f"Accounts found: {len(contract_list.contractList)}. "
@@ -102,6 +92,7 @@ def get_account_balance_list(ctx: Context) -> Tuple[str, ContractList]:
 @mcp.tool(
     description="This tool fetches the list of accounts for the ABN AMRO user. The main account is called 'Personal Account'.",
 )
+@single_flight
 def get_payments_contracts_list(ctx: Context) -> dict:
     """
     Calls the ABN AMRO Payments Contracts List API as described in the provided curl request.
@@ -135,11 +126,12 @@ def get_payments_contracts_list(ctx: Context) -> dict:
 
     headers = {**common_headers, **req_headers , "cookie": cookie}
 
-    response = requests.post(
+    response = upstream.request(
+        "get_payments_contracts_list",
+        "POST",
         url,
         headers=headers,
         json=data,
-        timeout=10,
         verify=False
     )
     try:
@@ -151,9 +143,8 @@ def get_payments_contracts_list(ctx: Context) -> dict:
 
 
 # Tool for ABN AMRO Get Transactions API (from curl)
-@mcp.tool()
-def get_transactions(
-    ctx: Context,
+def _fetch_transactions(
+    cookie: str,
     account_number: str,
     last_mutation_key: Optional[str] = None,
     include_actions: str = "EXTENDED",
@@ -162,17 +153,11 @@ def get_transactions(
     book_date_to: Optional[int] = None
 ) -> dict:
     """
-    Calls the ABN AMRO Get Transactions API as described in the provided curl request.
-    transaction_type: Optional enum, one of 'CREDIT' or 'DEBIT'.
-    book_date_from: Optional[int], timestamp(in milliseconds) for the start date (at time 00:00:00) of transactions.
-    book_date_to: Optional[int], timestamp(in milliseconds) for the end date (at time 00:00:00) of transactions.
+    Calls the ABN AMRO Get Transactions API for one page of an account's mutations.
     Returns the JSON response as a dict.
     """
     url = f"https://www.abnamro.nl/mutations/{account_number}"
 
-    # Extract cookie from context headers
-    cookie = ctx.request_context.request.headers.get("cookie", "")
-
     params = {
         "accountNumber": account_number,
         "includeActions": include_actions,
@@ -204,11 +189,12 @@ def get_transactions(
         "cookie": cookie
     }
 
-    response = requests.get(
+    response = upstream.request(
+        "get_transactions",
+        "GET",
         url,
         params=params,
         headers=headers,
-        timeout=10,
         verify=False
     )
     try:
@@ -217,6 +203,213 @@ def get_transactions(
         print("Failed to parse JSON response:", e)
         resp_json = {"error": str(e), "text": response.text}
     return resp_json
+
+
+@mcp.tool()
+@single_flight
+def get_transactions(
+    ctx: Context,
+    account_number: str,
+    last_mutation_key: Optional[str] = None,
+    include_actions: str = "EXTENDED",
+    transaction_type: Optional[Literal['CREDIT', 'DEBIT']] = None,
+    book_date_from: Optional[int] = None,
+    book_date_to: Optional[int] = None
+) -> dict:
+    """
+    Calls the ABN AMRO Get Transactions API as described in the provided curl request.
+    transaction_type: Optional enum, one of 'CREDIT' or 'DEBIT'.
+    book_date_from: Optional[int], timestamp(in milliseconds) for the start date (at time 00:00:00) of transactions.
+    book_date_to: Optional[int], timestamp(in milliseconds) for the end date (at time 00:00:00) of transactions.
+    Returns the JSON response as a dict.
+    """
+    # Extract cookie from context headers
+    cookie = ctx.request_context.request.headers.get("cookie", "")
+
+    return _fetch_transactions(
+        cookie,
+        account_number,
+        last_mutation_key=last_mutation_key,
+        include_actions=include_actions,
+        transaction_type=transaction_type,
+        book_date_from=book_date_from,
+        book_date_to=book_date_to
+    )
+
+
+# --- Portfolio fan-out ---
+
+# Upper bound for accounts paged at the same time, whatever the caller asks for
+MAX_PORTFOLIO_CONCURRENCY = 8
+# Pages fetched per account before its figures are reported as incomplete
+MAX_PAGES_PER_ACCOUNT = 50
+PORTFOLIO_PRODUCT_GROUPS = ("PAYMENT_ACCOUNTS", "SAVINGS_ACCOUNTS")
+
+
+class AccountTransactionsSummary(BaseModel):
+    accountNumber: str
+    name: str
+    productGroup: str
+    currencyCode: str
+    debitTotal: float = 0.0
+    creditTotal: float = 0.0
+    net: float = 0.0
+    transactionCount: int = 0
+    # Transfers to or from another summarized account, left out of the totals
+    ownTransferCount: int = 0
+    pages: int = 0
+    # False when MAX_PAGES_PER_ACCOUNT was reached or a page failed
+    complete: bool = True
+    error: Optional[str] = None
+
+
+class PortfolioTransactionsSummary(BaseModel):
+    bookDateFrom: Optional[int] = None
+    bookDateTo: Optional[int] = None
+    transactionType: Optional[Literal['CREDIT', 'DEBIT']] = None
+    accounts: List[AccountTransactionsSummary]
+    # Totals per currency code, over the accounts that could be read
+    debitTotal: dict[str, float]
+    creditTotal: dict[str, float]
+    net: dict[str, float]
+    transactionCount: int
+    complete: bool
+
+
+def _iban(account_number: Optional[str]) -> str:
+    return (account_number or "").replace(" ", "").upper()
+
+
+def _summarize_account(
+    cookie: str,
+    contract: Contract,
+    transaction_type: Optional[Literal['CREDIT', 'DEBIT']],
+    book_date_from: Optional[int],
+    book_date_to: Optional[int],
+    own_accounts: frozenset[str] = frozenset()
+) -> AccountTransactionsSummary:
+    """Pages through one account's mutations and totals the debit and credit amounts.
+
+    Mutations whose counter account is one of own_accounts are transfers within the
+    portfolio; they are counted in ownTransferCount but not in the totals.
+    """
+    summary = AccountTransactionsSummary(
+        accountNumber=contract.accountNumber,
+        name=contract.product.name,
+        productGroup=contract.product.productGroup,
+        currencyCode=contract.balance.currencyCode
+    )
+    last_mutation_key = None
+    while summary.pages < MAX_PAGES_PER_ACCOUNT:
+        page = _fetch_transactions(
+            cookie,
+            contract.accountNumber,
+            last_mutation_key=last_mutation_key,
+            transaction_type=transaction_type,
+            book_date_from=book_date_from,
+            book_date_to=book_date_to
+        )
+        if "error" in page:
+            summary.complete = False
+            summary.error = str(page["error"])
+            break
+        summary.pages += 1
+        mutations_list = page.get("mutationsList", {})
+        for item in mutations_list.get("mutations", []):
+            mutation = item.get("mutation", item)
+            if _iban(mutation.get("counterAccountNumber")) in own_accounts:
+                summary.ownTransferCount += 1
+                continue
+            amount = float(mutation.get("amount", 0))
+            if amount < 0:
+                summary.debitTotal += -amount
+            else:
+                summary.creditTotal += amount
+            summary.transactionCount += 1
+        last_mutation_key = mutations_list.get("lastMutationKey")
+        if not last_mutation_key:
+            break
+    else:
+        summary.complete = False
+
+    summary.debitTotal = round(summary.debitTotal, 2)
+    summary.creditTotal = round(summary.creditTotal, 2)
+    summary.net = round(summary.creditTotal - summary.debitTotal, 2)
+    return summary
+
+
+@mcp.tool(
+    description="Totals the transactions of all payment and savings accounts of the user in one call, per account and overall. Prefer this over calling get_transactions for each account."
+)
+async def get_portfolio_transactions_summary(
+    ctx: Context,
+    book_date_from: Optional[int] = None,
+    book_date_to: Optional[int] = None,
+    transaction_type: Optional[Literal['CREDIT', 'DEBIT']] = None,
+    max_concurrency: int = 4
+) -> PortfolioTransactionsSummary:
+    """
+    Lists the user's accounts and pages through the transactions of every payment and savings account concurrently.
+    Parameters:
+        book_date_from: Optional[int], timestamp(in milliseconds) for the start date (at time 00:00:00) of transactions.
+        book_date_to: Optional[int], timestamp(in milliseconds) for the end date (at time 00:00:00) of transactions.
+        transaction_type: Optional enum, one of 'CREDIT' or 'DEBIT'.
+        max_concurrency: Maximum number of accounts paged at the same time (capped at MAX_PORTFOLIO_CONCURRENCY).
+    Returns debit, credit and net totals per account and per currency over all accounts.
+    Transfers between the listed accounts are left out of the totals (see ownTransferCount).
+    """
+    # Extract cookie from context headers
+    cookie = getattr(getattr(getattr(ctx, "request_context", None), "request", None), "headers", {}).get("cookie", "")
+
+    contract_list = await asyncio.to_thread(_fetch_contract_list, cookie)
+    contracts = [
+        wrapper.contract for wrapper in contract_list.contractList
+        if wrapper.contract.product.productGroup in PORTFOLIO_PRODUCT_GROUPS
+    ]
+    own_accounts = frozenset(_iban(contract.accountNumber) for contract in contracts)
+    semaphore = asyncio.Semaphore(max(1, min(max_concurrency, MAX_PORTFOLIO_CONCURRENCY)))
+
+    async def summarize(contract: Contract) -> AccountTransactionsSummary:
+        # Pages of one account depend on each other; accounts are paged in parallel
+        async with semaphore:
+            return await asyncio.to_thread(
+                _summarize_account, cookie, contract, transaction_type, book_date_from, book_date_to, own_accounts
+            )
+
+    results = await asyncio.gather(*(summarize(contract) for contract in contracts), return_exceptions=True)
+
+    accounts = []
+    for contract, result in zip(contracts, results):
+        if isinstance(result, BaseException):
+            result = AccountTransactionsSummary(
+                accountNumber=contract.accountNumber,
+                name=contract.product.name,
+                productGroup=contract.product.productGroup,
+                currencyCode=contract.balance.currencyCode,
+                complete=False,
+                error=str(result)
+            )
+        accounts.append(result)
+
+    debit_total: dict[str, float] = {}
+    credit_total: dict[str, float] = {}
+    for account in accounts:
+        if account.pages == 0:
+            continue
+        debit_total[account.currencyCode] = round(debit_total.get(account.currencyCode, 0.0) + account.debitTotal, 2)
+        credit_total[account.currencyCode] = round(credit_total.get(account.currencyCode, 0.0) + account.creditTotal, 2)
+
+    return PortfolioTransactionsSummary(
+        bookDateFrom=book_date_from,
+        bookDateTo=book_date_to,
+        transactionType=transaction_type,
+        accounts=accounts,
+        debitTotal=debit_total,
+        creditTotal=credit_total,
+        net={currency: round(credit_total[currency] - debit_total[currency], 2) for currency in debit_total},
+        transactionCount=sum(account.transactionCount for account in accounts),
+        complete=all(account.complete for account in accounts)
+    )
 # --- MCP Server ---
 
 if __name__ == "__main__":
@@ -1,12 +1,19 @@
-from typing import Optional
-import requests
+import asyncio
+from typing import Any, Dict, List, Literal, Optional
+from pydantic import BaseModel
 from mcp.server.fastmcp import FastMCP, Context
 
+import upstream
+from api_headers import account_balances_headers
+from single_flight import single_flight
+
 mcp = FastMCP("Address Book API", port=10001)
+upstream.register_metrics(mcp)
 
 @mcp.tool(
     description="Fetches the payments address book for a customer"
 )
+@single_flight
 def fetch_address_book(
     ctx: Context,
     owner_reference: str,
@@ -57,11 +64,12 @@ def fetch_address_book(
         "cookie": cookie
     }
 
-    response = requests.get(
+    response = upstream.request(
+        "fetch_address_book",
+        "GET",
         url,
         params=params,
         headers=headers,
-        timeout=10,
         verify=False
     )
     try:
@@ -74,6 +82,7 @@ def fetch_address_book(
 @mcp.tool(
     description="Fetches payment account number formats for a given country and currency"
 )
+@single_flight
 def fetch_account_number_formats(
     ctx: Context,
     country_iso_codes: str = "NL",
@@ -111,11 +120,12 @@ def fetch_account_number_formats(
         "cookie": cookie
     }
 
-    response = requests.get(
+    response = upstream.request(
+        "fetch_account_number_formats",
+        "GET",
         url,
         params=params,
         headers=headers,
-        timeout=10,
         verify=False
     )
     try:
@@ -218,12 +228,13 @@ def fetch_single_sepa_payment_instruction(
         }
     }
 
-    response = requests.post(
+    response = upstream.request(
+        "fetch_single_sepa_payment_instruction",
+        "POST",
         url,
         params=params,
         headers=headers,
         json=json_body,
-        timeout=10,
         verify=False
     )
     try:
@@ -237,6 +248,7 @@ def fetch_single_sepa_payment_instruction(
 @mcp.tool(
     description="Fetches payment models using the /paymentmodels endpoint with query parameters."
 )
+@single_flight
 def fetch_payment_models_query(
     ctx: Context,
     owner_class: str = "BUSINESS_CONTACT",
@@ -293,11 +305,12 @@ def fetch_payment_models_query(
         "cookie": cookie
     }
 
-    response = requests.get(
+    response = upstream.request(
+        "fetch_payment_models_query",
+        "GET",
         url,
         params=params,
         headers=headers,
-        timeout=10,
         verify=False
     )
     try:
@@ -310,6 +323,7 @@ def fetch_payment_models_query(
 @mcp.tool(
     description="Fetches payment instruction type options using the /paymentinstructiontypeoptions endpoint."
 )
+@single_flight
 def fetch_payment_instruction_type_options(
     ctx: Context,
     counter_account_number: str,
@@ -365,11 +379,12 @@ def fetch_payment_instruction_type_options(
         "cookie": cookie
     }
 
-    response = requests.get(
+    response = upstream.request(
+        "fetch_payment_instruction_type_options",
+        "GET",
         url,
         params=params,
         headers=headers,
-        timeout=10,
         verify=False
     )
     try:
@@ -383,6 +398,7 @@ def fetch_payment_instruction_type_options(
 @mcp.tool(
     description="Validates a payment account holder using name and IBAN"
 )
+@single_flight
 def fetch_account_holder_validation(
     ctx: Context,
     name: str = "Jonice Siems",
@@ -427,11 +443,12 @@ def fetch_account_holder_validation(
         }
     }
 
-    response = requests.post(
+    response = upstream.request(
+        "fetch_account_holder_validation",
+        "POST",
         url,
         headers=headers,
         json=json_body,
-        timeout=10,
         verify=False
     )
     try:
@@ -441,5 +458,282 @@ def fetch_account_holder_validation(
         resp_json = {"error": str(e), "text": response.text}
     return resp_json
 
+# --- Payment pre-flight ---
+
+class PreflightAccount(BaseModel):
+    accountNumber: str
+    name: Optional[str] = None
+    contractNumber: Optional[str] = None
+    businessContactNumber: Optional[int] = None
+    spendingBalance: Optional[float] = None
+    currencyCode: Optional[str] = None
+    isBlocked: bool = False
+
+class PreflightCounterparty(BaseModel):
+    name: str
+    iban: Optional[str] = None
+    source: Literal["input", "address_book", "unresolved"]
+
+class PaymentPreflight(BaseModel):
+    ready: bool
+    issues: List[str]
+    orderingAccount: Optional[PreflightAccount] = None
+    counterparty: PreflightCounterparty
+    sufficientFunds: Optional[bool] = None
+    addressBookMatches: List[dict] = []
+    checks: Dict[str, Any] = {}
+
+
+def _fetch_account_balances(cookie: str) -> dict:
+    """
+    Calls the Account Balance API (same request as get_account_balance_list on the accounts server).
+    Returns the JSON response as a dict.
+    """
+    url = "https://www.abnamro.nl/my-abnamro/apis/account-balances/v2/"
+
+    params = {
+        "productGroups": ["PAYMENT_ACCOUNTS", "SAVINGS_ACCOUNTS"],
+        "excludeBlocked": False
+    }
+
+    headers = account_balances_headers(cookie)
+
+    response = upstream.request(
+        "get_account_balance_list",
+        "GET",
+        url,
+        params=params,
+        headers=headers,
+        verify=False
+    )
+    try:
+        resp_json = response.json()
+    except Exception as e:
+        print("Failed to parse JSON response:", e)
+        resp_json = {"error": str(e), "text": response.text}
+    return resp_json
+
+
+def _normalize_iban(value: str) -> str:
+    return "".join(value.split()).upper()
+
+
+def _find_ordering_account(balances: dict, account_number: str) -> Optional[PreflightAccount]:
+    for wrapper in balances.get("contractList", []):
+        contract = wrapper.get("contract", {})
+        if _normalize_iban(contract.get("accountNumber", "")) != _normalize_iban(account_number):
+            continue
+        balance = contract.get("balance", {})
+        return PreflightAccount(
+            accountNumber=contract["accountNumber"],
+            name=contract.get("product", {}).get("name"),
+            contractNumber=contract.get("contractNumber"),
+            businessContactNumber=contract.get("customer", {}).get("bcNumber"),
+            spendingBalance=balance.get("spendingBalance", balance.get("amount")),
+            currencyCode=balance.get("currencyCode"),
+            isBlocked=contract.get("isBlocked", False)
+        )
+    return None
+
+
+def _json_dicts(node) -> List[dict]:
+    """Every dict in a JSON value, outermost first."""
+    if isinstance(node, list):
+        return [item for value in node for item in _json_dicts(value)]
+    if isinstance(node, dict):
+        return [node] + [item for value in node.values() for item in _json_dicts(value)]
+    return []
+
+
+# Verification of payee outcome of the account holder validation; only a full match lets the payment go ahead
+HOLDER_MATCH = "MATCH"
+_HOLDER_RESULT_FIELDS = ("matchResult", "result")
+
+
+def _holder_validation_issue(validation: Any, name: str, iban: str) -> Optional[str]:
+    """Why the account holder validation blocks the payment, or None when name and IBAN match."""
+    result = next((
+        str(item[field]).upper() for item in _json_dicts(validation) for field in _HOLDER_RESULT_FIELDS
+        if isinstance(item.get(field), str)
+    ), None)
+    if result == HOLDER_MATCH:
+        return None
+    if result is None:
+        return f"The account holder validation of {iban} gave no result; confirm the recipient with the user."
+    suggested = next((item["suggestedName"] for item in _json_dicts(validation) if item.get("suggestedName")), None)
+    return (
+        f"The name '{name}' does not match the holder of {iban} ({result})"
+        + (f"; the bank suggests '{suggested}'" if suggested else "")
+        + ". Ask the user to check the recipient."
+    )
+
+
+def _instruction_type_issue(options: Any, iban: str) -> Optional[str]:
+    """Why the payment instruction type options block a SEPA credit transfer to iban, or None when it is allowed."""
+    sepa = [
+        item for item in _json_dicts(options)
+        if "SEPA" in str(item.get("paymentInstructionType", "")).upper()
+    ]
+    if any(item.get("allowed", True) is not False and not item.get("blocked") for item in sepa):
+        return None
+    return f"A SEPA credit transfer to {iban} is not allowed from this account."
+
+
+def _address_book_entries(node) -> List[dict]:
+    """Collects every entry of an address book response that carries a name and an account number."""
+    entries = []
+    if isinstance(node, list):
+        for item in node:
+            entries.extend(_address_book_entries(item))
+    elif isinstance(node, dict):
+        name = node.get("name") or node.get("counterPartyName") or node.get("accountHolderName")
+        iban = node.get("accountNumber") or node.get("iban") or node.get("counterAccountNumber")
+        if isinstance(name, str) and isinstance(iban, str):
+            entries.append({"name": name, "iban": iban})
+        else:
+            for value in node.values():
+                entries.extend(_address_book_entries(value))
+    return entries
+
+
+@mcp.tool(
+    description="Runs every check needed before a payment in one call: source account balance, address book lookup of the counterparty, "
+                "account number formats, payment instruction type options and account holder validation. "
+                "Use this before fetch_single_sepa_payment_instruction instead of calling those tools one by one."
+)
+async def payment_preflight(
+    ctx: Context,
+    ordering_account_number: str,
+    amount: float,
+    counterparty_name: str,
+    counterparty_iban: str = "",
+    owner_reference: str = "",
+    currency_iso_code: str = "EUR"
+) -> PaymentPreflight:
+    """
+    Runs the payment pre-flight checks concurrently and returns a single verdict.
+    Parameters:
+        ordering_account_number: IBAN of the account the payment is made from.
+        amount: Amount to transfer.
+        counterparty_name: Name of the recipient.
+        counterparty_iban: IBAN of the recipient; looked up in the address book by name when empty.
+        owner_reference: Business contact number that owns the address book; taken from the ordering account when empty.
+        currency_iso_code: Currency of the payment (default: EUR).
+    """
+    # Extract cookie from context headers
+    cookie = getattr(getattr(getattr(ctx, "request_context", None), "request", None), "headers", {}).get("cookie", "")
+
+    async def counterparty_checks(iban: str) -> Dict[str, Any]:
+        formats, options, validation = await asyncio.gather(
+            # The counterparty's country comes from its IBAN, given or resolved
+            fetch_account_number_formats(
+                ctx, country_iso_codes=_normalize_iban(iban)[:2], currency_iso_code=currency_iso_code
+            ),
+            fetch_payment_instruction_type_options(
+                ctx,
+                counter_account_number=iban,
+                ordering_account_number=ordering_account_number,
+                counter_bank_country_iso_code=_normalize_iban(iban)[:2],
+                ordering_account_currency_iso_code=currency_iso_code,
+                transaction_currency_iso_code=currency_iso_code
+            ),
+            fetch_account_holder_validation(ctx, name=counterparty_name, iban=iban),
+            return_exceptions=True
+        )
+        return {
+            "account_number_formats": formats,
+            "payment_instruction_type_options": options,
+            "account_holder_validation": validation,
+        }
+
+    # Everything that does not depend on an unknown input starts right away
+    pending = {"balances": asyncio.to_thread(_fetch_account_balances, cookie)}
+    if owner_reference:
+        pending["address_book"] = fetch_address_book(ctx, owner_reference=owner_reference, search_string=counterparty_name)
+    if counterparty_iban:
+        pending["counterparty_checks"] = counterparty_checks(counterparty_iban)
+    checks: Dict[str, Any] = dict(zip(pending, await asyncio.gather(*pending.values(), return_exceptions=True)))
+    if counterparty_iban:
+        checks.update(checks.pop("counterparty_checks"))
+
+    issues = []
+    balances = checks["balances"]
+    ordering_account = None
+    if isinstance(balances, dict) and "error" not in balances:
+        ordering_account = _find_ordering_account(balances, ordering_account_number)
+    if ordering_account is None:
+        issues.append(f"Ordering account {ordering_account_number} was not found among the customer's accounts.")
+
+    # Without an IBAN the counterparty has to come from the address book, which needs the owner reference
+    matches: List[dict] = []
+    if not owner_reference and ordering_account is not None and ordering_account.businessContactNumber:
+        owner_reference = str(ordering_account.businessContactNumber)
+        if not counterparty_iban:
+            try:
+                checks["address_book"] = await fetch_address_book(
+                    ctx, owner_reference=owner_reference, search_string=counterparty_name
+                )
+            except Exception as e:
+                checks["address_book"] = e
+    if isinstance(checks.get("address_book"), dict):
+        matches = [
+            entry for entry in _address_book_entries(checks["address_book"])
+            if counterparty_name.lower() in entry["name"].lower()
+        ]
+
+    if counterparty_iban:
+        counterparty = PreflightCounterparty(name=counterparty_name, iban=counterparty_iban, source="input")
+    elif len({_normalize_iban(match["iban"]) for match in matches}) == 1:
+        counterparty = PreflightCounterparty(name=matches[0]["name"], iban=matches[0]["iban"], source="address_book")
+        checks.update(await counterparty_checks(counterparty.iban))
+    else:
+        counterparty = PreflightCounterparty(name=counterparty_name, source="unresolved")
+        if matches:
+            issues.append(f"Several address book entries match '{counterparty_name}'; ask the user which one to pay.")
+        else:
+            issues.append(f"No IBAN given and no address book entry matches '{counterparty_name}'; ask the user for the IBAN.")
+
+    sufficient_funds = None
+    if ordering_account is not None:
+        if ordering_account.isBlocked:
+            issues.append(f"Ordering account {ordering_account.accountNumber} is blocked.")
+        if ordering_account.spendingBalance is not None:
+            sufficient_funds = ordering_account.spendingBalance >= amount
+            if not sufficient_funds:
+                issues.append(
+                    f"Insufficient funds: spending balance is {ordering_account.spendingBalance} {ordering_account.currencyCode}, payment is {amount}."
+                )
+
+    # Balances and the address book are summarized above; keep the raw answers of the other checks
+    for name in ("balances", "address_book"):
+        if isinstance(checks.get(name), dict) and "error" not in checks[name]:
+            del checks[name]
+    for name, result in checks.items():
+        if isinstance(result, BaseException):
+            checks[name] = {"error": str(result)}
+        if isinstance(checks[name], dict) and "error" in checks[name]:
+            issues.append(f"Check {name} failed: {checks[name]['error']}")
+    # Answers that arrived are read too: a name mismatch or a disallowed transfer blocks the payment
+    validation = checks.get("account_holder_validation")
+    if validation is not None and not (isinstance(validation, dict) and "error" in validation):
+        issue = _holder_validation_issue(validation, counterparty.name, counterparty.iban)
+        if issue:
+            issues.append(issue)
+    options = checks.get("payment_instruction_type_options")
+    if options is not None and not (isinstance(options, dict) and "error" in options):
+        issue = _instruction_type_issue(options, counterparty.iban)
+        if issue:
+            issues.append(issue)
+
+    return PaymentPreflight(
+        ready=not issues,
+        issues=issues,
+        orderingAccount=ordering_account,
+        counterparty=counterparty,
+        sufficientFunds=sufficient_funds,
+        addressBookMatches=matches,
+        checks=checks
+    )
+
 if __name__ == "__main__":
     mcp.run(transport="streamable-http")
\ No newline at end of file
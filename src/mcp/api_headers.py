@@ -0,0 +1,31 @@
+# Headers the ABN AMRO web APIs expect, shared by the MCP servers that call the same APIs.
+
+common_headers = {
+    "accept": "application/json",
+    "accept-language": "en",
+    "priority": "u=1, i",
+    "sec-ch-ua": "\"Not;A=Brand\";v=\"99\", \"Google Chrome\";v=\"139\", \"Chromium\";v=\"139\"",
+    "sec-ch-ua-mobile": "?0",
+    "sec-ch-ua-platform": "\"Windows\"",
+    "sec-fetch-dest": "empty",
+    "sec-fetch-mode": "cors",
+    "sec-fetch-site": "same-origin",
+    "Referer": "https://www.abnamro.nl/my-abnamro/my-overview/overview/index.html",
+    "origin": "https://www.abnamro.nl",
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36"
+}
+
+
+def account_balances_headers(cookie: str) -> dict:
+    """
+    Headers of an Account Balance API request, for get_account_balance_list (accounts server)
+    and the balance check of payment_preflight (address book server).
+    """
+    req_headers = {
+        "request-context": "appId=cid-v1:057612d6-4c2a-44a6-ae00-fa8e05bcafeb",
+        "request-id": "|d411be3b67b44b35a9dc91bf4f1e1a1e.05b76be958b74dfe",
+        "source": "aab-sys-020419",
+        "traceparent": "00-d411be3b67b44b35a9dc91bf4f1e1a1e-05b76be958b74dfe-01",
+        "x-xsrf-header": "token",
+    }
+    return {**common_headers, **req_headers, "cookie": cookie}
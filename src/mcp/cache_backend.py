@@ -0,0 +1,229 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Optional
+
+# --- Cache backends ---
+#
+# Storage behind the per-session caches of sessions.py. Values must be JSON serializable.
+#   memory  per process, LRU bounded (default, one server process)
+#   sqlite  a SQLite file shared by every process that opens it (MCP_CACHE_PATH)
+#   shm     SQLite in shared memory (/dev/shm), for several workers on one node
+#   redis   a Redis compatible server (MCP_REDIS_URL), for several nodes; needs `pip install redis`
+#
+# Select with MCP_CACHE_BACKEND. Shared backends expire entries after MCP_CACHE_TTL seconds
+# and, beyond max_entries in a namespace, drop its oldest entries. The SQLite files are
+# created readable by their owner only, since they hold customer data.
+
+CACHE_BACKEND = os.getenv("MCP_CACHE_BACKEND", "memory")
+CACHE_PATH = os.getenv("MCP_CACHE_PATH", "./.mcp_cache.sqlite3")
+CACHE_TTL = float(os.getenv("MCP_CACHE_TTL", "3600"))
+REDIS_URL = os.getenv("MCP_REDIS_URL", "redis://localhost:6379/0")
+# Seconds between sweeps of expired entries in the SQLite backends
+EXPIRE_INTERVAL = 60.0
+
+
+class CacheBackend(ABC):
+    """Key/value storage grouped in namespaces (one per user session and cache name)."""
+
+    # True when entries are only visible to this process, so they can be dropped with the session
+    local = False
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: Any, max_entries: int) -> None:
+        """Stores a value, keeping at most max_entries per namespace (the most recently used, or for
+        shared backends the most recently stored)."""
+
+    @abstractmethod
+    def delete_prefix(self, namespace: str, prefix: str) -> None:
+        """Deletes every key of the namespace that starts with prefix ("" for all)."""
+
+    def size(self) -> int:
+        """Number of stored entries, or -1 when the backend cannot tell cheaply."""
+        return -1
+
+
+class InMemoryBackend(CacheBackend):
+    local = True
+
+    def __init__(self):
+        self._namespaces: dict[str, "OrderedDict[str, Any]"] = {}
+        # Tools run in worker threads, so access is serialized
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            entries = self._namespaces.get(namespace)
+            if entries is None or key not in entries:
+                return None
+            entries.move_to_end(key)
+            return entries[key]
+
+    def set(self, namespace: str, key: str, value: Any, max_entries: int) -> None:
+        with self._lock:
+            entries = self._namespaces.setdefault(namespace, OrderedDict())
+            entries[key] = value
+            entries.move_to_end(key)
+            while len(entries) > max_entries:
+                entries.popitem(last=False)
+
+    def delete_prefix(self, namespace: str, prefix: str) -> None:
+        with self._lock:
+            entries = self._namespaces.get(namespace)
+            if entries is None:
+                return
+            for key in [key for key in entries if key.startswith(prefix)]:
+                del entries[key]
+            if not entries:
+                del self._namespaces[namespace]
+
+    def size(self) -> int:
+        with self._lock:
+            return sum(len(entries) for entries in self._namespaces.values())
+
+
+class SQLiteBackend(CacheBackend):
+    """Entries in a SQLite database, shared by all processes that open the same file."""
+
+    def __init__(self, path: str = CACHE_PATH, ttl: float = CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._expired_at = 0.0
+        # Created owner-only before SQLite opens it; the WAL files SQLite adds take the same mode
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+        with self._connection() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS cache_namespace_expiry ON cache (namespace, expires_at)")
+            db.execute("CREATE INDEX IF NOT EXISTS cache_expiry ON cache (expires_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        row = self._connection().execute(
+            "SELECT value FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (namespace, key, time.time()),
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set(self, namespace: str, key: str, value: Any, max_entries: int) -> None:
+        now = time.time()
+        db = self._connection()
+        db.execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value), now + self.ttl),
+        )
+        # Entries share one TTL, so the earliest expiring are the oldest
+        db.execute(
+            "DELETE FROM cache WHERE namespace = ? AND key IN ("
+            " SELECT key FROM cache WHERE namespace = ? ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (namespace, namespace, max_entries),
+        )
+        if now - self._expired_at >= EXPIRE_INTERVAL:
+            self._expired_at = now
+            db.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+
+    def delete_prefix(self, namespace: str, prefix: str) -> None:
+        self._connection().execute(
+            "DELETE FROM cache WHERE namespace = ? AND substr(key, 1, ?) = ?",
+            (namespace, len(prefix), prefix),
+        )
+
+    def size(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+class SharedMemoryBackend(SQLiteBackend):
+    """SQLite on a RAM backed filesystem, so workers on one node share entries without disk I/O."""
+
+    def __init__(self, name: str = "mcp_cache.sqlite3", ttl: float = CACHE_TTL):
+        directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        super().__init__(os.path.join(directory, name), ttl)
+
+
+class RedisBackend(CacheBackend):
+    """Entries in a Redis compatible server, shared by workers on every node."""
+
+    def __init__(self, url: str = REDIS_URL, ttl: float = CACHE_TTL):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("MCP_CACHE_BACKEND=redis needs the redis package. Run 'pip install redis'.") from e
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url)
+
+    @staticmethod
+    def _key(namespace: str, key: str) -> str:
+        return f"mcp-cache:{namespace}:{key}"
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        value = self._client.get(self._key(namespace, key))
+        return None if value is None else json.loads(value)
+
+    @staticmethod
+    def _index(namespace: str) -> str:
+        # Sorted set of the namespace's keys by the time they were stored
+        return f"mcp-cache-index:{namespace}"
+
+    def set(self, namespace: str, key: str, value: Any, max_entries: int) -> None:
+        ttl = max(1, int(self.ttl))
+        index = self._index(namespace)
+        pipeline = self._client.pipeline()
+        pipeline.set(self._key(namespace, key), json.dumps(value), ex=ttl)
+        pipeline.zadd(index, {key: time.time()})
+        pipeline.zremrangebyscore(index, "-inf", time.time() - ttl)
+        pipeline.expire(index, ttl)
+        pipeline.zrange(index, 0, -max_entries - 1)
+        evicted = pipeline.execute()[-1]
+        if evicted:
+            pipeline = self._client.pipeline()
+            pipeline.delete(*(self._key(namespace, old.decode()) for old in evicted))
+            pipeline.zrem(index, *evicted)
+            pipeline.execute()
+
+    def delete_prefix(self, namespace: str, prefix: str) -> None:
+        keys = list(self._client.scan_iter(match=self._key(namespace, prefix) + "*"))
+        if keys:
+            self._client.delete(*keys)
+            self._client.zrem(self._index(namespace), *(key.decode()[len(self._key(namespace, "")):] for key in keys))
+
+
+_BACKENDS = {
+    "memory": InMemoryBackend,
+    "sqlite": SQLiteBackend,
+    "shm": SharedMemoryBackend,
+    "redis": RedisBackend,
+}
+_backend: Optional[CacheBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> CacheBackend:
+    """Returns the process wide cache backend selected by MCP_CACHE_BACKEND."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if CACHE_BACKEND not in _BACKENDS:
+                raise ValueError(f"Unknown MCP_CACHE_BACKEND {CACHE_BACKEND!r}, expected one of {sorted(_BACKENDS)}")
+            _backend = _BACKENDS[CACHE_BACKEND]()
+        return _backend
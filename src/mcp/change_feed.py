@@ -0,0 +1,227 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+import requests
+from pydantic import AnyUrl
+from mcp.server.fastmcp import FastMCP
+from mcp.server.session import ServerSession
+
+logger = logging.getLogger(__name__)
+
+# --- Change feed ---
+#
+# Keeps a per-session snapshot of an upstream listing (tasks, messages) and
+# exposes it as an MCP resource. While a client is subscribed to the resource,
+# a background poller refreshes the snapshot with conditional requests and
+# pushes `notifications/resources/updated` whenever the content hash changes.
+#
+# Enable with MCP_CHANGE_FEED=1; MCP_CHANGE_FEED_INTERVAL sets the poll interval in seconds.
+
+CHANGE_FEED_ENABLED = os.getenv("MCP_CHANGE_FEED", "0").lower() in ("1", "true", "yes")
+CHANGE_FEED_INTERVAL = float(os.getenv("MCP_CHANGE_FEED_INTERVAL", "30"))
+# Pollers without subscribers stop after this many intervals without a resource read
+IDLE_INTERVALS = 10
+
+# fetch(cookie, conditional_headers) -> upstream response
+FetchListing = Callable[[str, dict], requests.Response]
+
+# Refreshes scheduled by invalidate(), referenced so they are not garbage collected mid-flight
+_refresh_tasks: set[asyncio.Task] = set()
+
+
+class _SessionFeed:
+    def __init__(self, cookie: str):
+        self.cookie = cookie
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.digest: Optional[str] = None
+        self.snapshot = None
+        self.updated_at: Optional[str] = None
+        self.last_read = time.monotonic()
+        self.subscribers: set[ServerSession] = set()
+        self.poller: Optional[asyncio.Task] = None
+        self.lock = asyncio.Lock()
+
+
+class ChangeFeed:
+    """Snapshot of one upstream listing per session, published as a subscribable MCP resource."""
+
+    def __init__(
+        self,
+        mcp: FastMCP,
+        uri: str,
+        fetch: FetchListing,
+        *,
+        name: str,
+        description: str,
+        interval: float = CHANGE_FEED_INTERVAL,
+        enabled: bool = CHANGE_FEED_ENABLED,
+    ):
+        self.mcp = mcp
+        self.uri = uri
+        self.fetch = fetch
+        self.interval = interval
+        self.enabled = enabled
+        self._sessions: dict[str, _SessionFeed] = {}
+
+        mcp.resource(uri, name=name, description=description, mime_type="application/json")(self._read)
+        _register(mcp, self)
+
+    def _current_cookie(self) -> str:
+        ctx = self.mcp.get_context()
+        return getattr(getattr(getattr(ctx, "request_context", None), "request", None), "headers", {}).get("cookie", "")
+
+    def _session(self, cookie: str) -> _SessionFeed:
+        key = hashlib.sha256(cookie.encode()).hexdigest()
+        if key not in self._sessions:
+            self._sessions[key] = _SessionFeed(cookie)
+        return self._sessions[key]
+
+    def _drop(self, state: _SessionFeed) -> None:
+        key = hashlib.sha256(state.cookie.encode()).hexdigest()
+        if self._sessions.get(key) is state:
+            del self._sessions[key]
+
+    async def _read(self) -> str:
+        if not self.enabled:
+            # Without a poller nothing would ever drop a stored session, so read through a throwaway one
+            state = _SessionFeed(self._current_cookie())
+            await self.refresh(state)
+            return json.dumps({"updatedAt": state.updated_at, "data": state.snapshot})
+        state = self._session(self._current_cookie())
+        state.last_read = time.monotonic()
+        if state.snapshot is None:
+            await self.refresh(state)
+        self._ensure_poller(state)
+        return json.dumps({"updatedAt": state.updated_at, "data": state.snapshot})
+
+    async def subscribe(self, session: ServerSession) -> None:
+        if not self.enabled:
+            # Nothing polls for changes, so there is nothing to notify about
+            return
+        state = self._session(self._current_cookie())
+        state.subscribers.add(session)
+        if state.snapshot is None:
+            await self.refresh(state)
+        self._ensure_poller(state)
+
+    async def unsubscribe(self, session: ServerSession) -> None:
+        state = self._sessions.get(hashlib.sha256(self._current_cookie().encode()).hexdigest())
+        if state is not None:
+            state.subscribers.discard(session)
+
+    def invalidate(self, cookie: str) -> None:
+        """Schedules an immediate refresh of the session's snapshot, e.g. after a delete."""
+        state = self._sessions.get(hashlib.sha256(cookie.encode()).hexdigest())
+        if state is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No loop to refresh on; drop validators so the next poll refetches
+            state.etag = state.last_modified = None
+            return
+        task = loop.create_task(self.refresh(state))
+        _refresh_tasks.add(task)
+        task.add_done_callback(_refresh_tasks.discard)
+
+    async def refresh(self, state: _SessionFeed) -> bool:
+        """Refetches the listing and notifies subscribers. Returns True when the content changed."""
+        async with state.lock:
+            conditional = {}
+            if state.etag:
+                conditional["if-none-match"] = state.etag
+            if state.last_modified:
+                conditional["if-modified-since"] = state.last_modified
+
+            response = await asyncio.to_thread(self.fetch, state.cookie, conditional)
+            if response.status_code == 304:
+                return False
+            try:
+                body = response.json()
+            except Exception as e:
+                logger.warning("Change feed %s returned an unparsable response: %s", self.uri, e)
+                return False
+            if not 200 <= response.status_code < 300:
+                logger.warning("Change feed %s refresh failed with status %s", self.uri, response.status_code)
+                return False
+
+            state.etag = response.headers.get("etag")
+            state.last_modified = response.headers.get("last-modified")
+            digest = hashlib.sha256(json.dumps(body, sort_keys=True, default=str).encode()).hexdigest()
+            if digest == state.digest:
+                return False
+            first_snapshot = state.digest is None
+            state.digest = digest
+            state.snapshot = body
+            state.updated_at = datetime.now(timezone.utc).isoformat()
+
+        if not first_snapshot:
+            await self._notify(state)
+        return True
+
+    async def _notify(self, state: _SessionFeed) -> None:
+        for session in list(state.subscribers):
+            try:
+                await session.send_resource_updated(AnyUrl(self.uri))
+            except Exception:
+                # The client went away; forget the subscription
+                state.subscribers.discard(session)
+
+    def _ensure_poller(self, state: _SessionFeed) -> None:
+        if not self.enabled or (state.poller is not None and not state.poller.done()):
+            return
+        state.poller = asyncio.get_running_loop().create_task(self._poll(state))
+
+    async def _poll(self, state: _SessionFeed) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            idle = time.monotonic() - state.last_read > self.interval * IDLE_INTERVALS
+            if not state.subscribers and idle:
+                self._drop(state)
+                return
+            try:
+                await self.refresh(state)
+            except Exception as e:
+                logger.warning("Change feed %s refresh failed: %s", self.uri, e)
+
+
+# Feeds per server, so one subscribe handler can dispatch on the resource URI
+_feeds: dict[int, dict[str, ChangeFeed]] = {}
+
+
+def _register(mcp: FastMCP, feed: ChangeFeed) -> None:
+    feeds = _feeds.setdefault(id(mcp), {})
+    first_feed = not feeds
+    feeds[feed.uri] = feed
+    if not first_feed:
+        return
+
+    server = mcp._mcp_server
+
+    @server.subscribe_resource()
+    async def handle_subscribe(uri: AnyUrl) -> None:
+        if str(uri) in feeds:
+            await feeds[str(uri)].subscribe(server.request_context.session)
+
+    @server.unsubscribe_resource()
+    async def handle_unsubscribe(uri: AnyUrl) -> None:
+        if str(uri) in feeds:
+            await feeds[str(uri)].unsubscribe(server.request_context.session)
+
+    # The low-level server always reports subscribe=False; advertise the handlers registered above
+    get_capabilities = server.get_capabilities
+
+    def get_capabilities_with_subscribe(*args, **kwargs):
+        capabilities = get_capabilities(*args, **kwargs)
+        if capabilities.resources is not None:
+            capabilities.resources.subscribe = True
+        return capabilities
+
+    server.get_capabilities = get_capabilities_with_subscribe
@@ -1,17 +1,21 @@
 from typing import List, Optional
 from typing import Tuple
-import requests
 from pydantic import BaseModel
 from mcp.server.fastmcp import FastMCP, Context
 
+import upstream
+from single_flight import single_flight
+
 # --- MCP Server ---
 
 mcp = FastMCP("Manage Customer Data API",port=10002)
+upstream.register_metrics(mcp)
 
 # Tool for ABN AMRO Manage Data Client API (from curl)
 @mcp.tool(
     description="Fetches the details of the customer. This includes name, date of birth, address, email, phone numbers, BSN and other personal information."
 )
+@single_flight
 def get_manage_data_client(ctx: Context) -> dict:
     """
     Calls the ABN AMRO Manage Data Client API as described in the provided curl request.
@@ -42,10 +46,11 @@ def get_manage_data_client(ctx: Context) -> dict:
         "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36"
     }
 
-    response = requests.get(
+    response = upstream.request(
+        "get_manage_data_client",
+        "GET",
         url,
         headers=headers,
-        timeout=10,
         verify=False
     )
     try:
@@ -59,6 +64,7 @@ def get_manage_data_client(ctx: Context) -> dict:
 @mcp.tool(
     description="Validates a new phone number for a customer"
 )
+@single_flight
 def validate_new_phone_number(
     ctx: Context,
     international_calling_code: str,
@@ -98,10 +104,11 @@ def validate_new_phone_number(
         "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36"
     }
 
-    response = requests.get(
+    response = upstream.request(
+        "validate_new_phone_number",
+        "GET",
         url,
         headers=headers,
-        timeout=10,
         verify=False
     )
     try:
@@ -176,11 +183,12 @@ def change_phone_number(
         ]
     }
 
-    response = requests.post(
+    response = upstream.request(
+        "change_phone_number",
+        "POST",
         url,
         headers=headers,
         json=body,
-        timeout=10,
         verify=False
     )
     try:
@@ -195,6 +203,7 @@ def change_phone_number(
 @mcp.tool(
     description="Fetches business contacts list for the customer.This includes details like bcNumber, shortName, serviceSegment, clientGroupCode(cgc) and appearanceType"
 )
+@single_flight
 def customer_representatives(ctx: Context) -> dict:
     """
     Calls the ABN AMRO Customer Representatives API as described in the provided curl request.
@@ -223,10 +232,11 @@ def customer_representatives(ctx: Context) -> dict:
         "cookie": cookie
     }
 
-    response = requests.get(
+    response = upstream.request(
+        "customer_representatives",
+        "GET",
         url,
         headers=headers,
-        timeout=10,
         verify=False
     )
     try:
@@ -1,25 +1,27 @@
+import asyncio
 from typing import List, Optional
 from typing import Tuple
 import requests
 from pydantic import BaseModel
 from mcp.server.fastmcp import FastMCP, Context
 
+import sessions
+import upstream
+from single_flight import single_flight
+from change_feed import ChangeFeed
+
 # --- MCP Server ---
 
 mcp = FastMCP("Customer/User Message management API",port=10003)
+upstream.register_metrics(mcp)
 
-# Tool for ABN AMRO Get Messages API (from curl)
-@mcp.tool()
-def get_messsages(ctx: Context) -> dict:
+def _fetch_message_cards(cookie: str, conditional_headers: Optional[dict] = None) -> requests.Response:
     """
-    Calls the ABN AMRO Get Messages API as described in the provided curl request.
-    Returns the JSON response as a dict.
+    Calls the ABN AMRO Get Messages API, optionally as a conditional request.
+    Returns the raw response.
     """
     url = "https://www.abnamro.nl/my-abnamro/api/message-card/v1/message-cards"
 
-    # Extract cookie from context headers
-    cookie = getattr(getattr(getattr(ctx, "request_context", None), "request", None), "headers", {}).get("cookie", "")
-
     headers = {
         "accept": "application/json",
         "accept-language": "en-GB,en-US;q=0.9,en;q=0.8,nl;q=0.7",
@@ -35,15 +37,30 @@ def get_messsages(ctx: Context) -> dict:
         "sec-fetch-site": "same-origin",
         "traceparent": "00-2f7c58e965ab4ee696f0ffe4bf6d16fc-9be044f080384c21-01",
         "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36",
-        "cookie": cookie
+        "cookie": cookie,
+        **(conditional_headers or {})
     }
 
-    response = requests.get(
+    return upstream.request(
+        "get_messsages",
+        "GET",
         url,
         headers=headers,
-        timeout=10,
         verify=False
     )
+
+# Tool for ABN AMRO Get Messages API (from curl)
+@mcp.tool()
+@single_flight
+def get_messsages(ctx: Context) -> dict:
+    """
+    Calls the ABN AMRO Get Messages API as described in the provided curl request.
+    Returns the JSON response as a dict.
+    """
+    # Extract cookie from context headers
+    cookie = getattr(getattr(getattr(ctx, "request_context", None), "request", None), "headers", {}).get("cookie", "")
+
+    response = _fetch_message_cards(cookie)
     try:
         resp_json = response.json()
     except Exception as e:
@@ -51,22 +68,21 @@ def get_messsages(ctx: Context) -> dict:
         resp_json = {"error": str(e), "text": response.text}
     return resp_json
 
-# Tool for ABN AMRO Delete Message API (from curl)
-@mcp.tool()
-def delete_message(
-    ctx: Context,
-    message_id: int,
-    is_bankmail: bool = False
-) -> dict:
+messages_feed = ChangeFeed(
+    mcp,
+    "messages://current",
+    _fetch_message_cards,
+    name="messages",
+    description="Current message cards of the customer, kept up to date in the background. Read this instead of calling get_messsages repeatedly."
+)
+
+def _delete_message(cookie: str, message_id: int, is_bankmail: bool = False) -> Tuple[int, dict]:
     """
-    Calls the ABN AMRO Delete Message API as described in the provided curl request.
-    Returns the JSON response as a dict.
+    Sets the status of a single message card to DELETE.
+    Returns the HTTP status code and the JSON response as a dict.
     """
     url = f"https://www.abnamro.nl/my-abnamro/api/message-card/v1/message-cards/{message_id}/status?isBankmail={'true' if is_bankmail else 'false'}"
 
-    # Extract cookie from context headers
-    cookie = getattr(getattr(getattr(ctx, "request_context", None), "request", None), "headers", {}).get("cookie", "")
-
     headers = {
         "accept": "application/json",
         "accept-language": "en-GB,en-US;q=0.9,en;q=0.8,nl;q=0.7",
@@ -89,11 +105,12 @@ def delete_message(
 
     body = {"status": "DELETE"}
 
-    response = requests.put(
+    response = upstream.request(
+        "delete_message",
+        "PUT",
         url,
         headers=headers,
         json=body,
-        timeout=10,
         verify=False
     )
     try:
@@ -101,26 +118,43 @@ def delete_message(
     except Exception as e:
         print("Failed to parse JSON response:", e)
         resp_json = {"error": str(e), "text": response.text}
-    return resp_json
+    return response.status_code, resp_json
 
 
-# Tool for ABN AMRO Read Message API (from curl)
+# Tool for ABN AMRO Delete Message API (from curl)
 @mcp.tool()
-def get_detailed_message(
+def delete_message(
     ctx: Context,
+    message_id: int,
+    is_bankmail: bool = False
+) -> dict:
+    """
+    Calls the ABN AMRO Delete Message API as described in the provided curl request.
+    Returns the JSON response as a dict.
+    """
+    # Extract cookie from context headers
+    cookie = getattr(getattr(getattr(ctx, "request_context", None), "request", None), "headers", {}).get("cookie", "")
+
+    status_code, resp_json = _delete_message(cookie, message_id, is_bankmail)
+    # A failed delete leaves the message, and its cached details, in place
+    if 200 <= status_code < 300:
+        _forget_message(cookie, message_id)
+        messages_feed.invalidate(cookie)
+    return resp_json
+
+
+def _fetch_detailed_message(
+    cookie: str,
     message_card_id: int,
     expanded_card_id: int,
     is_bankmail: bool = False
 ) -> dict:
     """
-    Calls the ABN AMRO Read Message API as described in the provided curl request.
+    Fetches a single expanded message card from the ABN AMRO Read Message API.
     Returns the JSON response as a dict.
     """
     url = f"https://www.abnamro.nl/my-abnamro/api/message-card/v1/message-cards/{message_card_id}/expanded-cards/{expanded_card_id}?isBankmail={'true' if is_bankmail else 'false'}"
 
-    # Extract cookie from context headers
-    cookie = getattr(getattr(getattr(ctx, "request_context", None), "request", None), "headers", {}).get("cookie", "")
-
     headers = {
         "accept": "application/json",
         "accept-language": "en-GB,en-US;q=0.9,en;q=0.8,nl;q=0.7",
@@ -139,10 +173,11 @@ def get_detailed_message(
         "cookie": cookie
     }
 
-    response = requests.get(
+    response = upstream.request(
+        "get_detailed_message",
+        "GET",
         url,
         headers=headers,
-        timeout=10,
         verify=False
     )
     try:
@@ -151,6 +186,188 @@ def get_detailed_message(
         print("Failed to parse JSON response:", e)
         resp_json = {"error": str(e), "text": response.text}
     return resp_json
+
+
+# Tool for ABN AMRO Read Message API (from curl)
+@mcp.tool()
+@single_flight
+def get_detailed_message(
+    ctx: Context,
+    message_card_id: int,
+    expanded_card_id: int,
+    is_bankmail: bool = False
+) -> dict:
+    """
+    Calls the ABN AMRO Read Message API as described in the provided curl request.
+    Returns the JSON response as a dict.
+    """
+    # Extract cookie from context headers
+    cookie = getattr(getattr(getattr(ctx, "request_context", None), "request", None), "headers", {}).get("cookie", "")
+
+    resp_json = _fetch_detailed_message(cookie, message_card_id, expanded_card_id, is_bankmail)
+    if "error" not in resp_json:
+        _cache_detail(cookie, message_card_id, expanded_card_id, resp_json)
+    return resp_json
+
+
+# --- Bulk inbox prefetch ---
+
+# Upper bound for concurrent expanded-card requests, whatever the caller asks for
+MAX_DETAIL_CONCURRENCY = 8
+# Maximum number of expanded cards kept in the detail cache of one user session
+DETAIL_CACHE_SIZE = 512
+
+# Expanded card bodies live in the user's session cache, keyed by
+# "<message_card_id>/<expanded_card_id>". Message contents do not change once
+# delivered, so entries only leave the cache when a message is deleted, the
+# cache is full or the session is evicted.
+DETAIL_CACHE = "message_details"
+
+
+def _detail_cache(cookie: str) -> sessions.SessionCache:
+    return sessions.cache(cookie, DETAIL_CACHE, max_entries=DETAIL_CACHE_SIZE)
+
+
+def _cache_detail(cookie: str, message_card_id: int, expanded_card_id: int, detail: dict) -> None:
+    _detail_cache(cookie).put(f"{int(message_card_id)}/{int(expanded_card_id)}", detail)
+
+
+def _cached_detail(cookie: str, message_card_id: int, expanded_card_id: int) -> Optional[dict]:
+    return _detail_cache(cookie).get(f"{int(message_card_id)}/{int(expanded_card_id)}")
+
+
+def _forget_message(cookie: str, message_card_id: int) -> None:
+    _detail_cache(cookie).discard_prefix(f"{int(message_card_id)}/")
+
+
+def _message_cards(listing) -> list:
+    """Returns the list of message cards from a get_messsages response."""
+    if isinstance(listing, list):
+        return listing
+    if isinstance(listing, dict):
+        for key in ("messageCards", "cards", "content"):
+            if isinstance(listing.get(key), list):
+                return listing[key]
+    return []
+
+
+def _expanded_card_refs(card: dict) -> List[Tuple[int, int, bool]]:
+    """Returns (message_card_id, expanded_card_id, is_bankmail) for every expanded card of a message card."""
+    card_id = card.get("id", card.get("messageCardId"))
+    if card_id is None:
+        return []
+    is_bankmail = bool(card.get("isBankmail", False))
+    expanded_ids = []
+    for expanded in card.get("expandedCards") or []:
+        expanded_id = expanded.get("id") if isinstance(expanded, dict) else expanded
+        if expanded_id is not None:
+            expanded_ids.append(expanded_id)
+    if not expanded_ids and card.get("expandedCardId") is not None:
+        expanded_ids.append(card["expandedCardId"])
+    return [(int(card_id), int(expanded_id), is_bankmail) for expanded_id in expanded_ids]
+
+
+@mcp.tool(
+    description="Fetches all customer messages together with the full content of every message in one call. Prefer this over calling get_detailed_message for each message."
+)
+async def get_messages_with_details(ctx: Context, max_concurrency: int = 4) -> dict:
+    """
+    Lists the message cards and fetches every expanded card concurrently.
+    Parameters:
+        max_concurrency: Maximum number of expanded cards fetched at the same time (capped at MAX_DETAIL_CONCURRENCY).
+    Returns the message card listing, the expanded cards keyed by "<message_card_id>/<expanded_card_id>"
+    and any per-card errors.
+    """
+    # Extract cookie from context headers
+    cookie = getattr(getattr(getattr(ctx, "request_context", None), "request", None), "headers", {}).get("cookie", "")
+
+    listing = await get_messsages(ctx)
+    if isinstance(listing, dict) and "error" in listing:
+        return listing
+
+    refs = [ref for card in _message_cards(listing) if isinstance(card, dict) for ref in _expanded_card_refs(card)]
+    semaphore = asyncio.Semaphore(max(1, min(max_concurrency, MAX_DETAIL_CONCURRENCY)))
+
+    async def fetch(message_card_id: int, expanded_card_id: int, is_bankmail: bool) -> dict:
+        detail = _cached_detail(cookie, message_card_id, expanded_card_id)
+        if detail is not None:
+            return detail
+        async with semaphore:
+            detail = await asyncio.to_thread(
+                _fetch_detailed_message, cookie, message_card_id, expanded_card_id, is_bankmail
+            )
+        if "error" not in detail:
+            _cache_detail(cookie, message_card_id, expanded_card_id, detail)
+        return detail
+
+    results = await asyncio.gather(*(fetch(*ref) for ref in refs), return_exceptions=True)
+
+    details = {}
+    errors = {}
+    for (message_card_id, expanded_card_id, _), result in zip(refs, results):
+        card_key = f"{message_card_id}/{expanded_card_id}"
+        if isinstance(result, BaseException):
+            errors[card_key] = str(result)
+        elif "error" in result:
+            errors[card_key] = result["error"]
+        else:
+            details[card_key] = result
+
+    return {"messageCards": listing, "details": details, "errors": errors}
+# --- Bulk deletion ---
+
+# Upper bound for concurrent delete requests, whatever the caller asks for
+MAX_DELETE_CONCURRENCY = 8
+
+
+@mcp.tool(
+    description="Deletes several customer messages in one call. Prefer this over calling delete_message for each message."
+)
+async def delete_messages(
+    ctx: Context,
+    message_ids: list[int],
+    is_bankmail: bool = False,
+    max_concurrency: int = 4
+) -> dict:
+    """
+    Deletes every message in message_ids by running the status updates concurrently.
+    Parameters:
+        message_ids: List of message card IDs to delete.
+        is_bankmail: Whether the messages are bankmail messages (default: False).
+        max_concurrency: Maximum number of deletes in flight at the same time (capped at MAX_DELETE_CONCURRENCY).
+    Returns the per-message outcome and the number of succeeded and failed deletes.
+    """
+    # Extract cookie from context headers
+    cookie = getattr(getattr(getattr(ctx, "request_context", None), "request", None), "headers", {}).get("cookie", "")
+
+    semaphore = asyncio.Semaphore(max(1, min(max_concurrency, MAX_DELETE_CONCURRENCY)))
+
+    async def delete(message_id: int) -> Tuple[int, dict]:
+        async with semaphore:
+            return await asyncio.to_thread(_delete_message, cookie, message_id, is_bankmail)
+
+    unique_ids = list(dict.fromkeys(message_ids))
+    outcomes = await asyncio.gather(*(delete(message_id) for message_id in unique_ids), return_exceptions=True)
+
+    results = []
+    for message_id, outcome in zip(unique_ids, outcomes):
+        if isinstance(outcome, BaseException):
+            results.append({"message_id": message_id, "success": False, "error": str(outcome)})
+            continue
+        status_code, resp_json = outcome
+        success = 200 <= status_code < 300
+        result = {"message_id": message_id, "success": success, "status_code": status_code}
+        if success:
+            _forget_message(cookie, message_id)
+        else:
+            result["error"] = resp_json
+        results.append(result)
+
+    succeeded = sum(1 for result in results if result["success"])
+    if succeeded:
+        messages_feed.invalidate(cookie)
+    return {"results": results, "succeeded": succeeded, "failed": len(results) - succeeded}
+
 # --- MCP Server ---
 
 if __name__ == "__main__":
@@ -1,15 +1,19 @@
 from typing import List, Optional
 from typing import Tuple
-import requests
 from pydantic import BaseModel
 from mcp.server.fastmcp import FastMCP, Context
 
+import upstream
+from single_flight import single_flight
+
 # --- MCP Server ---
 
 mcp = FastMCP("Manage customer or user preferences API",port=10004)
+upstream.register_metrics(mcp)
 
 # Tool for ABN AMRO Get Newsletter Settings API (from curl)
 @mcp.tool()
+@single_flight
 def get_newsletter_settings(
     ctx: Context,
     bcnumber: str,
@@ -44,10 +48,11 @@ def get_newsletter_settings(
         "cookie": cookie
     }
 
-    response = requests.get(
+    response = upstream.request(
+        "get_newsletter_settings",
+        "GET",
         url,
         headers=headers,
-        timeout=10,
         verify=False
     )
     try:
@@ -0,0 +1,78 @@
+import argparse
+import importlib
+import logging
+import os
+import sys
+
+# --- Multi-worker serving ---
+#
+# Runs one MCP server with several uvicorn worker processes on its usual port:
+#
+#   MCP_WORKERS=4 uv run src/mcp/serve.py messages
+#
+# Workers serve the streamable HTTP transport statelessly, so any worker (or node
+# behind a load balancer) can answer any request. They share cached upstream results
+# through the cache backend (MCP_CACHE_BACKEND, see cache_backend.py), which defaults
+# to shared memory when more than one worker runs. Resource subscriptions need a
+# long-lived session on one process, so the change feed is turned off in this mode.
+# With a single worker this is the same as `uv run src/mcp/<server>.py`.
+
+logger = logging.getLogger(__name__)
+
+SERVERS = ("accounts", "address_book", "mcd", "messages", "preferences", "tasks")
+WORKERS = int(os.getenv("MCP_WORKERS", "1"))
+
+
+def create_app():
+    """uvicorn app factory: the stateless streamable HTTP app of the server in MCP_SERVE_MODULE."""
+    module = importlib.import_module(os.environ["MCP_SERVE_MODULE"])
+    module.mcp.settings.stateless_http = True
+    return module.mcp.streamable_http_app()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Run an MCP server, optionally with several worker processes.")
+    parser.add_argument("server", choices=SERVERS)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="worker processes (default: MCP_WORKERS or 1)")
+    parser.add_argument("--host", help="bind address (default: the server's own setting)")
+    parser.add_argument("--port", type=int, help="port (default: the server's own port)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(name)s: %(message)s")
+
+    if args.workers > 1:
+        # Set before the server module (and with it cache_backend and change_feed) is imported,
+        # here and in the worker processes, which inherit the environment
+        os.environ["MCP_SERVE_MODULE"] = args.server
+        os.environ.setdefault("MCP_CACHE_BACKEND", "shm")
+        if os.environ["MCP_CACHE_BACKEND"] == "memory":
+            logger.warning("MCP_CACHE_BACKEND=memory: every worker keeps its own cache")
+        if os.getenv("MCP_CHANGE_FEED", "0").lower() in ("1", "true", "yes"):
+            logger.warning("The change feed needs a single worker; it is disabled")
+        os.environ["MCP_CHANGE_FEED"] = "0"
+
+    module = importlib.import_module(args.server)
+    settings = module.mcp.settings
+    if args.host:
+        settings.host = args.host
+    if args.port:
+        settings.port = args.port
+
+    if args.workers <= 1:
+        module.mcp.run(transport="streamable-http")
+        return
+
+    import uvicorn
+
+    logger.info("Starting %s MCP server with %d workers on %s:%s", args.server, args.workers, settings.host, settings.port)
+    uvicorn.run(
+        "serve:create_app",
+        factory=True,
+        host=settings.host,
+        port=settings.port,
+        workers=args.workers,
+        log_level=settings.log_level.lower(),
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+import contextlib
+import hashlib
+import http.cookiejar
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache_backend import CacheBackend, get_backend
+
+# --- User sessions ---
+#
+# One MCP server process serves many customers, each identified by the cookie the
+# agent forwards with every tool call. Per cookie the registry keeps:
+#   - a requests.Session, so each user's upstream calls reuse their own keep-alive
+#     connections instead of opening a new TLS connection per call,
+#   - named cache namespaces, so cached upstream data can never leak between users
+#     (stored in the backend selected by MCP_CACHE_BACKEND, see cache_backend.py).
+# The least recently used sessions are evicted beyond MCP_MAX_SESSIONS, and any
+# session idle for MCP_SESSION_IDLE_SECONDS is dropped with its caches. Sessions are
+# reference counted: one evicted while calls are still using it closes after the last one.
+
+MAX_SESSIONS = int(os.getenv("MCP_MAX_SESSIONS", "256"))
+SESSION_IDLE_SECONDS = float(os.getenv("MCP_SESSION_IDLE_SECONDS", "900"))
+# Keep-alive connections per session and host
+POOL_SIZE = int(os.getenv("MCP_SESSION_POOL_SIZE", "8"))
+
+
+class SessionCache:
+    """A named cache of one user session, stored in the configured cache backend.
+
+    With the in-memory backend it is LRU bounded and dropped together with the session;
+    shared backends (see cache_backend.py) keep entries for other workers until they expire.
+    """
+
+    def __init__(self, namespace: str, max_entries: int, backend: CacheBackend):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.backend = backend
+        # Set when a local cache is dropped with its session; later writes would never be cleared
+        self.closed = False
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self.backend.get(self.namespace, key)
+        return default if value is None else value
+
+    def put(self, key: str, value: Any) -> None:
+        if self.closed:
+            return
+        self.backend.set(self.namespace, key, value, self.max_entries)
+
+    def discard_prefix(self, prefix: str) -> None:
+        self.backend.delete_prefix(self.namespace, prefix)
+
+    def clear(self) -> None:
+        self.backend.delete_prefix(self.namespace, "")
+
+
+class _Session:
+    def __init__(self):
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+        # Identity comes from the cookie header of each call; never replay Set-Cookie responses
+        self.http.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        self.caches: dict[str, SessionCache] = {}
+        self.last_used = time.monotonic()
+        # Calls using the connection pool right now, and whether the session was evicted meanwhile
+        self.in_use = 0
+        self.evicted = False
+
+    def close(self) -> None:
+        for cache in self.caches.values():
+            if cache.backend.local:
+                cache.closed = True
+                cache.clear()
+        self.http.close()
+
+
+_lock = threading.Lock()
+_sessions: "OrderedDict[str, _Session]" = OrderedDict()
+
+
+def session_key(cookie: str) -> str:
+    """Identifies a user session without keeping the cookie itself as a key."""
+    return hashlib.sha256(cookie.encode()).hexdigest()
+
+
+def _evict(session: _Session) -> bool:
+    """Marks a session removed from the registry; True when it can be closed right away. Needs _lock."""
+    session.evicted = True
+    return session.in_use == 0
+
+
+def _session(cookie: str, use: bool = False) -> _Session:
+    key = session_key(cookie)
+    now = time.monotonic()
+    evicted = []
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = _Session()
+        session.last_used = now
+        if use:
+            session.in_use += 1
+        _sessions.move_to_end(key)
+        # Oldest first: drop idle sessions, then anything over the limit
+        while _sessions:
+            oldest_key, oldest = next(iter(_sessions.items()))
+            if oldest is session:
+                break
+            if len(_sessions) <= MAX_SESSIONS and now - oldest.last_used < SESSION_IDLE_SECONDS:
+                break
+            del _sessions[oldest_key]
+            if _evict(oldest):
+                evicted.append(oldest)
+    for old in evicted:
+        old.close()
+    return session
+
+
+@contextlib.contextmanager
+def http_session(cookie: str) -> Iterator[requests.Session]:
+    """Lends the connection pool of the user session identified by the cookie for one call."""
+    session = _session(cookie, use=True)
+    try:
+        yield session.http
+    finally:
+        with _lock:
+            session.in_use -= 1
+            close = session.evicted and session.in_use == 0
+        if close:
+            session.close()
+
+
+def cache(cookie: str, namespace: str, max_entries: int = 512) -> SessionCache:
+    """Returns the named cache of the user session identified by the cookie, creating it on first use."""
+    session = _session(cookie)
+    with _lock:
+        if namespace not in session.caches:
+            session.caches[namespace] = SessionCache(
+                f"{session_key(cookie)}:{namespace}", max_entries, get_backend()
+            )
+        return session.caches[namespace]
+
+
+def close_session(cookie: str) -> None:
+    """Drops a user session with its connections and caches, e.g. after logout."""
+    with _lock:
+        session = _sessions.pop(session_key(cookie), None)
+        close = session is not None and _evict(session)
+    if close:
+        session.close()
+
+
+def sessions_snapshot() -> dict:
+    """Returns the number of live sessions and their cache sizes, for metrics."""
+    now = time.monotonic()
+    with _lock:
+        snapshot = {
+            "sessions": len(_sessions),
+            "maxSessions": MAX_SESSIONS,
+            "idleSeconds": [round(now - session.last_used) for session in _sessions.values()],
+        }
+    snapshot["cacheEntries"] = get_backend().size()
+    return snapshot
+
+
+def cookie_from_headers(headers: Optional[dict]) -> str:
+    """Finds the cookie header in a requests-style headers dict, whatever its casing."""
+    for name, value in (headers or {}).items():
+        if name.lower() == "cookie":
+            return value or ""
+    return ""
@@ -0,0 +1,56 @@
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+from typing import Any, Callable
+
+from mcp.server.fastmcp import Context
+
+# --- Single-flight ---
+#
+# Concurrent calls of the same read-only tool with the same arguments for the same
+# session (cookie) share one upstream request: the first caller runs the tool in a
+# worker thread and everyone else awaits its result. Nothing is cached once the
+# call completes; the next call goes upstream again.
+
+_in_flight: dict[tuple, asyncio.Future] = {}
+
+
+def _context_param(signature: inspect.Signature) -> str | None:
+    for name, param in signature.parameters.items():
+        if param.annotation is Context:
+            return name
+    return None
+
+
+def single_flight(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Wraps a synchronous MCP tool so identical concurrent calls are coalesced.
+    The wrapped tool becomes async and runs off the event loop. Apply it below @mcp.tool().
+    """
+    signature = inspect.signature(fn)
+    ctx_param = _context_param(signature)
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        ctx = arguments.pop(ctx_param, None)
+        cookie = getattr(getattr(getattr(ctx, "request_context", None), "request", None), "headers", {}).get("cookie", "")
+
+        key = (
+            fn.__name__,
+            hashlib.sha256(cookie.encode()).hexdigest(),
+            json.dumps(arguments, sort_keys=True, default=str),
+        )
+        future = _in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(asyncio.to_thread(fn, *args, **kwargs))
+            _in_flight[key] = future
+            future.add_done_callback(lambda _: _in_flight.pop(key, None))
+        # A caller that gives up must not cancel the request the other callers are waiting on
+        return await asyncio.shield(future)
+
+    return wrapper
@@ -1,25 +1,26 @@
-from typing import List, Optional
+import asyncio
+from typing import Any, Dict, List, Optional
 from typing import Tuple
 import requests
 from pydantic import BaseModel
 from mcp.server.fastmcp import FastMCP, Context
 
+import upstream
+from single_flight import single_flight
+from change_feed import ChangeFeed
+
 # --- MCP Server ---
 
 mcp = FastMCP("Manage customer tasklist API",port=10005)
+upstream.register_metrics(mcp)
 
-# Tool for ABN AMRO Get Tasks API (from curl)
-@mcp.tool()
-def get_tasks(ctx: Context) -> dict:
+def _fetch_tasks(cookie: str, conditional_headers: Optional[dict] = None) -> requests.Response:
     """
-    Calls the ABN AMRO Get Tasks API as described in the provided curl request.
-    Returns the JSON response as a dict.
+    Calls the ABN AMRO Get Tasks API, optionally as a conditional request.
+    Returns the raw response.
     """
     url = "https://www.abnamro.nl/my-abnamro/apis/bapi/tasks/v2/"
 
-    # Extract cookie from context headers
-    cookie = getattr(getattr(getattr(ctx, "request_context", None), "request", None), "headers", {}).get("cookie", "")
-
     headers = {
         "accept": "application/json",
         "accept-language": "en-GB,en-US;q=0.9,en;q=0.8,nl;q=0.7",
@@ -34,15 +35,30 @@ def get_tasks(ctx: Context) -> dict:
         "sec-fetch-site": "same-origin",
         "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36",
         "x-xsrf-header": "token",
-        "cookie": cookie
+        "cookie": cookie,
+        **(conditional_headers or {})
     }
 
-    response = requests.get(
+    return upstream.request(
+        "get_tasks",
+        "GET",
         url,
         headers=headers,
-        timeout=10,
         verify=False
     )
+
+# Tool for ABN AMRO Get Tasks API (from curl)
+@mcp.tool()
+@single_flight
+def get_tasks(ctx: Context) -> dict:
+    """
+    Calls the ABN AMRO Get Tasks API as described in the provided curl request.
+    Returns the JSON response as a dict.
+    """
+    # Extract cookie from context headers
+    cookie = getattr(getattr(getattr(ctx, "request_context", None), "request", None), "headers", {}).get("cookie", "")
+
+    response = _fetch_tasks(cookie)
     try:
         resp_json = response.json()
     except Exception as e:
@@ -50,21 +66,21 @@ def get_tasks(ctx: Context) -> dict:
         resp_json = {"error": str(e), "text": response.text}
     return resp_json
 
-# Tool for ABN AMRO Delete Task API (from curl)
-@mcp.tool()
-def delete_task(ctx: Context, task_ids: list[str], source_system: str = "GENERIC_SIGNING") -> dict:
+tasks_feed = ChangeFeed(
+    mcp,
+    "tasks://current",
+    _fetch_tasks,
+    name="tasks",
+    description="Current task list of the customer, kept up to date in the background. Read this instead of calling get_tasks repeatedly."
+)
+
+def _delete_tasks(cookie: str, task_ids: list[str], source_system: str) -> Tuple[int, dict]:
     """
-    Calls the ABN AMRO Delete Task API as described in the provided curl request.
-    Parameters:
-        task_ids: List of task IDs to delete.
-        source_system: Source system for the delete operation (default: GENERIC_SIGNING).
-    Returns the JSON response as a dict.
+    Deletes one batch of tasks with a single call to the ABN AMRO Delete Task API.
+    Returns the HTTP status code and the JSON response as a dict.
     """
     url = "https://www.abnamro.nl/my-abnamro/apis/bapi/tasks/v2/delete"
 
-    # Extract cookie from context headers
-    cookie = getattr(getattr(getattr(ctx, "request_context", None), "request", None), "headers", {}).get("cookie", "")
-
     params = {
         "sourceSystem": source_system
     }
@@ -91,12 +107,13 @@ def delete_task(ctx: Context, task_ids: list[str], source_system: str = "GENERIC
         "taskIds": task_ids
     }
 
-    response = requests.post(
+    response = upstream.request(
+        "delete_task",
+        "POST",
         url,
         params=params,
         headers=headers,
         json=json_body,
-        timeout=10,
         verify=False
     )
     try:
@@ -104,7 +121,117 @@ def delete_task(ctx: Context, task_ids: list[str], source_system: str = "GENERIC
     except Exception as e:
         print("Failed to parse JSON response:", e)
         resp_json = {"error": str(e), "text": response.text}
-    return resp_json
+    return response.status_code, resp_json
+
+
+# Largest number of task IDs sent in one delete request
+DELETE_CHUNK_SIZE = 25
+# Upper bound for concurrent delete requests, whatever the caller asks for
+MAX_DELETE_CONCURRENCY = 4
+
+# The Delete Task API answers a batch with one entry per task:
+#   {"results": [{"taskId": "...", "status": "DELETED"}, {"taskId": "...", "status": "NOT_FOUND", ...}]}
+# Only "DELETED" means the task is gone; any other status is that task's error.
+DELETED_STATUS = "DELETED"
+# Reported for tasks whose outcome the response does not state
+UNKNOWN_OUTCOME = "the delete response does not report the outcome of this task"
+
+
+def _task_outcomes(resp_json: Any, task_ids: list[str]) -> Dict[str, Optional[Any]]:
+    """
+    Reads the per-task results of a delete response: task ID -> None when it was deleted,
+    else the entry reported for it. Tasks the response does not mention, or every task
+    when the body does not have the expected shape, are left out: their outcome is unknown.
+    """
+    outcomes: Dict[str, Optional[Any]] = {}
+    entries = resp_json.get("results") if isinstance(resp_json, dict) else None
+    if not isinstance(entries, list):
+        return outcomes
+    for entry in entries:
+        if not isinstance(entry, dict) or not isinstance(entry.get("status"), str):
+            continue
+        task_id = str(entry.get("taskId"))
+        if task_id not in task_ids:
+            continue
+        outcomes[task_id] = None if entry["status"].upper() == DELETED_STATUS else entry
+    return outcomes
+
+
+# Tool for ABN AMRO Delete Task API (from curl)
+@mcp.tool()
+async def delete_task(
+    ctx: Context,
+    task_ids: list[str],
+    source_system: str = "GENERIC_SIGNING",
+    chunk_size: int = DELETE_CHUNK_SIZE,
+    max_concurrency: int = 2
+) -> dict:
+    """
+    Calls the ABN AMRO Delete Task API as described in the provided curl request.
+    Large lists are split into chunks that are deleted concurrently.
+    Parameters:
+        task_ids: List of task IDs to delete.
+        source_system: Source system for the delete operation (default: GENERIC_SIGNING).
+        chunk_size: Maximum number of task IDs per delete request (capped at DELETE_CHUNK_SIZE).
+        max_concurrency: Maximum number of delete requests in flight at the same time (capped at MAX_DELETE_CONCURRENCY).
+    Returns the per-task outcome (success is None when the response does not state it), the number of
+    succeeded, failed and unknown deletes and the raw response of every chunk.
+    """
+    # Extract cookie from context headers
+    cookie = getattr(getattr(getattr(ctx, "request_context", None), "request", None), "headers", {}).get("cookie", "")
+
+    unique_ids = list(dict.fromkeys(task_ids))
+    size = max(1, min(chunk_size, DELETE_CHUNK_SIZE))
+    chunks = [unique_ids[i:i + size] for i in range(0, len(unique_ids), size)]
+    semaphore = asyncio.Semaphore(max(1, min(max_concurrency, MAX_DELETE_CONCURRENCY)))
+
+    async def delete(chunk: list[str]) -> Tuple[int, dict]:
+        async with semaphore:
+            return await asyncio.to_thread(_delete_tasks, cookie, chunk, source_system)
+
+    outcomes = await asyncio.gather(*(delete(chunk) for chunk in chunks), return_exceptions=True)
+
+    results = []
+    responses = []
+    for chunk, outcome in zip(chunks, outcomes):
+        if isinstance(outcome, BaseException):
+            responses.append({"error": str(outcome)})
+            results.extend({"task_id": task_id, "success": False, "error": str(outcome)} for task_id in chunk)
+            continue
+        status_code, resp_json = outcome
+        responses.append(resp_json)
+        if not 200 <= status_code < 300:
+            results.extend(
+                {"task_id": task_id, "success": False, "status_code": status_code, "error": resp_json}
+                for task_id in chunk
+            )
+            continue
+        # A successful request can still report that some of its tasks were not deleted
+        per_task = _task_outcomes(resp_json, chunk)
+        for task_id in chunk:
+            result = {"task_id": task_id, "success": None, "status_code": status_code}
+            if task_id not in per_task:
+                result["error"] = UNKNOWN_OUTCOME
+            elif per_task[task_id] is None:
+                result["success"] = True
+            else:
+                result["success"] = False
+                result["error"] = per_task[task_id]
+            results.append(result)
+
+    succeeded = sum(1 for result in results if result["success"] is True)
+    unknown = sum(1 for result in results if result["success"] is None)
+    if succeeded or unknown:
+        # Unknown outcomes may still have deleted tasks; the refresh shows which
+        tasks_feed.invalidate(cookie)
+    return {
+        "results": results,
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded - unknown,
+        "unknown": unknown,
+        "responses": responses
+    }
+
 # --- MCP Server ---
 
 if __name__ == "__main__":
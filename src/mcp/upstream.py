@@ -0,0 +1,313 @@
+import functools
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field, fields, replace
+from typing import Optional
+
+import requests
+from mcp.server.fastmcp import FastMCP
+
+import sessions
+
+# --- Upstream resilience ---
+#
+# Every MCP tool talks to the ABN AMRO APIs through request(), over the connection
+# pool of the calling user's session (see sessions.py). Per tool it applies:
+#   - a per-attempt timeout and an overall time budget,
+#   - jittered exponential retries for idempotent (GET) calls,
+#   - a hedged duplicate GET when the first attempt is slower than the tool's p95,
+#   - a circuit breaker that fails fast after repeated upstream failures.
+#
+# Policies can be overridden per tool with MCP_UPSTREAM_POLICIES, a JSON object
+# mapping tool names to Policy fields, e.g. '{"get_transactions": {"timeout": 20, "hedge": false}}'.
+
+
+@dataclass(frozen=True)
+class Policy:
+    # Seconds allowed for a single attempt
+    timeout: float = 10.0
+    # Seconds allowed for all attempts of one call together
+    budget: float = 15.0
+    # Extra attempts for idempotent calls
+    retries: int = 2
+    backoff_base: float = 0.25
+    backoff_max: float = 2.0
+    # Send a duplicate GET when the first one is still running after the p95 latency
+    hedge: bool = True
+    # Fixed hedge delay in seconds; None derives it from the observed p95
+    hedge_after: Optional[float] = None
+    min_hedge_delay: float = 0.2
+    # Consecutive failures that open the breaker, and seconds before a trial call is let through
+    breaker_threshold: int = 5
+    breaker_reset: float = 30.0
+
+
+DEFAULT_POLICY = Policy()
+
+# Built-in per-tool overrides; MCP_UPSTREAM_POLICIES takes precedence
+POLICIES: dict[str, Policy] = {
+    # Transaction pages can be large and slow; give them more room before retrying
+    "get_transactions": replace(DEFAULT_POLICY, timeout=15.0, budget=25.0),
+}
+
+RETRYABLE_STATUS = {429, 502, 503, 504}
+# Latency samples kept per tool, and samples needed before hedging on p95
+LATENCY_WINDOW = 200
+MIN_HEDGE_SAMPLES = 20
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised when a tool's circuit breaker is open and the call is rejected without contacting upstream."""
+
+
+def _load_policies() -> dict[str, Policy]:
+    policies = dict(POLICIES)
+    raw = os.getenv("MCP_UPSTREAM_POLICIES")
+    if not raw:
+        return policies
+    known = {f.name for f in fields(Policy)}
+    for tool, overrides in json.loads(raw).items():
+        unknown = set(overrides) - known
+        if unknown:
+            raise ValueError(f"Unknown upstream policy fields for {tool}: {sorted(unknown)}")
+        policies[tool] = replace(policies.get(tool, DEFAULT_POLICY), **overrides)
+    return policies
+
+
+_policies = _load_policies()
+
+
+def policy_for(tool: str) -> Policy:
+    return _policies.get(tool, DEFAULT_POLICY)
+
+
+@dataclass
+class _ToolStats:
+    latencies: deque = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+    calls: int = 0
+    attempts: int = 0
+    successes: int = 0
+    failures: int = 0
+    retries: int = 0
+    hedges: int = 0
+    hedge_wins: int = 0
+    short_circuits: int = 0
+    # Circuit breaker state
+    consecutive_failures: int = 0
+    opened_at: Optional[float] = None
+    trial_in_flight: bool = False
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+_lock = threading.Lock()
+_stats: dict[str, _ToolStats] = {}
+# Hedged GETs run their attempts here so the first one to finish can be returned
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="upstream")
+
+
+def _tool_stats(tool: str) -> _ToolStats:
+    with _lock:
+        return _stats.setdefault(tool, _ToolStats())
+
+
+def _admit(tool: str, policy: Policy) -> None:
+    stats = _tool_stats(tool)
+    with _lock:
+        stats.calls += 1
+        if stats.opened_at is None:
+            return
+        if time.monotonic() - stats.opened_at >= policy.breaker_reset and not stats.trial_in_flight:
+            # Half-open: let one trial call through
+            stats.trial_in_flight = True
+            return
+        stats.short_circuits += 1
+    raise CircuitOpenError(f"Upstream for {tool} is unavailable (circuit open), try again later")
+
+
+def _record(tool: str, policy: Policy, ok: bool, latency: Optional[float] = None) -> None:
+    stats = _tool_stats(tool)
+    with _lock:
+        stats.attempts += 1
+        if latency is not None:
+            stats.latencies.append(latency)
+        if ok:
+            stats.successes += 1
+            stats.consecutive_failures = 0
+            stats.opened_at = None
+            stats.trial_in_flight = False
+            return
+        stats.failures += 1
+        stats.consecutive_failures += 1
+        if stats.trial_in_flight or stats.consecutive_failures >= policy.breaker_threshold:
+            stats.opened_at = time.monotonic()
+            stats.trial_in_flight = False
+
+
+def _record_latency(tool: str, attempt: Future) -> None:
+    """Done callback of a hedged attempt that lost the race: only its latency is kept."""
+    if attempt.cancelled() or attempt.exception() is not None:
+        return
+    stats = _tool_stats(tool)
+    with _lock:
+        stats.latencies.append(attempt.result()[1])
+
+
+def _ok(response: requests.Response) -> bool:
+    # Throttling (429) counts as a failure too: the breaker should back off from it
+    return response.status_code < 500 and response.status_code not in RETRYABLE_STATUS
+
+
+def _attempt(method: str, url: str, timeout: float, kwargs: dict) -> tuple[requests.Response, float]:
+    """Sends one request and returns the response with its latency in seconds."""
+    started = time.monotonic()
+    # Each user's calls go through that user's own connection pool
+    with sessions.http_session(sessions.cookie_from_headers(kwargs.get("headers"))) as http:
+        response = http.request(method, url, timeout=timeout, **kwargs)
+    return response, time.monotonic() - started
+
+
+def _send(tool: str, policy: Policy, method: str, url: str, timeout: float, kwargs: dict) -> requests.Response:
+    try:
+        response, latency = _attempt(method, url, timeout, kwargs)
+    except requests.RequestException:
+        _record(tool, policy, ok=False)
+        raise
+    _record(tool, policy, ok=_ok(response), latency=latency)
+    return response
+
+
+def _send_hedged(tool: str, policy: Policy, method: str, url: str, timeout: float, kwargs: dict) -> requests.Response:
+    stats = _tool_stats(tool)
+    if policy.hedge_after is not None:
+        delay = policy.hedge_after
+    elif len(stats.latencies) >= MIN_HEDGE_SAMPLES:
+        delay = max(policy.min_hedge_delay, stats.percentile(0.95))
+    else:
+        return _send(tool, policy, method, url, timeout, kwargs)
+    if delay >= timeout:
+        return _send(tool, policy, method, url, timeout, kwargs)
+
+    # The attempts of a hedged call count as one for the breaker: the call fails only when all of them do
+    primary = _executor.submit(_attempt, method, url, timeout, kwargs)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        pending = set()
+    else:
+        with _lock:
+            stats.hedges += 1
+        hedge = _executor.submit(_attempt, method, url, timeout - delay, kwargs)
+        pending = {primary, hedge}
+    error = None
+    while done or pending:
+        if not done:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        future = done.pop()
+        try:
+            response, latency = future.result()
+        except requests.RequestException as e:
+            error = e
+            continue
+        if future is not primary:
+            with _lock:
+                stats.hedge_wins += 1
+        _record(tool, policy, ok=_ok(response), latency=latency)
+        # The slower attempt keeps running in the background; only its latency feeds the metrics
+        for loser in done | pending:
+            loser.add_done_callback(functools.partial(_record_latency, tool))
+        return response
+    _record(tool, policy, ok=False)
+    raise error
+
+
+def request(tool: str, method: str, url: str, **kwargs) -> requests.Response:
+    """
+    Sends an upstream request on behalf of an MCP tool under that tool's resilience policy.
+    Accepts the same keyword arguments as requests.request, except timeout, which comes from the policy.
+    Raises CircuitOpenError without contacting upstream while the tool's breaker is open.
+    """
+    policy = policy_for(tool)
+    method = method.upper()
+    idempotent = method in ("GET", "HEAD")
+    attempts = 1 + (policy.retries if idempotent else 0)
+    deadline = time.monotonic() + policy.budget
+
+    _admit(tool, policy)
+    for attempt in range(attempts):
+        timeout = min(policy.timeout, deadline - time.monotonic())
+        last_attempt = attempt == attempts - 1 or timeout <= 0
+        try:
+            if idempotent and policy.hedge:
+                response = _send_hedged(tool, policy, method, url, timeout, kwargs)
+            else:
+                response = _send(tool, policy, method, url, timeout, kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            if last_attempt:
+                raise
+        else:
+            if response.status_code not in RETRYABLE_STATUS or last_attempt:
+                return response
+
+        if _tool_stats(tool).opened_at is not None:
+            raise CircuitOpenError(f"Upstream for {tool} is unavailable (circuit open), try again later")
+        backoff = min(policy.backoff_max, policy.backoff_base * 2 ** attempt)
+        sleep = random.uniform(0, backoff)
+        if time.monotonic() + sleep >= deadline:
+            raise requests.Timeout(f"Upstream for {tool} did not answer within {policy.budget}s")
+        stats = _tool_stats(tool)
+        with _lock:
+            stats.retries += 1
+        time.sleep(sleep)
+
+
+def metrics_snapshot() -> dict:
+    """Returns per-tool call, retry, hedge and breaker counters plus latency percentiles."""
+    with _lock:
+        snapshot = {}
+        for tool, stats in _stats.items():
+            p50, p95 = stats.percentile(0.5), stats.percentile(0.95)
+            snapshot[tool] = {
+                "calls": stats.calls,
+                "attempts": stats.attempts,
+                "successes": stats.successes,
+                "failures": stats.failures,
+                "retries": stats.retries,
+                "hedges": stats.hedges,
+                "hedge_wins": stats.hedge_wins,
+                "short_circuits": stats.short_circuits,
+                "circuit": "closed" if stats.opened_at is None else ("half-open" if stats.trial_in_flight else "open"),
+                "latency_p50_ms": None if p50 is None else round(p50 * 1000),
+                "latency_p95_ms": None if p95 is None else round(p95 * 1000),
+            }
+        return snapshot
+
+
+def register_metrics(mcp: FastMCP) -> None:
+    """Exposes the upstream metrics of this server as the metrics://upstream resource."""
+
+    @mcp.resource(
+        "metrics://upstream",
+        name="upstream_metrics",
+        description="Upstream call, retry, hedge and circuit breaker metrics per tool",
+        mime_type="application/json",
+    )
+    def upstream_metrics() -> str:
+        return json.dumps(metrics_snapshot())
+
+    @mcp.resource(
+        "metrics://sessions",
+        name="session_metrics",
+        description="Live user sessions and their cache sizes",
+        mime_type="application/json",
+    )
+    def session_metrics() -> str:
+        return json.dumps(sessions.sessions_snapshot())
@@ -0,0 +1,172 @@
+import json
+import os
+import time
+from typing import Annotated, Any, Optional
+
+from langchain_core.messages import AnyMessage, ToolMessage
+from langchain_core.tools import BaseTool
+from langgraph.graph.message import add_messages
+from langgraph.prebuilt.chat_agent_executor import AgentState
+from langgraph.types import Command
+from typing_extensions import NotRequired, TypedDict
+
+from src.utils.prefetch import INVALIDATES
+
+# --- Thread blackboard ---
+#
+# Structured results that several sub-agents need (balances, contracts, the customer
+# profile, address-book matches) are published once into the thread's graph state and
+# read from there by the other agents, their tools and graph nodes. Unlike the tool cache
+# it is part of the checkpointed state, so it survives handoffs, processes and workers.
+
+# Seconds a published result is served instead of calling the tool again
+BLACKBOARD_TTL = float(os.getenv("BLACKBOARD_TTL", "300"))
+# Results longer than this are not published; they would bloat every checkpoint
+BLACKBOARD_MAX_CHARS = 20000
+
+# Tools whose results are published, and the topic they are published under
+TOPICS = {
+    "get_account_balance_list": "balances",
+    "get_payments_contracts_list": "payment_contracts",
+    "get_manage_data_client": "customer_profile",
+    "customer_representatives": "representatives",
+    "fetch_address_book": "address_book",
+    "fetch_account_number_formats": "account_number_formats",
+}
+
+
+class BlackboardEntry(TypedDict):
+    tool: str
+    args: dict
+    # The tool result as the LLM saw it
+    content: Any
+    # Its JSON payload, when it has one
+    value: Optional[Any]
+    published_at: float
+
+
+def merge_blackboard(left: Optional[dict], right: Optional[dict]) -> dict:
+    """Reducer: entries in right replace those in left; a None entry removes it."""
+    merged = dict(left or {})
+    for key, entry in (right or {}).items():
+        if entry is None:
+            merged.pop(key, None)
+        else:
+            merged[key] = entry
+    return merged
+
+
+class BlackboardState(AgentState):
+    """Agent state with the thread's blackboard, for every sub-agent."""
+
+    blackboard: NotRequired[Annotated[dict[str, BlackboardEntry], merge_blackboard]]
+    # Set once per thread by the session bootstrap (bootstrap.py)
+    customer_context: NotRequired[str]
+
+
+class SupervisorBlackboardState(TypedDict):
+    """State of a supervisor whose sub-agents share the blackboard.
+
+    remaining_steps is a plain key rather than a managed value, because the supervisor's
+    outer graph cannot take writes to one. The supervisor stays bounded by the recursion limit.
+    """
+
+    messages: Annotated[list[AnyMessage], add_messages]
+    blackboard: NotRequired[Annotated[dict[str, BlackboardEntry], merge_blackboard]]
+    remaining_steps: NotRequired[int]
+    customer_context: NotRequired[str]
+
+
+def topic_key(tool: BaseTool, args: dict) -> Optional[str]:
+    """The blackboard key of a call: its topic, qualified by any arguments that differ from the defaults."""
+    topic = TOPICS.get(tool.name)
+    if topic is None:
+        return None
+    defaults = {name: spec["default"] for name, spec in tool.args.items() if "default" in spec}
+    explicit = {
+        name: value for name, value in args.items()
+        if name != "runtime" and (name not in defaults or defaults[name] != value)
+    }
+    return f"{topic}?{json.dumps(explicit, sort_keys=True, default=str)}" if explicit else topic
+
+
+def fresh_entry(state: Any, key: str) -> Optional[BlackboardEntry]:
+    """The published entry under key, unless it is older than BLACKBOARD_TTL."""
+    entry = (state.get("blackboard") or {}).get(key) if isinstance(state, dict) else None
+    if entry is None or time.time() - entry["published_at"] > BLACKBOARD_TTL:
+        return None
+    return entry
+
+
+def payload(content: Any) -> Optional[Any]:
+    """The JSON payload of a tool result, if it has one."""
+    texts = [content] if isinstance(content, str) else [
+        block if isinstance(block, str) else block.get("text", "") for block in content
+    ]
+    for text in texts:
+        try:
+            value = json.loads(text)
+        except ValueError:
+            continue
+        if isinstance(value, (dict, list)):
+            return value
+    return None
+
+
+def reports_error(content: Any) -> bool:
+    """Whether tool result content is the {"error": ...} payload MCP tools return for failed upstream calls."""
+    value = payload(content)
+    return isinstance(value, dict) and bool(value.get("error"))
+
+
+def failed(result: Any) -> bool:
+    """Whether a tool result reports a failure: an error status, or MCP tools' {"error": ...} payload."""
+    return not isinstance(result, ToolMessage) or result.status == "error" or reports_error(result.content)
+
+
+def entry(tool_name: str, args: dict, content: Any) -> Optional[BlackboardEntry]:
+    """A blackboard entry for a tool result, or None when the result reports an error or is too large to publish."""
+    if reports_error(content) or len(json.dumps(content, default=str)) > BLACKBOARD_MAX_CHARS:
+        return None
+    return {
+        "tool": tool_name,
+        "args": {name: value for name, value in args.items() if name != "runtime"},
+        "content": content,
+        "value": payload(content),
+        "published_at": time.time(),
+    }
+
+
+def _stale_keys(state: Any, tool_name: str) -> dict:
+    board = (state.get("blackboard") or {}) if isinstance(state, dict) else {}
+    return {key: None for key, item in board.items() if item["tool"] in INVALIDATES[tool_name]}
+
+
+async def share_on_blackboard(request, execute):
+    """Tool node interceptor: answers published tools from the thread's blackboard and publishes new results.
+
+    Calls to tools outside TOPICS run as usual; those known to change data (INVALIDATES
+    in prefetch.py) remove the entries they make stale.
+    """
+    name = request.tool_call["name"]
+    if request.tool is None:
+        return await execute(request)
+    key = topic_key(request.tool, request.tool_call["args"])
+    if key is None:
+        result = await execute(request)
+        if name not in INVALIDATES or not isinstance(result, ToolMessage):
+            return result
+        stale = _stale_keys(request.state, name)
+        return Command(update={"messages": [result], "blackboard": stale}) if stale else result
+
+    published = fresh_entry(request.state, key)
+    if published is not None:
+        return ToolMessage(content=published["content"], name=name, tool_call_id=request.tool_call["id"])
+    result = await execute(request)
+    # Failures are not published, so the next call retries instead of reading them from the board
+    if failed(result):
+        return result
+    new_entry = entry(name, request.tool_call["args"], result.content)
+    if new_entry is None:
+        return result
+    return Command(update={"messages": [result], "blackboard": {key: new_entry}})
@@ -0,0 +1,139 @@
+import asyncio
+import contextlib
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# --- Event loop stall detection ---
+#
+# A watchdog thread keeps scheduling a no-op on the event loop. When the loop does not
+# run it within the threshold, something is blocking the loop; the watchdog captures
+# the loop thread's stack at that moment and reports the stall once the loop is free.
+#
+# In tests and benchmarks:
+#
+#   async with detect_blocking(threshold=0.05, strict=True):
+#       await graph.ainvoke(...)
+#
+# In a running server set LOOP_STALL_THRESHOLD_MS (e.g. 100) and every stall is logged
+# with its stack.
+
+LOOP_STALL_THRESHOLD_MS = float(os.getenv("LOOP_STALL_THRESHOLD_MS", "0") or 0)
+
+
+@dataclass
+class LoopStall:
+    # Seconds the loop did not respond
+    duration: float
+    # Stack of the loop thread when the threshold was crossed
+    stack: str
+
+    def __str__(self) -> str:
+        return f"Event loop blocked for {self.duration * 1000:.0f} ms at:\n{self.stack}"
+
+
+class LoopBlockedError(AssertionError):
+    """Raised by detect_blocking(strict=True) when the loop stalled."""
+
+    def __init__(self, stalls: list[LoopStall]):
+        self.stalls = stalls
+        super().__init__(f"{len(stalls)} event loop stall(s):\n" + "\n".join(str(stall) for stall in stalls))
+
+
+class BlockingDetector:
+    """Watches an event loop from a background thread and records every stall longer than threshold."""
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        threshold: float = 0.1,
+        on_stall: Optional[Callable[[LoopStall], None]] = None,
+    ):
+        self.loop = loop
+        self.threshold = threshold
+        self.on_stall = on_stall
+        self.stalls: list[LoopStall] = []
+        self._loop_thread_id: Optional[int] = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "BlockingDetector":
+        """Start watching; call it from the loop's own thread."""
+        self._loop_thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._watch, name="loop-stall-detector", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _stack(self) -> str:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        return "".join(traceback.format_stack(frame)) if frame is not None else "(loop thread not found)\n"
+
+    def _watch(self) -> None:
+        # Poll a few times per threshold, so a stall is seen close to when it starts
+        interval = self.threshold / 4
+        while not self._stopped.is_set():
+            responded = threading.Event()
+            sent = time.monotonic()
+            try:
+                self.loop.call_soon_threadsafe(responded.set)
+            except RuntimeError:
+                # The loop is closed
+                return
+            if responded.wait(self.threshold):
+                self._stopped.wait(interval)
+                continue
+            stack = self._stack()
+            while not responded.wait(interval):
+                if self._stopped.is_set() or self.loop.is_closed():
+                    return
+            stall = LoopStall(time.monotonic() - sent, stack)
+            self.stalls.append(stall)
+            if self.on_stall is not None:
+                self.on_stall(stall)
+
+
+def _log_stall(stall: LoopStall) -> None:
+    logger.warning(str(stall))
+
+
+@contextlib.asynccontextmanager
+async def detect_blocking(threshold: float = 0.1, strict: bool = False) -> AsyncIterator[BlockingDetector]:
+    """Record event loop stalls longer than threshold seconds in the enclosed block.
+
+    With strict=True a LoopBlockedError listing every stall is raised at the end of the block.
+    """
+    detector = BlockingDetector(asyncio.get_running_loop(), threshold, on_stall=_log_stall).start()
+    try:
+        yield detector
+    finally:
+        # Let a stall that ends with the block be reported before stopping
+        await asyncio.sleep(0)
+        detector.stop()
+    if strict and detector.stalls:
+        raise LoopBlockedError(detector.stalls)
+
+
+_watched: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, BlockingDetector]" = weakref.WeakKeyDictionary()
+
+
+def watch_event_loop(threshold_ms: float = LOOP_STALL_THRESHOLD_MS) -> Optional[BlockingDetector]:
+    """Log stalls of the running event loop when LOOP_STALL_THRESHOLD_MS is set. Safe to call repeatedly."""
+    if threshold_ms <= 0:
+        return None
+    loop = asyncio.get_running_loop()
+    if loop not in _watched:
+        _watched[loop] = BlockingDetector(loop, threshold_ms / 1000, on_stall=_log_stall).start()
+    return _watched[loop]
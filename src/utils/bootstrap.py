@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import os
+from typing import Any, Callable, Iterable, Optional
+
+from langchain_core.messages import SystemMessage
+from langchain_core.tools import BaseTool
+from langgraph.graph import START, StateGraph
+
+from src.utils import blackboard
+
+logger = logging.getLogger(__name__)
+
+# --- Session bootstrap ---
+#
+# At the start of a conversational thread the customer's accounts, business contacts and
+# profile are fetched concurrently, once, and distilled into a short customer context
+# that every agent gets in its prompt. Agents then know which account is the Personal
+# Account, and which bcNumber or owner reference to pass, without spending tool turns on it.
+# The raw results are published on the blackboard for agents that need the details.
+
+CUSTOMER_CONTEXT = os.getenv("CUSTOMER_CONTEXT", "1").lower() in ("1", "true", "yes")
+BOOTSTRAP_NODE = "bootstrap"
+BOOTSTRAP_TOOLS = ("get_account_balance_list", "customer_representatives", "get_manage_data_client")
+MAX_ACCOUNTS = 10
+
+_NAME_FIELDS = ("fullName", "displayName", "name", "initials", "firstName", "lastName", "surname")
+_CONTACT_FIELDS = ("shortName", "appearanceType", "serviceSegment", "clientGroupCode", "cgc", "cgcCode")
+
+
+def _dicts(value: Any, depth: int = 0) -> Iterable[dict]:
+    """Every dict in a JSON value, outermost first."""
+    if depth > 6:
+        return
+    if isinstance(value, dict):
+        yield value
+        children = value.values()
+    elif isinstance(value, list):
+        children = value
+    else:
+        return
+    for child in children:
+        yield from _dicts(child, depth + 1)
+
+
+def _first(value: Any, field: str) -> Optional[Any]:
+    for item in _dicts(value):
+        found = item.get(field)
+        if isinstance(found, (str, int)) and str(found).strip():
+            return found
+    return None
+
+
+def _contracts(balances: Any) -> list[dict]:
+    if not isinstance(balances, dict):
+        return []
+    contracts = [wrapper.get("contract") for wrapper in balances.get("contractList", []) if isinstance(wrapper, dict)]
+    return [contract for contract in contracts if isinstance(contract, dict) and contract.get("accountNumber")]
+
+
+def _product(contract: dict) -> str:
+    return (contract.get("product") or {}).get("name") or "Account"
+
+
+def _bc_number(contract: dict) -> Optional[str]:
+    bc_number = (contract.get("customer") or {}).get("bcNumber")
+    return str(bc_number) if bc_number else None
+
+
+def _main_account(contracts: list[dict]) -> Optional[dict]:
+    # Most people use their Personal Account as their main account
+    return next((contract for contract in contracts if "personal" in _product(contract).lower()), None) or (
+        contracts[0] if contracts else None
+    )
+
+
+def _accounts(contracts: list[dict]) -> list[str]:
+    main = _main_account(contracts)
+    lines = []
+    for contract in contracts[:MAX_ACCOUNTS]:
+        details = ["main account"] if contract is main else []
+        if _bc_number(contract):
+            details.append(f"bcNumber {_bc_number(contract)}")
+        if contract.get("contractNumber"):
+            details.append(f"contract {contract['contractNumber']}")
+        if contract.get("isBlocked"):
+            details.append("blocked")
+        lines.append(f"  - {_product(contract)} {contract['accountNumber']}" + (f" ({'; '.join(details)})" if details else ""))
+    if len(contracts) > MAX_ACCOUNTS:
+        lines.append(f"  - and {len(contracts) - MAX_ACCOUNTS} more")
+    return lines
+
+
+def customer_context(balances: Any, representatives: Any, profile: Any) -> str:
+    """Distill the bootstrap results into a compact block for agent prompts; "" when nothing was found."""
+    lines = []
+    name = next((found for field in _NAME_FIELDS if (found := _first(profile, field))), None)
+    if name:
+        lines.append(f"- Customer: {name}")
+    contacts = []
+    for item in _dicts(representatives):
+        if item.get("bcNumber") and str(item["bcNumber"]) not in [bc for bc, _ in contacts]:
+            details = [str(item[field]) for field in _CONTACT_FIELDS if isinstance(item.get(field), (str, int))]
+            contacts.append((str(item["bcNumber"]), details))
+    if contacts:
+        lines.append("- Business contacts: " + "; ".join(
+            f"bcNumber {bc_number}" + (f" ({', '.join(details)})" if details else "") for bc_number, details in contacts[:5]
+        ))
+    contracts = _contracts(balances)
+    if contracts:
+        lines.append("- Accounts:")
+        lines.extend(_accounts(contracts))
+    main = _main_account(contracts)
+    bc_number = (_bc_number(main) if main else None) or (str(contacts[0][0]) if contacts else None)
+    if bc_number:
+        lines.append(
+            f"- Use bcnumber {bc_number} for get_newsletter_settings and owner_reference {bc_number} for fetch_address_book."
+        )
+    if not lines:
+        return ""
+    return "\n".join([
+        "Customer context (loaded at the start of this conversation; use it instead of looking these facts up again, "
+        "but fetch balances and transactions when you need them):",
+        *lines,
+    ])
+
+
+def with_customer_context(prompt: str) -> Callable[[dict], list]:
+    """A create_react_agent prompt: the system prompt followed by the thread's customer context, if any."""
+
+    def build_prompt(state: dict) -> list:
+        context = state.get("customer_context") if isinstance(state, dict) else None
+        system = f"{prompt}\n\n{context}" if context else prompt
+        return [SystemMessage(system), *state["messages"]]
+
+    return build_prompt
+
+
+def bootstrap_node(tools: Iterable[BaseTool]) -> Callable:
+    """Graph node that loads the customer context once per thread, calling the BOOTSTRAP_TOOLS concurrently."""
+    tools_by_name = {tool.name: tool for tool in tools if tool.name in BOOTSTRAP_TOOLS}
+
+    async def bootstrap(state: dict) -> dict:
+        if not CUSTOMER_CONTEXT or state.get("customer_context"):
+            return {}
+        results, published = {}, {}
+        pending = {}
+        for name in BOOTSTRAP_TOOLS:
+            # Results another run of this thread already published are reused
+            entry = blackboard.fresh_entry(state, blackboard.TOPICS[name])
+            if entry is not None:
+                results[name] = entry["value"]
+            elif name in tools_by_name:
+                pending[name] = tools_by_name[name].ainvoke({})
+        fetched = await asyncio.gather(*pending.values(), return_exceptions=True)
+        for name, content in zip(pending, fetched):
+            if isinstance(content, BaseException):
+                logger.warning(f"Bootstrap call {name} failed: {content}")
+                continue
+            entry = blackboard.entry(name, {}, content)
+            if entry is not None:
+                published[blackboard.TOPICS[name]] = entry
+            results[name] = blackboard.payload(content)
+        context = customer_context(*(results.get(name) for name in BOOTSTRAP_TOOLS))
+        # An empty context (everything failed) is retried on the next turn
+        return {"customer_context": context, "blackboard": published}
+
+    return bootstrap
+
+
+def add_bootstrap(builder: StateGraph, entry_node: str, tools: Iterable[BaseTool]) -> None:
+    """Run the bootstrap node before entry_node (the supervisor) on every turn; it is a no-op once loaded."""
+    builder.edges.discard((START, entry_node))
+    builder.add_node(BOOTSTRAP_NODE, bootstrap_node(tools))
+    builder.add_edge(START, BOOTSTRAP_NODE)
+    builder.add_edge(BOOTSTRAP_NODE, entry_node)
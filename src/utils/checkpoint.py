@@ -0,0 +1,286 @@
+import asyncio
+import contextlib
+import os
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+# Checkpointer for graphs that pause on interrupt(): "" (none), "memory" or "sqlite".
+# Graphs run directly compile with get_checkpointer(). The LangGraph server replaces a
+# graph's checkpointer with its own, so langgraph.json points it at served_checkpointer(),
+# which uses the same saver. It defaults to "sqlite", so threads and pending interrupts
+# survive a restart as they did with the server's own checkpointer.
+CHECKPOINTER = os.getenv("CHECKPOINTER", "")
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "./.checkpoints.sqlite3")
+# A full snapshot of a list channel is written after this many consecutive deltas
+COMPACT_EVERY = int(os.getenv("CHECKPOINT_COMPACT_EVERY", "20"))
+# Serialized values at least this large are zlib compressed
+COMPRESS_THRESHOLD = int(os.getenv("CHECKPOINT_COMPRESS_THRESHOLD", "4096"))
+# Lists shorter than this are always stored whole
+MIN_DELTA_ITEMS = 8
+# Resolved list values kept in memory, so resuming a thread does not walk its delta chain
+RESOLVED_CACHE_SIZE = 256
+
+DELTA_KEY = "__checkpoint_delta__"
+
+
+class CompressingSerializer(SerializerProtocol):
+    """Serializer that zlib-compresses large payloads, such as raw tool JSON in messages."""
+
+    def __init__(self, inner: Optional[SerializerProtocol] = None, threshold: int = COMPRESS_THRESHOLD):
+        self.inner = inner or JsonPlusSerializer()
+        self.threshold = threshold
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        type_, data = self.inner.dumps_typed(obj)
+        if len(data) >= self.threshold:
+            return f"{type_}+zlib", zlib.compress(data)
+        return type_, data
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_.endswith("+zlib"):
+            return self.inner.loads_typed((type_.removesuffix("+zlib"), zlib.decompress(payload)))
+        return self.inner.loads_typed(data)
+
+
+def _is_delta(value: Any) -> bool:
+    return isinstance(value, dict) and value.get(DELTA_KEY) is True
+
+
+def _common_prefix(old: list, new: list) -> int:
+    count = 0
+    for a, b in zip(old, new):
+        if a is not b and a != b:
+            break
+        count += 1
+    return count
+
+
+class DeltaCheckpointSaver(BaseCheckpointSaver):
+    """Checkpointer that stores growing list channels (messages, past steps) as deltas.
+
+    When a list channel changes, only the items appended since the parent checkpoint are
+    stored, together with how much of the parent's list is kept. Every COMPACT_EVERY deltas
+    the full list is stored again, so restoring a checkpoint never replays more than that many
+    deltas. Everything else is delegated to the wrapped (synchronous) saver; async calls run
+    it in a worker thread.
+    """
+
+    def __init__(self, inner: BaseCheckpointSaver, compact_every: int = COMPACT_EVERY):
+        super().__init__(serde=inner.serde)
+        self.inner = inner
+        self.compact_every = compact_every
+        # (thread_id, checkpoint_ns, channel, checkpoint_id) -> (list, delta depth)
+        self._resolved: "OrderedDict[tuple, tuple[list, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def config_specs(self):
+        return self.inner.config_specs
+
+    def get_next_version(self, current, channel):
+        return self.inner.get_next_version(current, channel)
+
+    # --- Resolved list cache ---
+
+    def _cached(self, key: tuple) -> Optional[tuple[list, int]]:
+        with self._lock:
+            value = self._resolved.get(key)
+            if value is not None:
+                self._resolved.move_to_end(key)
+            return value
+
+    def _cache(self, key: tuple, value: list, depth: int) -> None:
+        with self._lock:
+            self._resolved[key] = (value, depth)
+            self._resolved.move_to_end(key)
+            while len(self._resolved) > RESOLVED_CACHE_SIZE:
+                self._resolved.popitem(last=False)
+
+    # --- Decoding ---
+
+    def _list_at(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str, channel: str) -> Optional[tuple[list, int]]:
+        """The resolved value of a list channel at a checkpoint, with its delta depth."""
+        cached = self._cached((thread_id, checkpoint_ns, channel, checkpoint_id))
+        if cached is not None:
+            return cached
+        saved = self.inner.get_tuple(
+            {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}}
+        )
+        if saved is None:
+            return None
+        value = saved.checkpoint["channel_values"].get(channel)
+        resolved = self._resolve(thread_id, checkpoint_ns, channel, value)
+        if resolved is not None:
+            self._cache((thread_id, checkpoint_ns, channel, checkpoint_id), *resolved)
+        return resolved
+
+    def _resolve(self, thread_id: str, checkpoint_ns: str, channel: str, value: Any) -> Optional[tuple[list, int]]:
+        if not _is_delta(value):
+            return (value, 0) if isinstance(value, list) else None
+        # A delta is stored once, at the checkpoint that wrote it, and shared by later checkpoints
+        key = (thread_id, checkpoint_ns, channel, value["at"])
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        base = self._list_at(thread_id, checkpoint_ns, value["base"], channel)
+        if base is None:
+            raise ValueError(f"Checkpoint {value['base']} needed to restore channel {channel!r} is missing")
+        resolved = (base[0][: value["keep"]] + value["append"], value["depth"])
+        self._cache(key, *resolved)
+        return resolved
+
+    def _decode(self, saved: Optional[CheckpointTuple]) -> Optional[CheckpointTuple]:
+        if saved is None:
+            return None
+        configurable = saved.config["configurable"]
+        thread_id, checkpoint_ns = configurable["thread_id"], configurable.get("checkpoint_ns", "")
+        values = dict(saved.checkpoint["channel_values"])
+        for channel, value in values.items():
+            if _is_delta(value):
+                values[channel] = self._resolve(thread_id, checkpoint_ns, channel, value)[0]
+        return saved._replace(checkpoint={**saved.checkpoint, "channel_values": values})
+
+    # --- Encoding ---
+
+    def _encode(self, config: RunnableConfig, checkpoint: Checkpoint, new_versions: ChannelVersions) -> Checkpoint:
+        configurable = config["configurable"]
+        thread_id, checkpoint_ns = configurable["thread_id"], configurable.get("checkpoint_ns", "")
+        parent_id = configurable.get("checkpoint_id")
+        values = dict(checkpoint["channel_values"])
+        for channel in new_versions:
+            value = values.get(channel)
+            if not isinstance(value, list):
+                continue
+            own_key = (thread_id, checkpoint_ns, channel, checkpoint["id"])
+            base = None
+            if parent_id is not None and len(value) >= MIN_DELTA_ITEMS:
+                base = self._list_at(thread_id, checkpoint_ns, parent_id, channel)
+            keep = _common_prefix(base[0], value) if base is not None else 0
+            if base is None or keep == 0 or base[1] + 1 >= self.compact_every:
+                # Full snapshot: first write, unrelated list, or time to compact
+                self._cache(own_key, value, 0)
+                continue
+            depth = base[1] + 1
+            values[channel] = {
+                DELTA_KEY: True,
+                "at": checkpoint["id"],
+                "base": parent_id,
+                "keep": keep,
+                "append": value[keep:],
+                "depth": depth,
+            }
+            self._cache(own_key, value, depth)
+        return {**checkpoint, "channel_values": values}
+
+    # --- BaseCheckpointSaver ---
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self._decode(self.inner.get_tuple(config))
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        for saved in self.inner.list(config, filter=filter, before=before, limit=limit):
+            yield self._decode(saved)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return self.inner.put(config, self._encode(config, checkpoint, new_versions), metadata, new_versions)
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        self.inner.put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        self.inner.delete_thread(thread_id)
+        with self._lock:
+            for key in [key for key in self._resolved if key[0] == thread_id]:
+                del self._resolved[key]
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        saved = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in saved:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = ""
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+def get_checkpointer(kind: str = CHECKPOINTER) -> Optional[BaseCheckpointSaver]:
+    """Return the checkpointer selected by CHECKPOINTER, or None to compile graphs without one."""
+    if not kind:
+        return None
+    serde = CompressingSerializer()
+    if kind == "memory":
+        inner = InMemorySaver(serde=serde)
+    elif kind == "sqlite":
+        try:
+            from langgraph.checkpoint.sqlite import SqliteSaver
+        except ImportError as e:
+            raise ImportError(
+                "CHECKPOINTER=sqlite needs langgraph-checkpoint-sqlite. Run 'pip install langgraph-checkpoint-sqlite'.") from e
+        inner = SqliteSaver(sqlite3.connect(CHECKPOINT_PATH, check_same_thread=False), serde=serde)
+    else:
+        raise ValueError(f"Unknown CHECKPOINTER {kind!r}, expected 'memory' or 'sqlite'")
+    return DeltaCheckpointSaver(inner)
+
+
+@contextlib.asynccontextmanager
+async def served_checkpointer() -> AsyncIterator[BaseCheckpointSaver]:
+    """The LangGraph server's checkpointer (langgraph.json "checkpointer.path"), open while the server runs."""
+    checkpointer = await asyncio.to_thread(get_checkpointer, CHECKPOINTER or "sqlite")
+    try:
+        yield checkpointer
+    finally:
+        connection = getattr(checkpointer.inner, "conn", None)
+        if connection is not None:
+            await asyncio.to_thread(connection.close)
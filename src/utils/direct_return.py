@@ -0,0 +1,95 @@
+import os
+from typing import Iterable, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, RemoveMessage
+from langgraph.graph import END, StateGraph
+from langgraph_supervisor.handoff import METADATA_KEY_IS_HANDOFF_BACK
+
+# Sub-agents whose final answers go straight to the user instead of back through the
+# supervisor: a comma separated list of agent names, "*" for all agents, empty for none.
+DIRECT_RETURN_AGENTS = os.getenv("DIRECT_RETURN_AGENTS", "")
+
+DIRECT_RETURN_NODE = "direct_return"
+
+
+def direct_return_agents(agent_names: Iterable[str], policy: str = DIRECT_RETURN_AGENTS) -> set[str]:
+    """Resolve a DIRECT_RETURN_AGENTS style policy against the supervisor's agents."""
+    agent_names = set(agent_names)
+    names = {name.strip() for name in policy.split(",") if name.strip()}
+    if "*" in names:
+        return agent_names
+    return names & agent_names
+
+
+def _is_handoff_back(message: BaseMessage) -> bool:
+    return bool(message.response_metadata.get(METADATA_KEY_IS_HANDOFF_BACK))
+
+
+def _text(message: BaseMessage) -> str:
+    if isinstance(message.content, str):
+        return message.content
+    return "".join(
+        block if isinstance(block, str) else block.get("text", "")
+        for block in message.content
+    )
+
+
+def final_answer(messages: list[BaseMessage]) -> Optional[AIMessage]:
+    """Return the sub-agent's answer if its turn ended with a plain reply to the user."""
+    for message in reversed(messages):
+        if _is_handoff_back(message):
+            continue
+        if isinstance(message, AIMessage) and not message.tool_calls and _text(message).strip():
+            return message
+        return None
+    return None
+
+
+def _single_handoff(messages: list[BaseMessage], supervisor_name: str) -> bool:
+    """True when the supervisor's last delegation went to exactly one agent."""
+    for message in reversed(messages):
+        if isinstance(message, AIMessage) and message.name == supervisor_name and message.tool_calls:
+            handoffs = [call for call in message.tool_calls if call["name"].startswith("transfer_to_")]
+            return len(handoffs) == 1
+    return False
+
+
+def _drop_handoff_back(state: dict) -> dict:
+    """End the thread on the sub-agent's answer, without the transfer-back bookkeeping after it."""
+    removals = []
+    for message in reversed(state["messages"]):
+        if not _is_handoff_back(message):
+            break
+        removals.append(RemoveMessage(id=message.id))
+    return {"messages": removals}
+
+
+def add_direct_return(
+    builder: StateGraph,
+    agent_names: Iterable[str],
+    supervisor_name: str,
+    policy: str = DIRECT_RETURN_AGENTS,
+) -> StateGraph:
+    """Let sub-agents of a create_supervisor() builder answer the user directly.
+
+    For every agent selected by the policy, the fixed agent -> supervisor edge is replaced
+    by a conditional one: when the agent was the only one delegated to and finished with
+    a final answer, the thread ends on that answer instead of spending another supervisor
+    LLM call restating it. Otherwise control returns to the supervisor as before.
+    """
+    agents = direct_return_agents(agent_names, policy)
+    if not agents:
+        return builder
+
+    def route(state: dict) -> str:
+        messages = state["messages"]
+        if final_answer(messages) is not None and _single_handoff(messages, supervisor_name):
+            return DIRECT_RETURN_NODE
+        return supervisor_name
+
+    builder.add_node(DIRECT_RETURN_NODE, _drop_handoff_back)
+    builder.add_edge(DIRECT_RETURN_NODE, END)
+    for agent_name in agents:
+        builder.edges.discard((agent_name, supervisor_name))
+        builder.add_conditional_edges(agent_name, route, [supervisor_name, DIRECT_RETURN_NODE])
+    return builder
@@ -0,0 +1,420 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Iterator, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable
+from pydantic import PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+# --- LLM deployment pool ---
+#
+# LLM_DEPLOYMENTS (a JSON object or the path of a JSON file) lists, per model, the
+# deployments that serve it. Calls for that model are spread over them: each deployment
+# has token buckets for its requests and tokens per minute, a call goes to the ready
+# deployment with the fewest calls in flight, and a 429, 5xx or connection error puts
+# the deployment on cooldown and sends the call to the next one right away instead of
+# backing off in the SDK.
+#
+#   {
+#     "gpt-4.1": [
+#       {"name": "westeurope", "azure_endpoint": "https://we.openai.azure.com", "api_key_env": "AZURE_OPENAI_API_KEY",
+#        "azure_deployment": "gpt-4.1", "api_version": "2024-10-21", "rpm": 300, "tpm": 50000},
+#       {"name": "swedencentral", "azure_endpoint": "https://se.openai.azure.com", "api_key_env": "AZURE_OPENAI_API_KEY_SE",
+#        "azure_deployment": "gpt-4.1", "api_version": "2024-10-21", "rpm": 300, "tpm": 50000}
+#     ]
+#   }
+#
+# A deployment with a base_url instead of an azure_endpoint is called as a plain
+# OpenAI-compatible endpoint, e.g. a local mock server in tests. Any other keys are
+# passed to the chat model. Models without deployments keep the AZURE_OPENAI_* settings.
+
+LLM_DEPLOYMENTS = os.getenv("LLM_DEPLOYMENTS", "")
+# Seconds a deployment is skipped after a 429 without Retry-After, or a 5xx/connection error
+FAILOVER_COOLDOWN = float(os.getenv("LLM_FAILOVER_COOLDOWN", "10"))
+# Longest a call waits for a deployment with capacity before failing
+POOL_MAX_WAIT = float(os.getenv("LLM_POOL_MAX_WAIT", "30"))
+# Completion tokens reserved for a call that does not set max_tokens
+DEFAULT_COMPLETION_TOKENS = 500
+
+
+class PoolExhaustedError(RuntimeError):
+    """No deployment of a model had capacity within LLM_POOL_MAX_WAIT seconds."""
+
+
+class TokenBucket:
+    """Refills at per_minute units per minute up to per_minute; take() may overdraw it."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.capacity / 60)
+        self._updated = now
+
+    def wait(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken (0 when it can be now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) * 60 / self.capacity)
+
+    def take(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.level -= amount
+
+
+@dataclass
+class Deployment:
+    name: str
+    model: str
+    # Settings of the chat model that calls it
+    settings: dict
+    rpm: Optional[float] = None
+    tpm: Optional[float] = None
+    outstanding: int = 0
+    cooldown_until: float = 0.0
+    calls: int = 0
+    failures: int = 0
+    _requests: Optional[TokenBucket] = field(default=None, repr=False)
+    _tokens: Optional[TokenBucket] = field(default=None, repr=False)
+    _clients: dict = field(default_factory=dict, repr=False)
+
+    def __post_init__(self):
+        self._requests = TokenBucket(self.rpm) if self.rpm else None
+        self._tokens = TokenBucket(self.tpm) if self.tpm else None
+
+    def wait(self, tokens: float, now: float) -> float:
+        """Seconds until this deployment can take a call of tokens."""
+        waits = [self.cooldown_until - now]
+        if self._requests is not None:
+            waits.append(self._requests.wait(1, now))
+        if self._tokens is not None:
+            waits.append(self._tokens.wait(tokens, now))
+        return max(0.0, *waits)
+
+    def headroom(self, now: float) -> float:
+        return self._tokens.level if self._tokens is not None else float("inf")
+
+    def client(self, settings: dict) -> BaseChatModel:
+        """The chat model for this deployment with the caller's settings (temperature etc.), created once."""
+        key = json.dumps(settings, sort_keys=True, default=str)
+        if key not in self._clients:
+            self._clients[key] = _chat_model(self.model, {**settings, **self.settings})
+        return self._clients[key]
+
+
+def _chat_model(model: str, settings: dict) -> BaseChatModel:
+    # A failed call goes to the next deployment; the SDK must not retry it with backoff first
+    settings = {"max_retries": 0, **settings}
+    if "api_key_env" in settings:
+        settings["api_key"] = os.getenv(settings.pop("api_key_env"), "")
+    if "base_url" in settings:
+        from langchain_openai import ChatOpenAI
+
+        return ChatOpenAI(model=settings.pop("model", model), **settings)
+    from langchain_openai import AzureChatOpenAI
+
+    return AzureChatOpenAI(model=model, **settings)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def failover_cooldown(error: Exception) -> Optional[float]:
+    """Seconds to rest a deployment after error, or None when the error is not the deployment's fault."""
+    import openai
+
+    if isinstance(error, openai.RateLimitError):
+        return _retry_after(error) or FAILOVER_COOLDOWN
+    if isinstance(error, openai.APIStatusError) and error.status_code >= 500:
+        return FAILOVER_COOLDOWN
+    if isinstance(error, openai.APIConnectionError):
+        # Includes timeouts
+        return FAILOVER_COOLDOWN
+    return None
+
+
+class DeploymentPool:
+    """The deployments of one model, and which of them takes the next call."""
+
+    def __init__(self, model: str, deployments: list[Deployment]):
+        self.model = model
+        self.deployments = deployments
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: float) -> tuple[Optional[Deployment], float]:
+        with self._lock:
+            now = time.monotonic()
+            waits = {deployment.name: deployment.wait(tokens, now) for deployment in self.deployments}
+            ready = [deployment for deployment in self.deployments if waits[deployment.name] == 0]
+            if not ready:
+                return None, min(waits.values())
+            # Least outstanding work first; among equals the one with the most tokens left
+            deployment = min(ready, key=lambda d: (d.outstanding, -d.headroom(now)))
+            if deployment._requests is not None:
+                deployment._requests.take(1, now)
+            if deployment._tokens is not None:
+                deployment._tokens.take(tokens, now)
+            deployment.outstanding += 1
+            deployment.calls += 1
+            return deployment, 0.0
+
+    def _exhausted(self, tokens: float) -> PoolExhaustedError:
+        return PoolExhaustedError(
+            f"No deployment of {self.model} could take a call of ~{tokens:.0f} tokens within {POOL_MAX_WAIT:.0f}s"
+        )
+
+    def acquire(self, tokens: float) -> Deployment:
+        deadline = time.monotonic() + POOL_MAX_WAIT
+        while True:
+            deployment, wait = self._reserve(tokens)
+            if deployment is not None:
+                return deployment
+            if time.monotonic() + wait > deadline:
+                raise self._exhausted(tokens)
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: float) -> Deployment:
+        deadline = time.monotonic() + POOL_MAX_WAIT
+        while True:
+            deployment, wait = self._reserve(tokens)
+            if deployment is not None:
+                return deployment
+            if time.monotonic() + wait > deadline:
+                raise self._exhausted(tokens)
+            await asyncio.sleep(wait)
+
+    def release(self, deployment: Deployment, reserved: float, used: Optional[float] = None,
+                error: Optional[Exception] = None) -> Optional[float]:
+        """Finish a call. Returns the cooldown applied when error means the call should fail over."""
+        with self._lock:
+            deployment.outstanding -= 1
+            if used is not None and deployment._tokens is not None:
+                # Settle the reservation with what the call actually used
+                deployment._tokens.take(used - reserved, time.monotonic())
+            if error is None:
+                return None
+            cooldown = failover_cooldown(error)
+            if cooldown is not None:
+                deployment.failures += 1
+                deployment.cooldown_until = max(deployment.cooldown_until, time.monotonic() + cooldown)
+                logger.warning(f"{self.model} deployment {deployment.name} failed ({error}); resting it {cooldown:.0f}s")
+            return cooldown
+
+    def report(self) -> list[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "name": deployment.name,
+                "outstanding": deployment.outstanding,
+                "calls": deployment.calls,
+                "failures": deployment.failures,
+                "cooldown_s": max(0.0, deployment.cooldown_until - now),
+            }
+            for deployment in self.deployments
+        ]
+
+
+@functools.cache
+def _deployment_specs() -> dict[str, list[dict]]:
+    if not LLM_DEPLOYMENTS.strip():
+        return {}
+    if LLM_DEPLOYMENTS.strip().startswith("{"):
+        return json.loads(LLM_DEPLOYMENTS)
+    with open(LLM_DEPLOYMENTS, "r") as f:
+        return json.load(f)
+
+
+@functools.cache
+def deployment_pool(model: str) -> Optional[DeploymentPool]:
+    """The shared pool of a model, or None when LLM_DEPLOYMENTS lists no deployments for it."""
+    specs = _deployment_specs().get(model)
+    if not specs:
+        return None
+    deployments = []
+    for index, spec in enumerate(specs):
+        spec = dict(spec)
+        deployments.append(Deployment(
+            name=spec.pop("name", f"{model}-{index}"),
+            model=model,
+            rpm=spec.pop("rpm", None),
+            tpm=spec.pop("tpm", None),
+            settings=spec,
+        ))
+    return DeploymentPool(model, deployments)
+
+
+def pool_report() -> dict[str, list[dict]]:
+    """Calls in flight, totals, failures and remaining cooldown of every deployment in use."""
+    return {model: pool.report() for model in _deployment_specs() if (pool := deployment_pool(model)) is not None}
+
+
+def _estimate_tokens(messages: list[BaseMessage], settings: dict) -> float:
+    # About four characters per token; close enough to pace calls against a per-minute limit
+    chars = sum(len(message.content if isinstance(message.content, str) else json.dumps(message.content))
+                for message in messages)
+    return chars / 4 + (settings.get("max_tokens") or DEFAULT_COMPLETION_TOKENS)
+
+
+def _used_tokens(message: AIMessage) -> Optional[float]:
+    usage = getattr(message, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
+
+class PooledChatModel(BaseChatModel):
+    """A chat model whose calls are spread over the deployments of a DeploymentPool."""
+
+    model_name: str
+    # Settings of the chat model on every deployment (e.g. temperature)
+    settings: dict = {}
+    # bind_tools arguments, applied on whichever deployment takes a call
+    tools: Optional[list] = None
+    tool_kwargs: dict = {}
+    _bound: dict = PrivateAttr(default_factory=dict)
+
+    @property
+    def _llm_type(self) -> str:
+        return "pooled-chat-model"
+
+    @property
+    def pool(self) -> DeploymentPool:
+        return deployment_pool(self.model_name)
+
+    def bind_tools(self, tools, *, tool_choice=None, parallel_tool_calls: Optional[bool] = None, **kwargs):
+        if tool_choice is not None:
+            kwargs["tool_choice"] = tool_choice
+        if parallel_tool_calls is not None:
+            kwargs["parallel_tool_calls"] = parallel_tool_calls
+        bound = self.model_copy(update={"tools": list(tools), "tool_kwargs": kwargs})
+        bound._bound = {}
+        return bound
+
+    def _client(self, deployment: Deployment) -> Runnable:
+        if deployment.name not in self._bound:
+            client = deployment.client(self.settings)
+            self._bound[deployment.name] = (
+                client if self.tools is None else client.bind_tools(self.tools, **self.tool_kwargs)
+            )
+        return self._bound[deployment.name]
+
+    def _attempts(self) -> int:
+        return len(self.pool.deployments) * 2
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        pool, tokens = self.pool, _estimate_tokens(messages, {**self.settings, **kwargs})
+        for attempt in range(self._attempts()):
+            deployment = pool.acquire(tokens)
+            message, error = None, None
+            try:
+                message = self._client(deployment).invoke(messages, stop=stop, **kwargs)
+            except Exception as e:
+                error = e
+            finally:
+                # Also on cancellation, or the deployment would look busy for good
+                cooldown = pool.release(deployment, tokens, message and _used_tokens(message), error)
+            if error is None:
+                return ChatResult(generations=[ChatGeneration(message=message)])
+            if cooldown is None or attempt == self._attempts() - 1:
+                raise error
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        pool, tokens = self.pool, _estimate_tokens(messages, {**self.settings, **kwargs})
+        for attempt in range(self._attempts()):
+            deployment = await pool.aacquire(tokens)
+            message, error = None, None
+            try:
+                message = await self._client(deployment).ainvoke(messages, stop=stop, **kwargs)
+            except Exception as e:
+                error = e
+            finally:
+                cooldown = pool.release(deployment, tokens, message and _used_tokens(message), error)
+            if error is None:
+                return ChatResult(generations=[ChatGeneration(message=message)])
+            if cooldown is None or attempt == self._attempts() - 1:
+                raise error
+
+    # A stream fails over only until its first chunk; after that an error ends it
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        pool, tokens = self.pool, _estimate_tokens(messages, {**self.settings, **kwargs})
+        for attempt in range(self._attempts()):
+            deployment = pool.acquire(tokens)
+            used, error, streamed = None, None, False
+            try:
+                for chunk in self._client(deployment).stream(messages, stop=stop, **kwargs):
+                    streamed = True
+                    used = _used_tokens(chunk) or used
+                    yield ChatGenerationChunk(message=chunk)
+            except Exception as e:
+                error = e
+            finally:
+                # Also when the consumer stops reading early
+                cooldown = pool.release(deployment, tokens, used, error)
+            if error is None:
+                return
+            if streamed or cooldown is None or attempt == self._attempts() - 1:
+                raise error
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        pool, tokens = self.pool, _estimate_tokens(messages, {**self.settings, **kwargs})
+        for attempt in range(self._attempts()):
+            deployment = await pool.aacquire(tokens)
+            used, error, streamed = None, None, False
+            try:
+                async for chunk in self._client(deployment).astream(messages, stop=stop, **kwargs):
+                    streamed = True
+                    used = _used_tokens(chunk) or used
+                    yield ChatGenerationChunk(message=chunk)
+            except Exception as e:
+                error = e
+            finally:
+                cooldown = pool.release(deployment, tokens, used, error)
+            if error is None:
+                return
+            if streamed or cooldown is None or attempt == self._attempts() - 1:
+                raise error
@@ -5,6 +5,11 @@ from msal import TokenCache
 
 
 class LocalTokenCache(TokenCache):
+    """MSAL token cache persisted to a JSON file.
+
+    Reading and writing the file blocks, so create and use it from a worker thread
+    (as acquire_token in the knowledge agent is run), not on the event loop.
+    """
 
     def __init__(self, cache_location: str):
         super().__init__()
@@ -1,47 +1,74 @@
-from typing import Callable
+import os
+from typing import Callable, Iterable
+
+from langchain_core.messages import AIMessage, ToolMessage
 from langchain_core.tools import BaseTool, tool as create_tool
 from langchain_core.runnables import RunnableConfig
 from langgraph.types import interrupt
-from langgraph.prebuilt.interrupt import HumanInterruptConfig, HumanInterrupt
+from langgraph.prebuilt.interrupt import HumanInterruptConfig, HumanInterrupt, HumanResponse
+
+from src.utils.prefetch import speculate
+
+# Tools whose calls need human approval before they run (comma separated tool names).
+# Reviews pause the graph with interrupt(), so the graph needs a checkpointer.
+HUMAN_REVIEW_TOOLS = os.getenv("HUMAN_REVIEW_TOOLS", "")
+
+DEFAULT_INTERRUPT_CONFIG: HumanInterruptConfig = {
+    "allow_ignore": False,
+    "allow_accept": True,
+    "allow_edit": True,
+    "allow_respond": True,
+}
+
+
+def human_review_tools(policy: str = HUMAN_REVIEW_TOOLS) -> set[str]:
+    """Tool names from a HUMAN_REVIEW_TOOLS style policy."""
+    return {name.strip() for name in policy.split(",") if name.strip()}
+
+
+def _review_request(name: str, args: dict, interrupt_config: HumanInterruptConfig) -> HumanInterrupt:
+    return {
+        "action_request": {
+            "action": name,
+            "args": args
+        },
+        "config": interrupt_config,
+        "description": "Please review the tool call"
+    }
+
 
 def add_human_in_the_loop(
     tool: Callable | BaseTool,
     *,
     interrupt_config: HumanInterruptConfig = None,
 ) -> BaseTool:
-    """Wrap a tool to support human-in-the-loop review."""
+    """Wrap a tool to support human-in-the-loop review.
+
+    Every call interrupts on its own; to review all calls of a model turn at once,
+    use human_review_hook instead.
+    """
     if not isinstance(tool, BaseTool):
         tool = create_tool(tool)
 
     if interrupt_config is None:
-        interrupt_config = {
-            "allow_accept": True,
-            "allow_edit": True,
-            "allow_respond": True,
-        }
+        interrupt_config = DEFAULT_INTERRUPT_CONFIG
 
     @create_tool(  
         tool.name,
         description=tool.description,
         args_schema=tool.args_schema
     )
-    def call_tool_with_interrupt(config: RunnableConfig, **tool_input):
-        request: HumanInterrupt = {
-            "action_request": {
-                "action": tool.name,
-                "args": tool_input
-            },
-            "config": interrupt_config,
-            "description": "Please review the tool call"
-        }
-        response = interrupt([request])[0]  
+    async def call_tool_with_interrupt(config: RunnableConfig, **tool_input):
+        # Warm up the read-only calls this one needs while the reviewer decides
+        speculate([{"name": tool.name, "args": tool_input}], config)
+        response = interrupt([_review_request(tool.name, tool_input, interrupt_config)])[0]
         # approve the tool call
         if response["type"] == "accept":
-            tool_response = tool.invoke(tool_input, config)
+            tool_response = await tool.ainvoke(tool_input, config)
         # update tool call args
         elif response["type"] == "edit":
             tool_input = response["args"]["args"]
-            tool_response = tool.invoke(tool_input, config)
+            tool_response = await tool.ainvoke(tool_input, config)
         # respond to the LLM with user feedback
         elif response["type"] == "response":
             user_feedback = response["args"]
@@ -51,4 +78,63 @@ def add_human_in_the_loop(
 
         return tool_response
 
-    return call_tool_with_interrupt
\ No newline at end of file
+    return call_tool_with_interrupt
+
+
+def human_review_hook(
+    tools: Iterable[str | BaseTool],
+    *,
+    interrupt_config: HumanInterruptConfig = None,
+) -> Callable:
+    """post_model_hook for create_react_agent that reviews guarded tool calls in one batch.
+
+    When the model asks for several guarded calls in one turn, the reviewer gets a single
+    interrupt with one request per call and resumes it with a list of responses in the
+    same order. Accepted and edited calls then go to the tools node, which runs them
+    concurrently, the read-only ones usually from results prefetched during the review
+    (SPECULATIVE_PREFETCH); calls answered with a "response" (or ignored) are not run, and the
+    reviewer's answer is returned to the model as their tool result.
+    """
+    names = {tool if isinstance(tool, str) else tool.name for tool in tools}
+    if interrupt_config is None:
+        interrupt_config = DEFAULT_INTERRUPT_CONFIG
+
+    async def review_tool_calls(state) -> dict:
+        last = state["messages"][-1]
+        if not isinstance(last, AIMessage):
+            return {}
+        guarded = [call for call in last.tool_calls if call["name"] in names]
+        if not guarded:
+            return {}
+
+        # Read-only calls of this turn, and those the guarded calls need, run while the reviewer decides
+        speculate(last.tool_calls)
+        responses: list[HumanResponse] = interrupt(
+            [_review_request(call["name"], call["args"], interrupt_config) for call in guarded]
+        )
+        if not isinstance(responses, list) or len(responses) != len(guarded):
+            raise ValueError(f"Expected {len(guarded)} review responses, got {responses!r}")
+        by_id = {call["id"]: response for call, response in zip(guarded, responses)}
+
+        tool_calls, answered = [], []
+        for call in last.tool_calls:
+            response = by_id.get(call["id"])
+            if response is None or response["type"] == "accept":
+                tool_calls.append(call)
+            elif response["type"] == "edit":
+                tool_calls.append({**call, "args": response["args"]["args"]})
+            elif response["type"] in ("response", "ignore"):
+                # The call stays on the AI message, answered by the reviewer, so the tools node skips it
+                tool_calls.append(call)
+                answered.append(ToolMessage(
+                    content=response["args"] if response["type"] == "response" else "The user declined this tool call.",
+                    name=call["name"],
+                    tool_call_id=call["id"],
+                ))
+            else:
+                raise ValueError(f"Unsupported interrupt response type: {response['type']}")
+
+        # Same message id, so add_messages replaces the model's message
+        return {"messages": [last.model_copy(update={"tool_calls": tool_calls}), *answered]}
+
+    return review_tool_calls
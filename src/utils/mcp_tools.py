@@ -0,0 +1,203 @@
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import os
+from typing import Optional
+
+from langchain_core.runnables import ensure_config
+from langchain_core.tools import BaseTool
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain_mcp_adapters.tools import convert_mcp_tool_to_langchain_tool
+from mcp.types import Tool as MCPTool
+
+from src.utils.prefetch import with_prefetch
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of tool calls in flight per MCP server, shared by every agent in the process.
+# Override per server with MCP_MAX_CONCURRENCY_<SERVER>, e.g. MCP_MAX_CONCURRENCY_ACCOUNTS=2.
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("MCP_MAX_CONCURRENCY", "4"))
+
+_semaphores: dict[str, asyncio.Semaphore] = {}
+
+# When set, every run must pass its customer's cookie; the cookie from the environment is never used
+MULTI_TENANT = os.getenv("MULTI_TENANT", "").lower() in ("1", "true", "yes")
+
+
+def server_semaphore(server_name: str) -> asyncio.Semaphore:
+    """Return the semaphore that bounds concurrent tool calls to one MCP server."""
+    if server_name not in _semaphores:
+        limit = int(os.getenv(f"MCP_MAX_CONCURRENCY_{server_name.upper()}", DEFAULT_MAX_CONCURRENCY))
+        _semaphores[server_name] = asyncio.Semaphore(max(1, limit))
+    return _semaphores[server_name]
+
+
+def limit_concurrency(tool: BaseTool, server_name: str) -> BaseTool:
+    """Wrap an MCP tool so its calls wait for a slot on the server's semaphore."""
+    coroutine = tool.coroutine
+
+    @functools.wraps(coroutine)
+    async def call_with_limit(*args, **kwargs):
+        async with server_semaphore(server_name):
+            return await coroutine(*args, **kwargs)
+
+    return tool.model_copy(update={"coroutine": call_with_limit})
+
+
+def run_cookie() -> Optional[str]:
+    """Return the session cookie passed for the current run as config["configurable"]["cookie"], if any."""
+    return ensure_config().get("configurable", {}).get("cookie") or None
+
+
+def with_run_cookie(tool: BaseTool, mcp_tool: MCPTool, connection: dict) -> BaseTool:
+    """Wrap an MCP tool so calls made in a run that carries its own cookie are sent with that cookie.
+
+    The cookie in the connection headers (read from the environment) remains the default for
+    runs without one, so one deployment can serve many customers side by side. With
+    MULTI_TENANT set, runs without a cookie are refused instead, so no call can silently act
+    as the environment's customer.
+    """
+    if "headers" not in connection:
+        # stdio servers (e.g. the time server) carry no user identity
+        return tool
+    coroutine = tool.coroutine
+
+    @functools.wraps(coroutine)
+    async def call_with_run_cookie(*args, **kwargs):
+        cookie = run_cookie()
+        if cookie is None:
+            if MULTI_TENANT:
+                raise PermissionError(
+                    f"{tool.name} needs the customer's cookie in config['configurable']['cookie'] (MULTI_TENANT is set)"
+                )
+            return await coroutine(*args, **kwargs)
+        run_connection = {**connection, "headers": {**connection["headers"], "cookie": cookie}}
+        run_tool = convert_mcp_tool_to_langchain_tool(None, mcp_tool, connection=run_connection)
+        return await run_tool.coroutine(*args, **kwargs)
+
+    return tool.model_copy(update={"coroutine": call_with_run_cookie})
+
+
+# Snapshot of the tool schemas of every MCP server, so graphs can be built without
+# waiting for the servers to come up. Set MCP_TOOL_MANIFEST="" to always load live.
+MANIFEST_PATH = os.getenv("MCP_TOOL_MANIFEST", "./.mcp_tool_manifest.json")
+
+_manifest_lock = asyncio.Lock()
+# Background schema checks, referenced so they are not garbage collected mid-flight
+_refresh_tasks: set[asyncio.Task] = set()
+
+
+def _read_manifest() -> dict:
+    if not MANIFEST_PATH or not os.path.exists(MANIFEST_PATH):
+        return {}
+    try:
+        with open(MANIFEST_PATH, "r") as f:
+            return json.load(f).get("servers", {})
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable MCP tool manifest {MANIFEST_PATH}: {e}")
+        return {}
+
+
+def _write_manifest(servers: dict) -> None:
+    tmp_path = f"{MANIFEST_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"servers": servers}, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def _connection_fingerprint(connection: dict) -> str:
+    """Identify where a server lives; headers (credentials) are deliberately left out."""
+    location = {key: connection.get(key) for key in ("transport", "url", "command", "args")}
+    return hashlib.sha256(json.dumps(location, sort_keys=True).encode()).hexdigest()
+
+
+def _schema_version(tools: list[dict]) -> str:
+    return hashlib.sha256(json.dumps(tools, sort_keys=True).encode()).hexdigest()
+
+
+async def _list_server_tools(client: MultiServerMCPClient, server_name: str) -> list[MCPTool]:
+    tools: list[MCPTool] = []
+    cursor = None
+    async with client.session(server_name) as session:
+        while True:
+            page = await session.list_tools(cursor=cursor)
+            tools.extend(page.tools)
+            if not page.nextCursor:
+                return tools
+            cursor = page.nextCursor
+
+
+async def _save_server_tools(server_name: str, connection: dict, tools: list[MCPTool]) -> bool:
+    """Store a server's tool schemas in the manifest. Return True when they differ from the stored ones."""
+    if not MANIFEST_PATH:
+        return False
+    dumped = [tool.model_dump(mode="json", exclude_none=True) for tool in tools]
+    entry = {
+        "version": _schema_version(dumped),
+        "connection": _connection_fingerprint(connection),
+        "tools": dumped,
+    }
+    async with _manifest_lock:
+        servers = await asyncio.to_thread(_read_manifest)
+        previous = servers.get(server_name, {})
+        if previous.get("version") == entry["version"] and previous.get("connection") == entry["connection"]:
+            return False
+        servers[server_name] = entry
+        await asyncio.to_thread(_write_manifest, servers)
+    return True
+
+
+async def _refresh_server_tools(client: MultiServerMCPClient, server_name: str) -> None:
+    try:
+        tools = await _list_server_tools(client, server_name)
+        if await _save_server_tools(server_name, client.connections[server_name], tools):
+            logger.warning(
+                f"Tool schemas of MCP server '{server_name}' changed; the manifest was updated "
+                "and graphs built from now on use the new schemas."
+            )
+    except Exception as e:
+        logger.warning(f"Could not check MCP server '{server_name}' against the tool manifest: {e}")
+
+
+async def _load_server_tools(client: MultiServerMCPClient, server_name: str, manifest: dict) -> list[BaseTool]:
+    connection = client.connections[server_name]
+    entry = manifest.get(server_name)
+    if entry and entry.get("connection") == _connection_fingerprint(connection):
+        tools = [MCPTool.model_validate(tool) for tool in entry["tools"]]
+        task = asyncio.create_task(_refresh_server_tools(client, server_name))
+        _refresh_tasks.add(task)
+        task.add_done_callback(_refresh_tasks.discard)
+    else:
+        tools = await _list_server_tools(client, server_name)
+        await _save_server_tools(server_name, connection, tools)
+    # Without a session every call opens its own, exactly like client.get_tools()
+    return [
+        with_prefetch(limit_concurrency(
+            with_run_cookie(convert_mcp_tool_to_langchain_tool(None, tool, connection=connection), tool, connection),
+            server_name,
+        ))
+        for tool in tools
+    ]
+
+
+async def load_mcp_tools(client: MultiServerMCPClient) -> list[BaseTool]:
+    """Load the tools of every server configured on the client, each bounded by its server's semaphore
+    and sent with the run's own cookie when one is passed in the config.
+
+    Tool calls emitted together in one model message are executed concurrently by the
+    agent's tool node; the semaphores keep one busy upstream from being flooded.
+
+    Read-only tools answer from results prefetched while a call waited for approval
+    (see src/utils/prefetch.py).
+
+    Servers found in the tool manifest are built from their snapshot straight away and
+    checked against the live server in the background; the others are listed live and
+    added to the manifest.
+    """
+    manifest = await asyncio.to_thread(_read_manifest)
+    server_tools = await asyncio.gather(
+        *(_load_server_tools(client, server_name, manifest) for server_name in client.connections)
+    )
+    return [tool for tools in server_tools for tool in tools]
@@ -0,0 +1,295 @@
+import asyncio
+import functools
+import json
+import logging
+import math
+import os
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import BaseModel, ValidationError
+
+from src.utils.llm_pool import PooledChatModel, deployment_pool
+
+logger = logging.getLogger(__name__)
+
+
+def get_model(model: str = "gpt-4.1", **kwargs) -> BaseChatModel:
+    """Return the shared chat model for a deployment, creating it on first use.
+
+    langchain_openai (and the openai SDK behind it) is only imported here, so importing
+    a graph module stays cheap until one of its graphs is actually built.
+    Models with deployments in LLM_DEPLOYMENTS are spread over them (see llm_pool.py).
+    kwargs are JSON settings; dict and list values (e.g. "model_kwargs" from MODEL_POLICIES)
+    are fine, as models are shared per JSON encoding of the settings.
+    """
+    return _shared_model(model, json.dumps(kwargs, sort_keys=True))
+
+
+@functools.cache
+def _shared_model(model: str, settings: str) -> BaseChatModel:
+    kwargs = json.loads(settings)
+    if deployment_pool(model) is not None:
+        return PooledChatModel(model_name=model, settings=kwargs)
+    from langchain_openai import AzureChatOpenAI
+
+    return AzureChatOpenAI(model=model, **kwargs)
+
+
+async def aget_model(model: str = "gpt-4.1", **kwargs) -> BaseChatModel:
+    """get_model for async graph factories: the first call imports the SDK and builds its
+    HTTP clients (reading certificates from disk), so it runs in a worker thread."""
+    return await asyncio.to_thread(get_model, model, **kwargs)
+
+
+# --- Per-node model routing ---
+#
+# Each graph node asks for its model by node name (get_node_model("PaymentsAgent", "gpt-4.1")).
+# MODEL_POLICIES, a JSON object or the path of a JSON file, can move a node to a smaller,
+# faster deployment and escalate to a larger one only when the small one's output is not
+# good enough:
+#
+#   {
+#     "default": {"model": "gpt-4.1"},
+#     "ConversationalAgent": {"model": "gpt-4.1-mini", "escalate_to": "gpt-4.1"},
+#     "PaymentsAgent": {"model": "gpt-4.1-mini", "escalate_to": "gpt-4.1", "answer_model": "gpt-4.1"},
+#     "plan_act.replanner": {"model": "gpt-4.1-mini", "escalate_to": "gpt-4.1", "min_confidence": 0.8}
+#   }
+#
+# escalate_to answers instead when the primary's tool calls are malformed or do not match
+# the tool schemas, or when its confidence (mean token probability) is under min_confidence.
+# answer_model rewrites final answers (replies without tool calls). Other keys are passed to
+# the model, e.g. "temperature". Nodes without a policy use the model in the code, unchanged.
+# routing_report() shows per node how often each model ran, how long it took and why
+# escalations happened, to compare policies on the same workload.
+
+MODEL_POLICIES = os.getenv("MODEL_POLICIES", "")
+
+
+@dataclass(frozen=True)
+class ModelPolicy:
+    model: Optional[str] = None
+    escalate_to: Optional[str] = None
+    answer_model: Optional[str] = None
+    min_confidence: Optional[float] = None
+    kwargs: dict = field(default_factory=dict)
+
+    @property
+    def routed(self) -> bool:
+        return bool(self.escalate_to or self.answer_model)
+
+
+@functools.cache
+def model_policies() -> dict[str, ModelPolicy]:
+    """The policies in MODEL_POLICIES by node name, read once."""
+    if not MODEL_POLICIES.strip():
+        return {}
+    if MODEL_POLICIES.strip().startswith("{"):
+        raw = json.loads(MODEL_POLICIES)
+    else:
+        with open(MODEL_POLICIES, "r") as f:
+            raw = json.load(f)
+    names = {"model", "escalate_to", "answer_model", "min_confidence"}
+    return {
+        node: ModelPolicy(
+            **{key: value for key, value in spec.items() if key in names},
+            kwargs={key: value for key, value in spec.items() if key not in names},
+        )
+        for node, spec in raw.items()
+    }
+
+
+def model_policy(node: str) -> ModelPolicy:
+    policies = model_policies()
+    return policies.get(node) or policies.get("default") or ModelPolicy()
+
+
+# node -> counters: "calls", "escalated:<reason>", "<model> calls" and "<model> seconds"
+_routing_stats: dict[str, Counter] = defaultdict(Counter)
+
+
+def routing_report() -> dict[str, dict[str, float]]:
+    """Per-node routing counters since the process started."""
+    return {node: dict(counters) for node, counters in _routing_stats.items()}
+
+
+def confidence(message: BaseMessage) -> Optional[float]:
+    """Mean token probability of a reply's text, when the model returned logprobs."""
+    tokens = ((message.response_metadata or {}).get("logprobs") or {}).get("content") or []
+    logprobs = [token["logprob"] for token in tokens if token.get("logprob") is not None]
+    if not logprobs:
+        return None
+    return math.exp(sum(logprobs) / len(logprobs))
+
+
+def _schema(tool: Any) -> tuple[str, Any]:
+    """The name of a bound tool and what its arguments are validated against."""
+    if isinstance(tool, type) and issubclass(tool, BaseModel):
+        return convert_to_openai_tool(tool)["function"]["name"], tool
+    args_schema = getattr(tool, "args_schema", None)
+    if isinstance(args_schema, type) and issubclass(args_schema, BaseModel):
+        return tool.name, args_schema
+    function = convert_to_openai_tool(tool)["function"]
+    return function["name"], function.get("parameters") or {}
+
+
+def invalid_reason(message: AIMessage, schemas: dict[str, Any], tool_required: bool) -> Optional[str]:
+    """Why a reply's tool calls cannot be used as they are, or None when they can."""
+    if message.invalid_tool_calls:
+        return f"malformed arguments for {message.invalid_tool_calls[0].get('name')}"
+    if tool_required and not message.tool_calls:
+        return "no tool call"
+    for call in message.tool_calls:
+        if call["name"] not in schemas:
+            return f"unknown tool {call['name']}" if schemas else None
+        schema = schemas[call["name"]]
+        if isinstance(schema, type):
+            try:
+                schema.model_validate(call["args"])
+            except ValidationError as e:
+                return f"invalid arguments for {call['name']}: {e.errors()[0]['msg']}"
+            continue
+        missing = [name for name in schema.get("required", []) if name not in call["args"]]
+        if missing:
+            return f"{call['name']} is missing {', '.join(missing)}"
+        properties = schema.get("properties")
+        unknown = [name for name in call["args"] if properties is not None and name not in properties]
+        if unknown and schema.get("additionalProperties") is False:
+            return f"{call['name']} got unknown arguments {', '.join(unknown)}"
+    return None
+
+
+class RoutedChatModel(BaseChatModel):
+    """A chat model that answers with a primary deployment and escalates to others per a ModelPolicy."""
+
+    node: str
+    policy: ModelPolicy
+    primary: Runnable
+    escalation: Optional[Runnable] = None
+    answer: Optional[Runnable] = None
+    # Argument schemas of the bound tools by name
+    schemas: dict[str, Any] = {}
+    tool_required: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "routed-chat-model"
+
+    def bind_tools(self, tools, *, tool_choice=None, parallel_tool_calls: Optional[bool] = None, **kwargs):
+        if parallel_tool_calls is not None:
+            kwargs["parallel_tool_calls"] = parallel_tool_calls
+
+        def bind(model: Optional[Runnable]) -> Optional[Runnable]:
+            return None if model is None else model.bind_tools(tools, tool_choice=tool_choice, **kwargs)
+
+        return self.model_copy(update={
+            "primary": bind(self.primary),
+            "escalation": bind(self.escalation),
+            "answer": bind(self.answer),
+            "schemas": dict(_schema(tool) for tool in tools),
+            "tool_required": tool_choice not in (None, False, "auto", "none"),
+        })
+
+    def _route(self, message: AIMessage) -> Optional[tuple[str, str, Runnable, str]]:
+        """Why and to which model (and deployment) a primary reply escalates, or None to keep it."""
+        if self.escalation is not None:
+            reason = invalid_reason(message, self.schemas, self.tool_required)
+            if reason is not None:
+                return "invalid", reason, self.escalation, self.policy.escalate_to
+            score = confidence(message) if self.policy.min_confidence is not None else None
+            if score is not None and score < self.policy.min_confidence:
+                return "low_confidence", f"confidence {score:.2f}", self.escalation, self.policy.escalate_to
+        if self.answer is not None and not message.tool_calls and not self.tool_required:
+            return "final_answer", "final answer", self.answer, self.policy.answer_model
+        return None
+
+    def _record(self, model: str, started: float) -> None:
+        stats = _routing_stats[self.node]
+        stats[f"{model} calls"] += 1
+        stats[f"{model} seconds"] += time.monotonic() - started
+
+    def _escalate(self, message: AIMessage) -> Optional[tuple[Runnable, str]]:
+        route = self._route(message)
+        if route is None:
+            return None
+        category, reason, model, name = route
+        _routing_stats[self.node][f"escalated:{category}"] += 1
+        logger.info(f"{self.node}: escalating to {name} ({reason})")
+        return model, name
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        _routing_stats[self.node]["calls"] += 1
+        started = time.monotonic()
+        message = self.primary.invoke(messages, stop=stop, **kwargs)
+        self._record(self.policy.model, started)
+        escalation = self._escalate(message)
+        if escalation is not None:
+            model, name = escalation
+            started = time.monotonic()
+            message = model.invoke(messages, stop=stop, **kwargs)
+            self._record(name, started)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        _routing_stats[self.node]["calls"] += 1
+        started = time.monotonic()
+        message = await self.primary.ainvoke(messages, stop=stop, **kwargs)
+        self._record(self.policy.model, started)
+        escalation = self._escalate(message)
+        if escalation is not None:
+            model, name = escalation
+            started = time.monotonic()
+            message = await model.ainvoke(messages, stop=stop, **kwargs)
+            self._record(name, started)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def get_node_model(node: str, model: str = "gpt-4.1", **kwargs) -> BaseChatModel:
+    """Return the model for a graph node: the deployment its MODEL_POLICIES entry routes to, else model.
+
+    Nodes whose policy only names a deployment get that shared model as is; policies with
+    escalate_to or answer_model get a RoutedChatModel around the deployments.
+    """
+    policy = model_policy(node)
+    policy = ModelPolicy(
+        model=policy.model or model,
+        escalate_to=policy.escalate_to,
+        answer_model=policy.answer_model,
+        min_confidence=policy.min_confidence,
+        kwargs={**kwargs, **policy.kwargs},
+    )
+    if not policy.routed:
+        return get_model(policy.model, **policy.kwargs)
+    primary_kwargs = {**policy.kwargs, "logprobs": True} if policy.min_confidence is not None else policy.kwargs
+    return RoutedChatModel(
+        node=node,
+        policy=policy,
+        primary=get_model(policy.model, **primary_kwargs),
+        escalation=get_model(policy.escalate_to, **policy.kwargs) if policy.escalate_to else None,
+        answer=get_model(policy.answer_model, **policy.kwargs) if policy.answer_model else None,
+    )
+
+
+async def aget_node_model(node: str, model: str = "gpt-4.1", **kwargs) -> BaseChatModel:
+    """get_node_model for async graph factories; see aget_model."""
+    return await asyncio.to_thread(get_node_model, node, model, **kwargs)
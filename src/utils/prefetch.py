@@ -0,0 +1,237 @@
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+from langchain_core.runnables import RunnableConfig, ensure_config
+from langchain_core.runnables.config import var_child_runnable_config
+from langchain_core.tools import BaseTool
+
+logger = logging.getLogger(__name__)
+
+# --- Speculative prefetch ---
+#
+# While a tool call waits for human approval, the read-only calls that will follow it
+# (balances, address-book matches, account formats) are started in the background, so
+# after approval only the approved action itself is left to run. Only tools listed in
+# READ_ONLY_TOOLS are ever called speculatively; anything else runs only when it is
+# actually executed, and then drops the thread's prefetched results it makes stale.
+
+SPECULATIVE_PREFETCH = os.getenv("SPECULATIVE_PREFETCH", "0").lower() in ("1", "true", "yes")
+# Prefetched results are dropped when they are not used within this many seconds
+PREFETCH_TTL = float(os.getenv("PREFETCH_TTL", "120"))
+MAX_PREFETCHED = 256
+
+READ_ONLY_TOOLS = frozenset({
+    "get_account_balance_list",
+    "get_payments_contracts_list",
+    "get_transactions",
+    "get_portfolio_transactions_summary",
+    "fetch_address_book",
+    "fetch_account_number_formats",
+    "fetch_payment_models_query",
+    "fetch_payment_instruction_type_options",
+    "fetch_account_holder_validation",
+    "get_manage_data_client",
+    "customer_representatives",
+    "get_messsages",
+    "get_detailed_message",
+    "get_messages_with_details",
+    "get_newsletter_settings",
+    "get_tasks",
+    "payment_preflight",
+})
+
+
+def _sepa_payment_reads(args: dict) -> list[tuple[str, dict]]:
+    # Balances are read before the payment runs (e.g. to check funds); the payment itself
+    # discards them again (INVALIDATES), so a stale balance is never served afterwards
+    reads = [("get_account_balance_list", {}), ("fetch_account_number_formats", {})]
+    counter_account, counter_party = args.get("transaction_account_number"), args.get("transaction_counter_party_name")
+    if counter_account and args.get("ordering_account_number"):
+        reads.append(("fetch_payment_instruction_type_options", {
+            "counter_account_number": counter_account,
+            "ordering_account_number": args["ordering_account_number"],
+        }))
+    if counter_account and counter_party:
+        reads.append(("fetch_account_holder_validation", {"name": counter_party, "iban": counter_account}))
+    if counter_party and args.get("business_contact_number"):
+        reads.append(("fetch_address_book", {
+            "owner_reference": str(args["business_contact_number"]),
+            "search_string": counter_party,
+        }))
+    return reads
+
+
+# Read-only calls likely to follow a (mutating) tool call, derived from its arguments
+PREFETCH_PLANS: dict[str, Callable[[dict], list[tuple[str, dict]]]] = {
+    "fetch_single_sepa_payment_instruction": _sepa_payment_reads,
+}
+
+# Read-only tools whose prefetched results a mutating tool makes stale; other mutating tools drop them all
+INVALIDATES: dict[str, frozenset[str]] = {
+    "fetch_single_sepa_payment_instruction": frozenset({
+        "get_account_balance_list", "get_payments_contracts_list", "get_transactions", "get_portfolio_transactions_summary",
+    }),
+    "change_phone_number": frozenset({"get_manage_data_client", "customer_representatives"}),
+    "delete_message": frozenset({"get_messsages", "get_detailed_message", "get_messages_with_details"}),
+    "delete_messages": frozenset({"get_messsages", "get_detailed_message", "get_messages_with_details"}),
+    "delete_task": frozenset({"get_tasks"}),
+}
+
+# Read-only tools by name, before wrapping, for speculative calls
+_tools: dict[str, BaseTool] = {}
+# (thread_id, tool name, arguments) -> (task, started at)
+_prefetched: "OrderedDict[tuple, tuple[asyncio.Task, float]]" = OrderedDict()
+
+
+def _coerce(value, spec: dict):
+    """Convert a value the model gave as the wrong JSON type (e.g. "10" for an integer) to the schema's type."""
+    kind = spec.get("type")
+    if isinstance(value, bool) or value is None:
+        return value
+    try:
+        if kind == "string" and isinstance(value, (int, float)):
+            return str(value)
+        if kind == "integer" and isinstance(value, (str, float)) and float(value) == int(float(value)):
+            return int(float(value))
+        if kind == "number" and isinstance(value, (str, int)):
+            return float(value)
+        if kind == "boolean" and isinstance(value, str) and value.lower() in ("true", "false"):
+            return value.lower() == "true"
+    except ValueError:
+        pass
+    return value
+
+
+def normalized_args(tool: BaseTool, args: dict) -> dict:
+    """Tool call arguments as the tool receives them, with the schema defaults filled in.
+
+    Raw tool-call arguments from the model and the parsed keyword arguments of the tool
+    coroutine both normalize to the same dict, so equal calls compare equal.
+    """
+    # The tool node injects the LangGraph runtime; it is not part of the call
+    args = {key: value for key, value in args.items() if key != "runtime"}
+    try:
+        # Pydantic schemas coerce and validate as the real call will; JSON schemas pass through
+        parsed = tool._parse_input(args, None)
+    except Exception:
+        parsed = args
+    if isinstance(parsed, dict):
+        args = {key: value for key, value in parsed.items() if key != "runtime"}
+    properties = tool.args
+    args = {name: _coerce(value, properties.get(name, {})) for name, value in args.items()}
+    defaults = {name: spec["default"] for name, spec in properties.items() if "default" in spec}
+    return {**defaults, **args}
+
+
+def _key(thread_id: str, tool: BaseTool, args: dict) -> tuple:
+    return thread_id, tool.name, json.dumps(normalized_args(tool, args), sort_keys=True, default=str)
+
+
+def _thread_id(config: Optional[RunnableConfig] = None) -> Optional[str]:
+    config = config or ensure_config()
+    return config.get("configurable", {}).get("thread_id")
+
+
+def _expire(now: float) -> None:
+    while _prefetched:
+        key, (task, started) = next(iter(_prefetched.items()))
+        if len(_prefetched) <= MAX_PREFETCHED and now - started < PREFETCH_TTL:
+            break
+        del _prefetched[key]
+        task.cancel()
+
+
+def _take(key: tuple) -> Optional[asyncio.Task]:
+    _expire(time.monotonic())
+    entry = _prefetched.pop(key, None)
+    return entry[0] if entry else None
+
+
+def discard(thread_id: str, tool_names: Optional[Iterable[str]] = None) -> None:
+    """Drop the prefetched results of a thread, optionally only those of the given tools."""
+    tool_names = None if tool_names is None else set(tool_names)
+    for key in [key for key in _prefetched if key[0] == thread_id and (tool_names is None or key[1] in tool_names)]:
+        _prefetched.pop(key)[0].cancel()
+
+
+def speculate(tool_calls: Iterable[dict], config: Optional[RunnableConfig] = None) -> int:
+    """Start the read-only calls among tool_calls, and those their PREFETCH_PLANS need, in the background.
+
+    Call it right before interrupting for approval. Calls already prefetched for the thread
+    are not started again, so a node that re-runs on resume does not repeat them.
+    Returns the number of calls started.
+    """
+    config = config or ensure_config()
+    thread_id = _thread_id(config)
+    if not SPECULATIVE_PREFETCH or thread_id is None:
+        return 0
+    reads = []
+    for call in tool_calls:
+        if call["name"] in READ_ONLY_TOOLS:
+            reads.append((call["name"], call["args"]))
+        if call["name"] in PREFETCH_PLANS:
+            reads.extend(PREFETCH_PLANS[call["name"]](call["args"]))
+
+    # The speculative calls outlive this run: keep the run's settings (e.g. its cookie), not its callbacks
+    configurable = {key: value for key, value in config.get("configurable", {}).items() if not key.startswith("__")}
+    context = contextvars.copy_context()
+    context.run(var_child_runnable_config.set, {"configurable": configurable})
+    now = time.monotonic()
+    _expire(now)
+    started = 0
+    for name, args in reads:
+        tool = _tools.get(name)
+        if tool is None:
+            continue
+        key = _key(thread_id, tool, args)
+        if key in _prefetched:
+            continue
+        task = asyncio.get_running_loop().create_task(tool.coroutine(**normalized_args(tool, args)), context=context)
+        # A failed prefetch is retried when the call is made for real
+        task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        _prefetched[key] = (task, now)
+        started += 1
+    if started:
+        logger.info(f"Prefetching {started} read-only tool call(s) for thread {thread_id}")
+    return started
+
+
+def with_prefetch(tool: BaseTool) -> BaseTool:
+    """Wrap a tool so it uses results prefetched by speculate().
+
+    Read-only tools answer from a matching prefetched call of the same thread; other tools
+    run as usual and then discard the thread's prefetched results they make stale.
+    """
+    coroutine = tool.coroutine
+
+    if tool.name in READ_ONLY_TOOLS:
+        _tools[tool.name] = tool
+
+        @functools.wraps(coroutine)
+        async def call_with_prefetch(*args, **kwargs):
+            thread_id = _thread_id()
+            task = _take(_key(thread_id, tool, kwargs)) if thread_id is not None and not args else None
+            if task is not None:
+                try:
+                    return await task
+                except Exception as e:
+                    logger.info(f"Prefetched {tool.name} failed ({e}); calling it again")
+            return await coroutine(*args, **kwargs)
+    else:
+        @functools.wraps(coroutine)
+        async def call_with_prefetch(*args, **kwargs):
+            try:
+                return await coroutine(*args, **kwargs)
+            finally:
+                thread_id = _thread_id()
+                if thread_id is not None:
+                    discard(thread_id, INVALIDATES.get(tool.name))
+
+    return tool.model_copy(update={"coroutine": call_with_prefetch})
@@ -0,0 +1,308 @@
+import asyncio
+import dataclasses
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Any, Optional
+
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import tool
+from langgraph.types import Command
+
+# --- Large tool result offloading ---
+#
+# A full mutations page or address book sent back as a ToolMessage is resent to the LLM
+# on every later step of the thread. Results longer than TOOL_RESULT_OFFLOAD_CHARS are
+# stored in a local content-addressed blob store instead; the LLM gets an outline of the
+# result with a handle, and reads the slices it needs with the read_result tool.
+#
+# Stored results are customer data: they are kept per thread (a handle only resolves in
+# the thread that produced it), written readable by the server's user only, and deleted
+# after TOOL_RESULT_MAX_AGE. With several server workers, TOOL_RESULT_STORE must be storage
+# they share; a handle that cannot be found tells the agent to call the tool again.
+
+OFFLOAD_CHARS = int(os.getenv("TOOL_RESULT_OFFLOAD_CHARS", "8000"))
+STORE_PATH = os.getenv("TOOL_RESULT_STORE", "./.tool_results")
+# Stored results are deleted after this many seconds
+STORE_MAX_AGE = float(os.getenv("TOOL_RESULT_MAX_AGE", "3600"))
+# Longest answer read_result returns; larger selections are cut off
+READ_LIMIT = 6000
+OUTLINE_LINES = 40
+
+_HANDLE = re.compile(r"^result:([0-9a-f]{32})$")
+
+
+class BlobStore:
+    """Content-addressed files per scope (thread): storing the same result twice yields the same handle."""
+
+    def __init__(self, path: str = STORE_PATH, max_age: float = STORE_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._last_prune = 0.0
+
+    def _file(self, scope: str, digest: str) -> str:
+        scope_key = hashlib.sha256(scope.encode()).hexdigest()[:16]
+        return os.path.join(self.path, scope_key, f"{digest}.json")
+
+    def put(self, value: Any, scope: str) -> str:
+        data = json.dumps(value, sort_keys=True)
+        digest = hashlib.sha256(data.encode()).hexdigest()[:32]
+        file = self._file(scope, digest)
+        if os.path.exists(file):
+            # Refresh its age, it is in use again
+            os.utime(file)
+        else:
+            os.makedirs(os.path.dirname(file), mode=0o700, exist_ok=True)
+            tmp_file = f"{file}.{os.getpid()}.tmp"
+            # Only the server's user may read stored results
+            with os.fdopen(os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+                f.write(data)
+            os.replace(tmp_file, file)
+        self._prune()
+        return f"result:{digest}"
+
+    def get(self, handle: str, scope: str) -> Optional[Any]:
+        match = _HANDLE.match(handle.strip())
+        if match is None:
+            return None
+        try:
+            with open(self._file(scope, match.group(1)), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _prune(self) -> None:
+        now = time.time()
+        if now - self._last_prune < min(self.max_age, 3600):
+            return
+        self._last_prune = now
+        for directory, _, files in os.walk(self.path):
+            for name in files:
+                file = os.path.join(directory, name)
+                try:
+                    if now - os.path.getmtime(file) > self.max_age:
+                        os.remove(file)
+                except FileNotFoundError:
+                    pass
+
+
+store = BlobStore()
+
+
+def _scope(config: Optional[dict]) -> str:
+    """The store scope of a run: its thread, or a scope of its own when it has none."""
+    configurable = (config or {}).get("configurable", {})
+    thread_id = configurable.get("thread_id")
+    if thread_id is not None:
+        return f"thread:{thread_id}"
+    return f"run:{(config or {}).get('run_id') or 'none'}"
+
+
+def _texts(content) -> list[str]:
+    if isinstance(content, str):
+        return [content]
+    return [block if isinstance(block, str) else block.get("text", "") for block in content]
+
+
+def _parse(texts: list[str]) -> tuple[Any, list[str]]:
+    """Split a tool result into its JSON payload and the remaining (summary) texts."""
+    for index, text in enumerate(texts):
+        try:
+            value = json.loads(text)
+        except ValueError:
+            continue
+        if isinstance(value, (dict, list)):
+            return value, texts[:index] + texts[index + 1:]
+    return "\n".join(texts), []
+
+
+def _scalar(value: Any) -> str:
+    text = json.dumps(value)
+    return text if len(text) <= 40 else text[:37] + "..."
+
+
+def outline(value: Any, indent: str = "", lines: Optional[list[str]] = None) -> list[str]:
+    """Describe the shape of a JSON value: keys, list lengths and short scalars."""
+    lines = [] if lines is None else lines
+    if len(lines) >= OUTLINE_LINES:
+        return lines
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if len(lines) >= OUTLINE_LINES:
+                lines.append(f"{indent}...")
+                break
+            if isinstance(item, (dict, list)) and item:
+                lines.append(f"{indent}{key}: {_shape(item)}")
+                outline(item, indent + "  ", lines)
+            else:
+                lines.append(f"{indent}{key}: {_scalar(item)}")
+    elif isinstance(value, list) and value:
+        # Items of a list usually share one shape; show the first
+        if isinstance(value[0], (dict, list)):
+            lines.append(f"{indent}[0]: {_shape(value[0])}")
+            outline(value[0], indent + "  ", lines)
+        else:
+            lines.append(f"{indent}[0]: {_scalar(value[0])}")
+    return lines
+
+
+def _shape(value: Any) -> str:
+    if isinstance(value, dict):
+        return "object"
+    return f"list of {len(value)}"
+
+
+def preview(handle: str, value: Any, notes: list[str], size: int) -> str:
+    if isinstance(value, str):
+        body = value[:1500] + ("..." if len(value) > 1500 else "")
+    else:
+        body = "\n".join(outline(value))
+    parts = [f"The result is large ({size} characters) and was stored as {handle}."]
+    parts += [note for note in notes if len(note) < 500]
+    parts.append(f"Outline:\n{body}" if not isinstance(value, str) else f"Start:\n{body}")
+    parts.append(
+        "Use read_result with this handle and a query to read what you need: a path such as "
+        "'mutationsList.mutations[0:10]' or 'contractList[*].contract.accountNumber', "
+        "or words to search for, such as 'Albert Heijn'."
+    )
+    return "\n\n".join(parts)
+
+
+_PATH_TOKEN = re.compile(r"\.?([A-Za-z_][\w\-]*)|\[(\*|-?\d+|-?\d*:-?\d*)\]")
+
+
+def _path(query: str) -> Optional[list[str]]:
+    """Split a path query into its parts, or return None when the query is not a path."""
+    query = query.strip().removeprefix("$")
+    tokens, position = [], 0
+    while position < len(query):
+        match = _PATH_TOKEN.match(query, position)
+        if match is None or match.end() == position:
+            return None
+        tokens.append(match.group(1) if match.group(1) is not None else f"[{match.group(2)}]")
+        position = match.end()
+    return tokens
+
+
+def select(value: Any, tokens: list[str]) -> Any:
+    if not tokens:
+        return value
+    token, rest = tokens[0], tokens[1:]
+    if token == "[*]":
+        if not isinstance(value, list):
+            raise KeyError("[*] applies to lists only")
+        return [select(item, rest) for item in value]
+    if token.startswith("["):
+        if not isinstance(value, list):
+            raise KeyError(f"{token} applies to lists only")
+        index = token[1:-1]
+        if ":" in index:
+            start, _, stop = index.partition(":")
+            return select(value[int(start) if start else None:int(stop) if stop else None], ["[*]"] + rest)
+        return select(value[int(index)], rest)
+    if not isinstance(value, dict) or token not in value:
+        keys = ", ".join(value) if isinstance(value, dict) else type(value).__name__
+        raise KeyError(f"'{token}' not found (available: {keys})")
+    return select(value[token], rest)
+
+
+def _contains(value: Any, words: list[str]) -> bool:
+    text = (value if isinstance(value, str) else json.dumps(value)).lower()
+    return all(word in text for word in words)
+
+
+def search(value: Any, words: list[str], path: str = "", found: Optional[list] = None, scalars: bool = True) -> list:
+    """The innermost list items (or plain values) that contain all words, with their paths."""
+    found = [] if found is None else found
+    if len(found) >= 20:
+        return found
+    if isinstance(value, dict):
+        for key, item in value.items():
+            search(item, words, f"{path}.{key}" if path else key, found, scalars)
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            if len(found) >= 20:
+                break
+            if not _contains(item, words):
+                continue
+            item_path = f"{path}[{index}]"
+            before = len(found)
+            # A matching list item is returned whole, unless a list inside it narrows the match
+            search(item, words, item_path, found, scalars=False)
+            if len(found) == before:
+                found.append({"path": item_path, "value": item})
+    elif scalars and path and _contains(value, words):
+        found.append({"path": path, "value": value})
+    return found
+
+
+def _limit(text: str) -> str:
+    if len(text) <= READ_LIMIT:
+        return text
+    return text[:READ_LIMIT] + f"\n... (cut off at {READ_LIMIT} of {len(text)} characters; narrow the query)"
+
+
+@tool
+async def read_result(handle: str, query: str = "", config: RunnableConfig = None) -> str:
+    """Read part of a large tool result that was stored with a handle (result:...).
+
+    query is either a path into the JSON, e.g. 'mutationsList.mutations[0:10]',
+    'contractList[*].contract.accountNumber' or 'entries[3]', or words to search for,
+    e.g. 'Albert Heijn'. An empty query returns the outline of the result.
+    """
+    value = await asyncio.to_thread(store.get, handle, _scope(config))
+    if value is None:
+        return f"No stored result {handle!r}; it may have expired. Call the original tool again."
+    if not query.strip():
+        return _limit(value if isinstance(value, str) else "\n".join(outline(value)))
+    if isinstance(value, str):
+        lines = [line for line in value.splitlines() if query.lower() in line.lower()]
+        return _limit("\n".join(lines) or f"No lines contain {query!r}")
+    tokens = _path(query)
+    if tokens is not None:
+        try:
+            return _limit(json.dumps(select(value, tokens)))
+        except (KeyError, IndexError, ValueError) as e:
+            # Not a path into this result after all; search for the words instead
+            if "." in query or "[" in query:
+                return f"Path {query!r} did not match: {e}"
+    matches = search(value, query.lower().split())
+    return _limit(json.dumps(matches) if matches else f"Nothing in {handle} matches {query!r}")
+
+
+async def _offload(result: ToolMessage, scope: str) -> ToolMessage:
+    if result.status == "error":
+        return result
+    texts = _texts(result.content)
+    size = sum(len(text) for text in texts)
+    if size <= OFFLOAD_CHARS:
+        return result
+    value, notes = _parse(texts)
+    handle = await asyncio.to_thread(store.put, value, scope)
+    return result.model_copy(update={"content": preview(handle, value, notes, size)})
+
+
+async def offload_large_results(request, execute):
+    """Tool node interceptor: swaps large results for a preview with a read_result handle.
+
+    Put it outside the blackboard and cache interceptors, so they keep the full result.
+    Only results that go back to the LLM pass through here; nodes that call tools
+    directly (like the spend query shortcut) still get the full result.
+    """
+    result = await execute(request)
+    if OFFLOAD_CHARS <= 0:
+        return result
+    scope = _scope(request.runtime.config if request.runtime is not None else None)
+    if isinstance(result, ToolMessage):
+        return await _offload(result, scope)
+    if isinstance(result, Command) and isinstance(result.update, dict) and result.update.get("messages"):
+        # e.g. a result share_on_blackboard published: the blackboard keeps the full result
+        messages = [
+            await _offload(message, scope) if isinstance(message, ToolMessage) else message
+            for message in result.update["messages"]
+        ]
+        return dataclasses.replace(result, update={**result.update, "messages": messages})
+    return result
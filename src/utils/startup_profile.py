@@ -0,0 +1,165 @@
+"""Cold start profiler for the graphs registered in langgraph.json.
+
+Every graph is loaded in a fresh interpreter, the way the LangGraph server loads it,
+and the profiler reports how long the graph module took to import, how long its
+factory took to build the graph, and which top-level packages the import spent
+its time in. Graphs over the budget are flagged and make the command exit with 1.
+
+    python -m src.utils.startup_profile                      # every graph
+    python -m src.utils.startup_profile conversational --top 15
+    STARTUP_BUDGET=3 python -m src.utils.startup_profile
+
+Run it from the repository root. Graph factories that list MCP tools need the MCP
+servers (or the tool manifest written by src/utils/mcp_tools.py).
+"""
+
+import argparse
+import asyncio
+import importlib
+import inspect
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+# Seconds a single graph may take to import and build
+DEFAULT_BUDGET = float(os.getenv("STARTUP_BUDGET", "5"))
+
+_IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+# Written to stderr by the child right before it imports the graph, so interpreter
+# and profiler imports that precede it are left out of the package breakdown
+_BEGIN_MARKER = "startup-profile: begin"
+
+
+def _graph_specs(config_path: str = "langgraph.json") -> dict[str, str]:
+    with open(config_path, "r") as f:
+        return json.load(f)["graphs"]
+
+
+def _module_name(spec: str) -> tuple[str, str]:
+    """Turn './src/agents/x/graph.py:graph' into ('src.agents.x.graph', 'graph')."""
+    path, attribute = spec.rsplit(":", 1)
+    module = os.path.normpath(path).removesuffix(".py").replace(os.sep, ".")
+    return module, attribute
+
+
+async def _build(factory):
+    graph = factory()
+    if inspect.isawaitable(graph):
+        graph = await graph
+    return graph
+
+
+def _profile_in_process(spec: str) -> dict:
+    """Import and build one graph in this interpreter. Used by the child processes."""
+    module_name, attribute = _module_name(spec)
+    result = {"import_s": None, "init_s": None, "error": None}
+
+    print(_BEGIN_MARKER, file=sys.stderr, flush=True)  # noqa: T201
+    started = time.perf_counter()
+    try:
+        module = importlib.import_module(module_name)
+    except Exception as e:
+        result["error"] = f"import failed: {e!r}"
+        return result
+    result["import_s"] = time.perf_counter() - started
+
+    target = getattr(module, attribute)
+    # Compiled graphs are built while the module is imported; only factories have an init phase
+    if not callable(target) or hasattr(target, "invoke"):
+        result["init_s"] = 0.0
+        return result
+    started = time.perf_counter()
+    try:
+        asyncio.run(_build(target))
+    except Exception as e:
+        result["error"] = f"graph factory failed: {e!r}"
+        return result
+    result["init_s"] = time.perf_counter() - started
+    return result
+
+
+def _top_packages(importtime_log: str, top: int) -> list[tuple[str, float]]:
+    """Sum the cumulative import time of the outermost imports per top-level package."""
+    entries = []
+    _, _, importtime_log = importtime_log.partition(_BEGIN_MARKER)
+    for line in importtime_log.splitlines():
+        match = _IMPORT_TIME_LINE.match(line)
+        if match:
+            _, cumulative, indent, name = match.groups()
+            entries.append((len(indent), name, int(cumulative)))
+    if not entries:
+        return []
+    outermost = min(indent for indent, _, _ in entries)
+    per_package: dict[str, float] = defaultdict(float)
+    for indent, name, cumulative in entries:
+        if indent == outermost:
+            per_package[name.split(".")[0]] += cumulative / 1_000_000
+    return sorted(per_package.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def profile_graph(spec: str, top: int = 10) -> dict:
+    """Profile one graph in a fresh interpreter and return its timings."""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", __spec__.name, "--child", spec],
+        capture_output=True,
+        text=True,
+    )
+    stdout_lines = process.stdout.strip().splitlines()
+    try:
+        result = json.loads(stdout_lines[-1])
+    except (IndexError, ValueError):
+        result = {"import_s": None, "init_s": None, "error": f"profiler exited with {process.returncode}"}
+    result["packages"] = _top_packages(process.stderr, top)
+    return result
+
+
+def _seconds(value) -> str:
+    return "-" if value is None else f"{value:.2f}s"
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Report cold start import and build times per graph.")
+    parser.add_argument("graphs", nargs="*", help="graph ids from langgraph.json (default: all)")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET, help="seconds allowed per graph")
+    parser.add_argument("--top", type=int, default=10, help="packages to list per graph")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(_profile_in_process(args.child)))  # noqa: T201
+        return 0
+
+    specs = _graph_specs()
+    unknown = set(args.graphs) - set(specs)
+    if unknown:
+        parser.error(f"unknown graphs: {', '.join(sorted(unknown))}")
+
+    over_budget, failed = [], []
+    for graph_id in args.graphs or specs:
+        result = profile_graph(specs[graph_id], args.top)
+        total = (result["import_s"] or 0) + (result["init_s"] or 0)
+        print(  # noqa: T201
+            f"{graph_id}: import {_seconds(result['import_s'])}, "
+            f"init {_seconds(result['init_s'])}, total {total:.2f}s"
+        )
+        if result["error"]:
+            print(f"  error: {result['error']}")  # noqa: T201
+            failed.append(graph_id)
+        for package, seconds in result["packages"]:
+            print(f"  {seconds:7.3f}s  {package}")  # noqa: T201
+        if total > args.budget:
+            over_budget.append(graph_id)
+
+    if failed:
+        print(f"Failed to import or build: {', '.join(failed)}")  # noqa: T201
+    if over_budget:
+        print(f"Over the {args.budget:.2f}s startup budget: {', '.join(over_budget)}")  # noqa: T201
+    return 1 if failed or over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from langchain_core.messages import ToolMessage
+
+from src.utils.blackboard import failed
+from src.utils.prefetch import INVALIDATES, READ_ONLY_TOOLS, normalized_args
+
+# --- Per-thread tool call deduplication ---
+#
+# Agents of one thread (and the sub-agents of the supervisor, which share its thread)
+# often repeat a read-only call, e.g. get_payments_contracts_list on consecutive turns or
+# after a handoff. Results of READ_ONLY_TOOLS are kept per thread for TOOL_CACHE_TTL
+# seconds and repeats are answered from here instead of going through MCP and upstream.
+# Calls known to change data (INVALIDATES) drop the thread's cached results they make stale.
+
+TOOL_CACHE_TTL = float(os.getenv("TOOL_CACHE_TTL", "60"))
+MAX_CACHED = 1024
+
+# (thread_id, cookie hash, tool name, arguments) -> (expires at, result); results in flight are tasks
+_cache: "OrderedDict[tuple, tuple[float, asyncio.Future]]" = OrderedDict()
+
+
+def _thread(request) -> Optional[tuple[str, str]]:
+    configurable = (request.runtime.config if request.runtime is not None else {}).get("configurable", {})
+    thread_id = configurable.get("thread_id")
+    if thread_id is None:
+        return None
+    # A run may act for another customer (see run_cookie in mcp_tools.py)
+    cookie = hashlib.sha256((configurable.get("cookie") or "").encode()).hexdigest()[:16]
+    return thread_id, cookie
+
+
+def _expire(now: float) -> None:
+    for key in [key for key, (expires, _) in _cache.items() if expires <= now]:
+        del _cache[key]
+    while len(_cache) > MAX_CACHED:
+        _cache.popitem(last=False)
+
+
+def invalidate(thread_id: str, tool_names: Optional[set[str]] = None) -> None:
+    """Drop a thread's cached results, optionally only those of the given tools."""
+    for key in [key for key in _cache if key[0] == thread_id and (tool_names is None or key[2] in tool_names)]:
+        del _cache[key]
+
+
+async def memoize_read_only(request, execute):
+    """Tool node interceptor answering repeated read-only calls of a thread from a short-lived cache.
+
+    Identical calls made at the same time share one execution. Failed calls, including
+    results whose JSON carries an error, are not cached.
+    """
+    name = request.tool_call["name"]
+    thread = _thread(request)
+    if thread is None or TOOL_CACHE_TTL <= 0:
+        return await execute(request)
+    if name not in READ_ONLY_TOOLS:
+        try:
+            return await execute(request)
+        finally:
+            # Local tools (read_result, conversions) change nothing upstream
+            if name in INVALIDATES:
+                invalidate(thread[0], INVALIDATES[name])
+
+    args = normalized_args(request.tool, request.tool_call["args"]) if request.tool else request.tool_call["args"]
+    key = (*thread, name, json.dumps(args, sort_keys=True, default=str))
+    now = time.monotonic()
+    _expire(now)
+    entry = _cache.get(key)
+    if entry is None:
+        task = asyncio.ensure_future(execute(request))
+        _cache[key] = (now + TOOL_CACHE_TTL, task)
+    else:
+        task = entry[1]
+        _cache.move_to_end(key)
+    try:
+        result = await asyncio.shield(task)
+    except BaseException:
+        if _cache.get(key, (None, None))[1] is task and task.done():
+            del _cache[key]
+        raise
+    if failed(result):
+        if _cache.get(key, (None, None))[1] is task:
+            del _cache[key]
+    if not isinstance(result, ToolMessage) or result.tool_call_id == request.tool_call["id"]:
+        return result
+    # A repeat: the same result, answering this call
+    return result.model_copy(update={"tool_call_id": request.tool_call["id"], "id": None})
@@ -0,0 +1,24 @@
+import functools
+from typing import Awaitable, Callable, Sequence
+
+from langchain_core.tools import BaseTool
+from langgraph.prebuilt import ToolNode
+
+# A ToolNode interceptor: async (request, execute) -> ToolMessage | Command
+ToolCallWrapper = Callable[..., Awaitable]
+
+
+def _chain(outer: ToolCallWrapper, inner: ToolCallWrapper) -> ToolCallWrapper:
+    async def wrapped(request, execute):
+        return await outer(request, lambda request: inner(request, execute))
+
+    return wrapped
+
+
+def tool_node(tools: Sequence[BaseTool], wrappers: Sequence[ToolCallWrapper] = ()) -> ToolNode:
+    """ToolNode whose calls pass through the wrappers, the first one outermost.
+
+    Wrappers see every tool call the agent makes (and its result), but not tools that a
+    graph node invokes directly.
+    """
+    return ToolNode(tools, awrap_tool_call=functools.reduce(_chain, wrappers) if wrappers else None)
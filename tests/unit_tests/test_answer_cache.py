@@ -0,0 +1,58 @@
+import time
+
+import pytest
+
+from src.agents.knowledge.answer_cache import AnswerCache, cacheable, question_words, terms
+
+HOW_TO_BLOCK = "Open the app, go to Cards and tap Block card."
+
+
+@pytest.fixture
+def cache():
+    answers = AnswerCache(ttl=60, similarity=0.85, size=10)
+    answers.store("How do I block my card?", HOW_TO_BLOCK)
+    return answers
+
+
+@pytest.mark.parametrize("question", ["How do I block my card", "how can I block my card please"])
+def test_serves_paraphrases(cache, question):
+    assert cache.lookup(question) == HOW_TO_BLOCK
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "Why is my card blocked?",
+        "My card is blocked",
+        "Who blocked my card?",
+        "How do I unblock my card?",
+        "How do I block my credit card?",
+    ],
+)
+def test_near_misses_go_to_copilot_studio(cache, question):
+    assert cache.lookup(question) is None
+
+
+def test_keeps_question_words_apart():
+    assert question_words("Why is my card blocked?") == {"why"}
+    assert question_words("My card is blocked") == frozenset()
+    assert terms("Why is my card blocked?") == ["card", "blocked"]
+    assert terms("How do I block my card?") == ["block", "card"]
+
+
+def test_never_caches_personal_questions(cache):
+    assert not cacheable("How do I block card 1234?")
+    cache.store("What is the balance of NL91ABNA0417164300?", "EUR 10")
+    assert cache.lookup("What is the balance of NL91ABNA0417164300?") is None
+
+
+def test_expires_and_evicts(monkeypatch):
+    answers = AnswerCache(ttl=60, similarity=0.85, size=2)
+    answers.store("How do I block my card?", HOW_TO_BLOCK)
+    answers.store("How do I order a new card?", "Order one under Cards.")
+    answers.store("How do I change my address?", "Go to Profile.")
+    assert answers.lookup("How do I block my card?") is None
+    assert answers.lookup("How do I change my address?") == "Go to Profile."
+    later = time.time() + 61
+    monkeypatch.setattr(time, "time", lambda: later)
+    assert answers.lookup("How do I change my address?") is None
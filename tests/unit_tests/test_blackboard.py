@@ -0,0 +1,68 @@
+import asyncio
+import json
+import types
+
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import tool
+from langgraph.types import Command
+
+from src.utils import blackboard
+from src.utils.bootstrap import bootstrap_node
+
+BALANCES = {"contractList": [{"contract": {"accountNumber": "NL01ABNA0000000001"}}]}
+FAILURE = {"error": "401 Client Error: Unauthorized"}
+
+
+def _balance_tool(results: list):
+    @tool
+    async def get_account_balance_list() -> str:
+        """Lists the customer's accounts."""
+        return json.dumps(results.pop(0))
+
+    return get_account_balance_list
+
+
+def _call(balance_tool, state: dict, call_id: str):
+    request = types.SimpleNamespace(
+        tool_call={"name": balance_tool.name, "args": {}, "id": call_id}, tool=balance_tool, state=state
+    )
+
+    async def execute(request):
+        content = await balance_tool.ainvoke({})
+        return ToolMessage(content, name=balance_tool.name, tool_call_id=request.tool_call["id"])
+
+    return asyncio.run(blackboard.share_on_blackboard(request, execute))
+
+
+def test_publishes_results():
+    result = _call(_balance_tool([BALANCES]), {"messages": []}, "1")
+    assert isinstance(result, Command)
+    assert result.update["blackboard"]["balances"]["value"] == BALANCES
+
+
+def test_does_not_publish_error_payloads():
+    results = [FAILURE, BALANCES]
+    balance_tool = _balance_tool(results)
+    state = {"messages": []}
+    first = _call(balance_tool, state, "1")
+    assert isinstance(first, ToolMessage) and json.loads(first.content) == FAILURE
+    # Nothing was published, so the next call goes to the tool again
+    second = _call(balance_tool, state, "2")
+    assert isinstance(second, Command)
+    assert not results
+
+
+def test_entry_rejects_error_payloads():
+    assert blackboard.entry("get_account_balance_list", {}, json.dumps(FAILURE)) is None
+    assert blackboard.entry("get_account_balance_list", {}, json.dumps(BALANCES)) is not None
+
+
+def test_failed():
+    assert blackboard.failed(ToolMessage(json.dumps(FAILURE), tool_call_id="1"))
+    assert blackboard.failed(ToolMessage("boom", tool_call_id="1", status="error"))
+    assert not blackboard.failed(ToolMessage(json.dumps(BALANCES), tool_call_id="1"))
+
+
+def test_bootstrap_does_not_publish_failures():
+    update = asyncio.run(bootstrap_node([_balance_tool([FAILURE])])({"messages": []}))
+    assert update["blackboard"] == {}
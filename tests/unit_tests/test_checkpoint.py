@@ -0,0 +1,141 @@
+import asyncio
+import operator
+from typing import Annotated, TypedDict
+
+import pytest
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import START, StateGraph
+
+from src.utils import checkpoint
+from src.utils.checkpoint import (
+    DELTA_KEY,
+    CompressingSerializer,
+    DeltaCheckpointSaver,
+    get_checkpointer,
+    served_checkpointer,
+)
+
+
+class State(TypedDict):
+    items: Annotated[list, operator.add]
+    label: str
+
+
+def _graph(checkpointer):
+    builder = StateGraph(State)
+    builder.add_node("step", lambda state: {"items": [f"item {len(state['items'])}"], "label": "x"})
+    builder.add_edge(START, "step")
+    return builder.compile(checkpointer=checkpointer)
+
+
+def _run(graph, thread_id: str, turns: int) -> dict:
+    config = {"configurable": {"thread_id": thread_id}}
+    for _ in range(turns):
+        graph.invoke({"items": [], "label": "x"}, config)
+    return config
+
+
+def _stored(saver: DeltaCheckpointSaver, config: dict) -> list:
+    """The raw items values the wrapped saver holds for a thread, newest first."""
+    return [saved.checkpoint["channel_values"].get("items") for saved in saver.inner.list(config)]
+
+
+@pytest.fixture
+def saver():
+    return DeltaCheckpointSaver(InMemorySaver(serde=CompressingSerializer()), compact_every=5)
+
+
+def test_stores_appends_as_deltas(saver):
+    config = _run(_graph(saver), "thread", 20)
+    stored = [value for value in _stored(saver, config) if value is not None]
+    deltas = [value for value in stored if isinstance(value, dict) and value.get(DELTA_KEY)]
+    assert deltas
+    assert all(len(delta["append"]) <= 2 for delta in deltas)
+
+
+def test_round_trips_state_and_history(saver):
+    graph = _graph(saver)
+    config = _run(graph, "thread", 20)
+    expected = [f"item {i}" for i in range(20)]
+    assert graph.get_state(config).values["items"] == expected
+    plain = _graph(InMemorySaver())
+    reference = _run(plain, "thread", 20)
+    assert [state.values for state in graph.get_state_history(config)] == [
+        state.values for state in plain.get_state_history(reference)
+    ]
+
+
+def test_decodes_without_the_resolved_cache(saver):
+    config = _run(_graph(saver), "thread", 20)
+    # Another process reading the same storage has nothing cached
+    fresh = DeltaCheckpointSaver(saver.inner, compact_every=5)
+    assert fresh.get_tuple(config).checkpoint["channel_values"]["items"] == [f"item {i}" for i in range(20)]
+    for saved, original in zip(fresh.list(config), saver.list(config)):
+        assert saved.checkpoint["channel_values"] == original.checkpoint["channel_values"]
+
+
+def test_compacts_delta_chains(saver):
+    config = _run(_graph(saver), "thread", 30)
+    stored = _stored(saver, config)
+    deltas = [value for value in stored if isinstance(value, dict) and value.get(DELTA_KEY)]
+    assert max(delta["depth"] for delta in deltas) < saver.compact_every
+    assert any(isinstance(value, list) and len(value) > 8 for value in stored)
+
+
+def test_keeps_threads_apart(saver):
+    graph = _graph(saver)
+    first = _run(graph, "first", 12)
+    second = _run(graph, "second", 9)
+    assert len(graph.get_state(first).values["items"]) == 12
+    assert len(graph.get_state(second).values["items"]) == 9
+
+
+def test_async_round_trip(saver):
+    async def run():
+        graph = _graph(saver)
+        config = {"configurable": {"thread_id": "async"}}
+        for _ in range(12):
+            await graph.ainvoke({"items": [], "label": "x"}, config)
+        return (await graph.aget_state(config)).values["items"]
+
+    assert asyncio.run(run()) == [f"item {i}" for i in range(12)]
+
+
+@pytest.mark.parametrize("value", ["short", "x" * 10_000, {"content": ["a" * 100] * 100}])
+def test_serializer_round_trips(value):
+    serde = CompressingSerializer(threshold=4096)
+    type_, data = serde.dumps_typed(value)
+    assert type_.endswith("+zlib") == (len(serde.inner.dumps_typed(value)[1]) >= 4096)
+    assert serde.loads_typed((type_, data)) == value
+
+
+def test_serializer_compresses_large_values():
+    serde = CompressingSerializer(threshold=4096)
+    value = {"mutations": [{"amount": i, "description": "CARD PAYMENT ALBERT HEIJN"} for i in range(500)]}
+    _, plain = serde.inner.dumps_typed(value)
+    _, compressed = serde.dumps_typed(value)
+    assert len(compressed) < len(plain) / 4
+
+
+def test_get_checkpointer():
+    assert get_checkpointer("") is None
+    assert isinstance(get_checkpointer("memory"), DeltaCheckpointSaver)
+    with pytest.raises(ValueError):
+        get_checkpointer("postgres")
+
+
+def test_served_checkpointer_persists_threads(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoint, "CHECKPOINTER", "")
+    monkeypatch.setattr(checkpoint, "CHECKPOINT_PATH", str(tmp_path / "checkpoints.sqlite3"))
+
+    async def run(turns: int) -> list:
+        # Each block is one server lifetime
+        async with served_checkpointer() as checkpointer:
+            graph = _graph(checkpointer)
+            config = {"configurable": {"thread_id": "served"}}
+            for _ in range(turns):
+                await graph.ainvoke({"items": [], "label": "x"}, config)
+            return (await graph.aget_state(config)).values["items"]
+
+    assert asyncio.run(run(10)) == [f"item {i}" for i in range(10)]
+    assert asyncio.run(run(1)) == [f"item {i}" for i in range(11)]
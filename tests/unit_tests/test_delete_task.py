@@ -0,0 +1,47 @@
+import asyncio
+import types
+
+import pytest
+
+import tasks
+
+CTX = types.SimpleNamespace(request_context=None)
+
+
+@pytest.fixture
+def invalidated(monkeypatch):
+    cookies = []
+    monkeypatch.setattr(tasks.tasks_feed, "invalidate", cookies.append)
+    return cookies
+
+
+def _delete(monkeypatch, status_code, body, task_ids=("a", "b", "c")):
+    monkeypatch.setattr(tasks, "_delete_tasks", lambda cookie, chunk, source_system: (status_code, body))
+    return asyncio.run(tasks.delete_task(CTX, list(task_ids)))
+
+
+def test_reads_per_task_results(monkeypatch, invalidated):
+    body = {
+        "results": [
+            {"taskId": "a", "status": "DELETED"},
+            {"taskId": "b", "status": "NOT_FOUND"},
+            {"taskId": "x", "status": "NOT_FOUND"},
+        ]
+    }
+    result = _delete(monkeypatch, 200, body)
+    assert [r["success"] for r in result["results"]] == [True, False, None]
+    assert (result["succeeded"], result["failed"], result["unknown"]) == (1, 1, 1)
+    assert result["results"][1]["error"] == {"taskId": "b", "status": "NOT_FOUND"}
+    assert invalidated
+
+
+def test_unrecognized_body_is_not_success(monkeypatch, invalidated):
+    result = _delete(monkeypatch, 200, {"failedTaskIds": ["b"]})
+    assert all(r["success"] is None for r in result["results"])
+    assert (result["succeeded"], result["failed"], result["unknown"]) == (0, 0, 3)
+
+
+def test_failed_request_fails_every_task(monkeypatch, invalidated):
+    result = _delete(monkeypatch, 500, {"error": "boom"})
+    assert (result["succeeded"], result["failed"], result["unknown"]) == (0, 3, 0)
+    assert not invalidated
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import time
+
+import httpx
+import openai
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.utils import llm_pool
+from src.utils.llm_pool import PoolExhaustedError, PooledChatModel, TokenBucket, deployment_pool
+
+MESSAGES = [HumanMessage("What is my balance?")]
+
+
+class FakeClient:
+    """Stands in for a deployment's chat model: raises the scripted errors, then answers with its name."""
+
+    def __init__(self, name: str, errors: list):
+        self.name = name
+        self.errors = errors
+
+    def invoke(self, messages, **kwargs):
+        if self.errors:
+            raise self.errors.pop(0)
+        return AIMessage(self.name)
+
+    async def ainvoke(self, messages, **kwargs):
+        return self.invoke(messages, **kwargs)
+
+
+def _error(cls, status_code: int, headers: dict = None) -> openai.APIStatusError:
+    response = httpx.Response(status_code, headers=headers, request=httpx.Request("POST", "http://deployment"))
+    return cls("failed", response=response, body=None)
+
+
+@pytest.fixture
+def deployments(monkeypatch):
+    """Configures gpt-4.1 deployments and returns the script of errors each one raises, in order."""
+    scripts: dict[str, list] = {}
+
+    def configure(**specs):
+        monkeypatch.setattr(llm_pool, "LLM_DEPLOYMENTS", json.dumps({
+            "gpt-4.1": [{"name": name, "base_url": "http://deployment", **spec} for name, spec in specs.items()]
+        }))
+        llm_pool._deployment_specs.cache_clear()
+        llm_pool.deployment_pool.cache_clear()
+        for name in specs:
+            scripts[name] = []
+        return scripts
+
+    monkeypatch.setattr(llm_pool.Deployment, "client", lambda self, settings: FakeClient(self.name, scripts[self.name]))
+    yield configure
+    llm_pool._deployment_specs.cache_clear()
+    llm_pool.deployment_pool.cache_clear()
+
+
+def test_fails_over_on_429_and_rests_the_deployment(deployments):
+    scripts = deployments(first={}, second={})
+    scripts["first"].append(_error(openai.RateLimitError, 429, {"retry-after": "20"}))
+    model = PooledChatModel(model_name="gpt-4.1")
+    assert model.invoke(MESSAGES).content == "second"
+    report = {entry["name"]: entry for entry in deployment_pool("gpt-4.1").report()}
+    assert report["first"]["failures"] == 1
+    assert 19 < report["first"]["cooldown_s"] <= 20
+    assert report["second"]["cooldown_s"] == 0
+    # The resting deployment is skipped until its cooldown ends
+    assert [PooledChatModel(model_name="gpt-4.1").invoke(MESSAGES).content for _ in range(3)] == ["second"] * 3
+
+
+def test_fails_over_on_5xx_async(deployments):
+    scripts = deployments(first={}, second={})
+    scripts["first"].append(_error(openai.InternalServerError, 503))
+    assert asyncio.run(PooledChatModel(model_name="gpt-4.1").ainvoke(MESSAGES)).content == "second"
+    assert {entry["name"]: entry["cooldown_s"] > 0 for entry in deployment_pool("gpt-4.1").report()} == {
+        "first": True, "second": False
+    }
+
+
+def test_client_errors_do_not_fail_over(deployments):
+    scripts = deployments(first={}, second={})
+    scripts["first"].append(_error(openai.BadRequestError, 400))
+    with pytest.raises(openai.BadRequestError):
+        PooledChatModel(model_name="gpt-4.1").invoke(MESSAGES)
+    assert all(entry["cooldown_s"] == 0 for entry in deployment_pool("gpt-4.1").report())
+
+
+def test_gives_up_when_every_deployment_rests(deployments, monkeypatch):
+    monkeypatch.setattr(llm_pool, "POOL_MAX_WAIT", 0.1)
+    scripts = deployments(first={}, second={})
+    scripts["first"].append(_error(openai.RateLimitError, 429))
+    scripts["second"].append(_error(openai.RateLimitError, 429))
+    with pytest.raises(PoolExhaustedError):
+        PooledChatModel(model_name="gpt-4.1").invoke(MESSAGES)
+
+
+def test_paces_calls_to_the_request_rate(deployments):
+    # 600 requests per minute: a new call every 0.1s once the burst is spent
+    deployments(only={"rpm": 600})
+    pool = deployment_pool("gpt-4.1")
+    pool.deployments[0]._requests.level = 1
+    model = PooledChatModel(model_name="gpt-4.1")
+    started = time.monotonic()
+    for _ in range(3):
+        model.invoke(MESSAGES)
+    assert time.monotonic() - started >= 0.18
+
+
+def test_token_bucket():
+    bucket = TokenBucket(6000)
+    assert bucket.wait(6000, bucket._updated) == 0
+    bucket.take(6000, bucket._updated)
+    # Refills at 100 tokens a second
+    assert bucket.wait(500, bucket._updated) == pytest.approx(5)
+    # A call larger than the bucket waits for a full bucket rather than forever
+    assert bucket.wait(10_000, bucket._updated) == pytest.approx(60)
+    assert bucket.wait(500, bucket._updated + 5) == 0
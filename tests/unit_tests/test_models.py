@@ -0,0 +1,45 @@
+import json
+
+import pytest
+
+from src.utils import llm_pool, models
+from src.utils.llm_pool import PooledChatModel
+from src.utils.models import RoutedChatModel, get_model, get_node_model
+
+DEPLOYMENTS = {
+    "gpt-4.1-mini": [{"name": "mini", "base_url": "http://localhost:1/v1", "api_key": "x"}],
+    "gpt-4.1": [{"name": "large", "base_url": "http://localhost:1/v1", "api_key": "x"}],
+}
+
+
+@pytest.fixture(autouse=True)
+def policies(monkeypatch):
+    monkeypatch.setattr(llm_pool, "LLM_DEPLOYMENTS", json.dumps(DEPLOYMENTS))
+    monkeypatch.setattr(models, "MODEL_POLICIES", json.dumps({
+        "PaymentsAgent": {"model": "gpt-4.1-mini", "model_kwargs": {"user": "payments"}, "stop": ["###"]},
+        "OperationsAgent": {"model": "gpt-4.1-mini", "escalate_to": "gpt-4.1", "model_kwargs": {"user": "ops"}},
+    }))
+    _clear_caches()
+    yield
+    _clear_caches()
+
+
+def _clear_caches():
+    for cached in (llm_pool._deployment_specs, llm_pool.deployment_pool, models.model_policies, models._shared_model):
+        cached.cache_clear()
+
+
+def test_policy_kwargs_may_be_dicts_and_lists():
+    model = get_node_model("PaymentsAgent", "gpt-4.1", verbose=True)
+    assert isinstance(model, PooledChatModel)
+    assert model.settings == {"model_kwargs": {"user": "payments"}, "stop": ["###"], "verbose": True}
+    routed = get_node_model("OperationsAgent", "gpt-4.1")
+    assert isinstance(routed, RoutedChatModel)
+    assert routed.primary.settings == {"model_kwargs": {"user": "ops"}}
+
+
+def test_models_are_shared_per_settings():
+    assert get_model("gpt-4.1", model_kwargs={"a": 1}, temperature=0) is get_model(
+        "gpt-4.1", temperature=0, model_kwargs={"a": 1}
+    )
+    assert get_model("gpt-4.1", model_kwargs={"a": 1}) is not get_model("gpt-4.1", model_kwargs={"a": 2})
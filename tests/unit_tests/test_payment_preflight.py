@@ -0,0 +1,109 @@
+import asyncio
+import types
+
+import pytest
+
+import address_book
+
+ORDERING = "NL01ABNA0000000001"
+COUNTERPARTY = "NL91ABNA0417164300"
+
+BALANCES = {
+    "contractList": [
+        {
+            "contract": {
+                "accountNumber": ORDERING,
+                "contractNumber": "123",
+                "product": {"name": "Personal Account"},
+                "customer": {"bcNumber": 2021592065},
+                "balance": {"spendingBalance": 500.0, "currencyCode": "EUR"},
+                "isBlocked": False,
+            }
+        }
+    ]
+}
+SEPA_ALLOWED = {"paymentInstructionTypeOptions": [{"paymentInstructionType": "SEPA_CREDIT_TRANSFER"}]}
+ADDRESS_BOOK = {"paymentModels": [{"name": "Jan Jansen", "accountNumber": COUNTERPARTY}]}
+
+
+def _fake(result):
+    async def call(ctx, **kwargs):
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    return call
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Replaces every upstream call of payment_preflight; tests override single answers."""
+    answers = {
+        "fetch_account_number_formats": {"formats": []},
+        "fetch_payment_instruction_type_options": SEPA_ALLOWED,
+        "fetch_account_holder_validation": {"matchResult": "MATCH"},
+        "fetch_address_book": ADDRESS_BOOK,
+    }
+    monkeypatch.setattr(address_book, "_fetch_account_balances", lambda cookie: BALANCES)
+    calls = []
+
+    def set_answers(**overrides):
+        for name, result in {**answers, **overrides}.items():
+            fake = _fake(result)
+
+            async def recorded(ctx, _fake=fake, _name=name, **kwargs):
+                calls.append((_name, kwargs))
+                return await _fake(ctx, **kwargs)
+
+            monkeypatch.setattr(address_book, name, recorded)
+        return calls
+
+    return set_answers
+
+
+def _preflight(**kwargs):
+    arguments = {"ordering_account_number": ORDERING, "amount": 100.0, "counterparty_name": "Jan Jansen"}
+    return asyncio.run(address_book.payment_preflight(types.SimpleNamespace(), **{**arguments, **kwargs}))
+
+
+def test_ready_when_every_check_passes(upstream):
+    upstream()
+    result = _preflight(counterparty_iban=COUNTERPARTY)
+    assert result.ready, result.issues
+    assert result.sufficientFunds
+
+
+def test_name_mismatch_blocks_the_payment(upstream):
+    upstream(fetch_account_holder_validation={"matchResult": "NO_MATCH", "suggestedName": "J. de Vries"})
+    result = _preflight(counterparty_iban=COUNTERPARTY)
+    assert not result.ready
+    assert any("does not match" in issue and "J. de Vries" in issue for issue in result.issues)
+
+
+def test_unreadable_validation_blocks_the_payment(upstream):
+    upstream(fetch_account_holder_validation={})
+    assert not _preflight(counterparty_iban=COUNTERPARTY).ready
+
+
+def test_disallowed_instruction_type_blocks_the_payment(upstream):
+    upstream(fetch_payment_instruction_type_options={
+        "paymentInstructionTypeOptions": [{"paymentInstructionType": "SEPA_CREDIT_TRANSFER", "allowed": False}]
+    })
+    result = _preflight(counterparty_iban=COUNTERPARTY)
+    assert not result.ready
+    assert any("not allowed" in issue for issue in result.issues)
+
+
+def test_failing_address_book_becomes_an_issue(upstream):
+    upstream(fetch_address_book=ConnectionError("address book down"))
+    result = _preflight()
+    assert not result.ready
+    assert any("address book down" in issue for issue in result.issues)
+
+
+def test_formats_use_the_resolved_counterparty_country(upstream):
+    calls = upstream(fetch_address_book={"paymentModels": [{"name": "Jan Jansen", "accountNumber": "DE89370400440532013000"}]})
+    result = _preflight()
+    assert result.counterparty.source == "address_book"
+    formats = [kwargs for name, kwargs in calls if name == "fetch_account_number_formats"]
+    assert formats == [{"country_iso_codes": "DE", "currency_iso_code": "EUR"}]
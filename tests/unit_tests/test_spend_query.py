@@ -0,0 +1,84 @@
+import datetime
+
+import pytest
+
+from src.agents.transactions.spend_query import SpendQuery, compile_query
+
+TODAY = datetime.date(2025, 6, 15)
+
+
+@pytest.mark.parametrize(
+    "question, expected",
+    [
+        (
+            "how much did I spend last month",
+            SpendQuery("DEBIT", datetime.date(2025, 5, 1), datetime.date(2025, 6, 1)),
+        ),
+        (
+            "How much did I spend last month on my personal account at Albert Heijn?",
+            SpendQuery("DEBIT", datetime.date(2025, 5, 1), datetime.date(2025, 6, 1), "personal", "Albert Heijn"),
+        ),
+        (
+            "how much did I earn in May 2025",
+            SpendQuery("CREDIT", datetime.date(2025, 5, 1), datetime.date(2025, 6, 1)),
+        ),
+        (
+            "how much did I spend at Jumbo in March",
+            SpendQuery("DEBIT", datetime.date(2025, 3, 1), datetime.date(2025, 4, 1), counterparty="Jumbo"),
+        ),
+        (
+            "how much did I pay to NL91ABNA0417164300 last month",
+            SpendQuery("DEBIT", datetime.date(2025, 5, 1), datetime.date(2025, 6, 1), counterparty="NL91ABNA0417164300"),
+        ),
+        (
+            "How much did I pay to account NL91ABNA0417164300 last month?",
+            SpendQuery("DEBIT", datetime.date(2025, 5, 1), datetime.date(2025, 6, 1), counterparty="NL91ABNA0417164300"),
+        ),
+        (
+            "how much did I pay to NL91 ABNA 0417 1643 00 in May",
+            SpendQuery("DEBIT", datetime.date(2025, 5, 1), datetime.date(2025, 6, 1), counterparty="NL91ABNA0417164300"),
+        ),
+        (
+            "Can you tell me how much I spent yesterday?",
+            SpendQuery("DEBIT", datetime.date(2025, 6, 14), datetime.date(2025, 6, 15)),
+        ),
+        (
+            "what was my total spend this week",
+            SpendQuery("DEBIT", datetime.date(2025, 6, 9), datetime.date(2025, 6, 16)),
+        ),
+        (
+            "how much money did I spend in the last 3 months",
+            SpendQuery("DEBIT", datetime.date(2025, 3, 15), datetime.date(2025, 6, 16)),
+        ),
+    ],
+)
+def test_compiles_plain_totals(question, expected):
+    assert compile_query(question, TODAY) == expected
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        # Filters the compiler does not understand
+        "how much did I spend on groceries last month",
+        "how much did I spend on coffee last month",
+        "how much did I spend on Netflix this year",
+        "how much did I spend on food and drinks last month",
+        "how much did I pay to my landlord last month",
+        "how much did I spend last month in Amsterdam",
+        "how much did I spend at the supermarket last week",
+        # Budget, not past spending
+        "how much can I spend this month",
+        # Not a single total
+        "what was my average spend per week last month",
+        "how much did I spend last month compared to this month",
+        # No period
+        "how much did I spend at Jumbo",
+        # Empty period
+        "how much did I spend in the last 0 days",
+        # Direction unclear
+        "how much did I spend and earn last month",
+    ],
+)
+def test_leaves_other_questions_to_the_agent(question):
+    assert compile_query(question, TODAY) is None